@@ -4,6 +4,7 @@ import os
 
 from aws_cdk import App, Environment
 
+from slack_app_constructs_cdk.jobs import is_jobs_enabled
 from slack_app_constructs_cdk.slack_app_constructs_stack import SlackAppConstructsStack
 from slack_app_constructs_cdk.slack_app_oauth_constructs_stack import SlackAppOAuthConstructsStack
 
@@ -13,21 +14,32 @@ with open(f"env_{ENV_STAGE}.json") as json_file:
     stage_settings = json.load(json_file)
 
 app_name = stage_settings["name"]
+primary_region = stage_settings["region"]
 
 app = App()
 
-SlackAppConstructsStack(
-    app,
-    id=f"{app_name}-SlackCommandApp",
-    settings=stage_settings,
-    env=Environment(account=stage_settings["account"], region=stage_settings["region"]),
-)
+# The command app is deployed to every region in "regions" (default: the primary region only).
+# The stack in the primary region keeps its original name.
+command_app_stacks = {
+    region: SlackAppConstructsStack(
+        app,
+        id=f"{app_name}-SlackCommandApp" + ("" if region == primary_region else f"-{region}"),
+        settings=stage_settings,
+        env=Environment(account=stage_settings["account"], region=region),
+    )
+    for region in stage_settings.get("regions", [primary_region])
+}
+# The other regions use the replicas of the jobs table created by the stack in the primary region
+if is_jobs_enabled(stage_settings) and primary_region in command_app_stacks:
+    for region, stack in command_app_stacks.items():
+        if region != primary_region:
+            stack.add_stack_dependency(command_app_stacks[primary_region])
 
 SlackAppOAuthConstructsStack(
     app,
     id=f"{app_name}-SlackCommandAppSharing",
     settings=stage_settings,
-    env=Environment(account=stage_settings["account"], region=stage_settings["region"]),
+    env=Environment(account=stage_settings["account"], region=primary_region),
 )
 
 app.synth()
@@ -3,14 +3,31 @@ For processing requests that will take longer than 3 seconds to process.
 """
 import json
 import logging
+import time
 
 import urllib3
 
+import command_events
+import jobs
+import ping
+import route_latency
+import single_flight
+import snapstart
+import tracing
+from metrics import put_cold_start_metric, put_metric
+from warmup import is_warmup_event, warmup_response
+
 logging.getLogger().setLevel(logging.INFO)
 
 http = urllib3.PoolManager()
 
 
+@snapstart.after_restore
+def reconnect():
+    """Drop the connections copied from the SnapStart snapshot"""
+    http.clear()
+
+
 def post_response_to_slack(response_url, message):
     data = {
         "replace_original": "false",
@@ -18,26 +35,107 @@ def post_response_to_slack(response_url, message):
         "text": message,
     }
     encoded_data = json.dumps(data).encode("utf-8")
-    resp = http.request(
-        "POST", response_url, body=encoded_data, headers={"Content-Type": "application/json"}
-    )
+    try:
+        with tracing.span("http.post", target="response_url") as span:
+            resp = http.request(
+                "POST",
+                response_url,
+                body=encoded_data,
+                headers={"Content-Type": "application/json"},
+            )
+            span.set_attribute("status", resp.status)
+    except Exception:
+        put_metric("SlackPostFailures")
+        raise
+    if resp.status >= 400:
+        put_metric("SlackPostFailures")
     logging.info(resp.read())
 
 
+def answer_ping(probe, response_url, started_at_ms, is_cold):
+    """Time a first post to the response_url, then post the latency breakdown of the ping"""
+    posted_at = time.monotonic()
+    post_response_to_slack(response_url, "pong")
+    post_ms = (time.monotonic() - posted_at) * 1000
+    post_response_to_slack(response_url, ping.format_report(probe, started_at_ms, is_cold, post_ms))
+
+
+@tracing.traced_handler("AsyncWorker")
+@command_events.published
 def lambda_handler(event, context):
+    started_at_ms = ping.now_ms()
+    is_cold = put_cold_start_metric(event)
+    if is_warmup_event(event):
+        return warmup_response(event)
+
+    started_at = time.monotonic()
+    # Events of ImmediateResponse, published with this one's after the response
+    request_id = command_events.receive(event)
     logging.info(json.dumps(event, indent=2))
     user_id = event["user_id"][0]
     command = event["command"][0]
     channel = event["channel_name"][0]
     command_text = event.get("text", [None])[0]
-    response_url = event.get("response_url")[0]
+    # Global shortcuts and modals without a conversation select have no response_url
+    response_url = event.get("response_url", [None])[0]
+
+    if event.get("ping") is not None:
+        if response_url is not None:
+            answer_ping(event["ping"], response_url, started_at_ms, is_cold)
+        command_events.record(command_events.COMPLETED, request_id, route="ping")
+        return {
+            "statusCode": 200,
+        }
+
+    job_id = event.get("job_id")
+    if job_id is not None:
+        jobs.start(job_id)
 
     message = (
         f"<@{user_id}> invoked `{command}` in {channel} with the following text: `{command_text}`"
     )
     logging.info(message)
 
-    post_response_to_slack(response_url, message)
+    flight_key = event.get("single_flight_key")
+    followers = None
+    try:
+        try:
+            if response_url is not None:
+                post_response_to_slack(response_url, message)
+        except Exception:
+            if job_id is not None:
+                jobs.finish(job_id, jobs.FAILED)
+            command_events.record(
+                command_events.FAILED, request_id, job_id=job_id, reason="slack_post_failed"
+            )
+            raise
+        if job_id is not None:
+            jobs.finish(job_id, jobs.SUCCEEDED, message)
+        command_events.record(
+            command_events.COMPLETED,
+            request_id,
+            duration_ms=round((time.monotonic() - started_at) * 1000),
+            job_id=job_id,
+        )
+
+        # Lets ImmediateResponse pick the sync worker again once this route gets fast enough
+        if event.get("latency_route") is not None:
+            route_latency.observe(event["latency_route"], (time.monotonic() - started_at) * 1000)
+
+        if flight_key:
+            followers = single_flight.complete(flight_key, message)
+    finally:
+        if flight_key and followers is None:
+            # Ended without a result: identical commands no longer join the lease, and Lambda's
+            # retry of this invocation posts to the followers which already joined
+            single_flight.complete(flight_key)
+
+    # Identical requests which joined this one while it was running get the result as well
+    for follower_response_url in followers or []:
+        try:
+            post_response_to_slack(follower_response_url, message)
+        except Exception as e:
+            logging.error(f"Failed to post the result to a single-flight follower: {e}")
 
     return {
         "statusCode": 200,
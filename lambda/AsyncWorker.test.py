@@ -1,6 +1,7 @@
 """
 Unit tests for AsyncWorker.py
 """
+import json
 import unittest
 from unittest.mock import patch
 
@@ -28,6 +29,151 @@ class TestFunction(unittest.TestCase):
             )
             self.assertEqual(ret, {"statusCode": 200})
 
+    def test_lambda_handler_job_tracked(self):
+        event = mock_event(text_value="async") | {"job_id": "0123456789ab"}
+        with patch("AsyncWorker.post_response_to_slack") as mock_post, patch(
+            "jobs.start"
+        ) as mock_start, patch("jobs.finish") as mock_finish:
+            func.lambda_handler(event, None)
+
+            mock_start.assert_called_once_with("0123456789ab")
+            mock_finish.assert_called_once_with(
+                "0123456789ab", "succeeded", mock_post.call_args.args[1]
+            )
+
+    def test_lambda_handler_job_failed(self):
+        event = mock_event(text_value="async") | {"job_id": "0123456789ab"}
+        with patch(
+            "AsyncWorker.post_response_to_slack", side_effect=Exception("Slack is down")
+        ), patch("jobs.start"), patch("jobs.finish") as mock_finish:
+            with self.assertRaises(Exception):
+                func.lambda_handler(event, None)
+
+            mock_finish.assert_called_once_with("0123456789ab", "failed")
+
+    def test_lambda_handler_command_events_published(self):
+        received = {"request_id": "dummy-request-id", "stage": "received", "at": 1700000000000}
+        event = mock_event(text_value="async") | {"command_events": [received]}
+        with patch("AsyncWorker.post_response_to_slack") as mock_post, patch(
+            "command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"
+        ), patch("command_events.events_client") as mock_events:
+            mock_events.put_events.return_value = {"FailedEntryCount": 0}
+
+            func.lambda_handler(event, None)
+            func.command_events.handoff.join()
+
+            # After the response, in one call
+            mock_post.assert_called_once()
+            entries = mock_events.put_events.call_args.kwargs["Entries"]
+            self.assertEqual(
+                [e["DetailType"] for e in entries], ["command.received", "command.completed"]
+            )
+            self.assertEqual(json.loads(entries[1]["Detail"])["request_id"], "dummy-request-id")
+
+    def test_lambda_handler_no_response_url(self):
+        event = mock_event(text_value="help")
+        del event["response_url"]
+        with patch("AsyncWorker.post_response_to_slack") as mock_post:
+            ret = func.lambda_handler(event, None)
+
+            mock_post.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200})
+
+    def test_lambda_handler_ping(self):
+        probe = {
+            "dispatched_at_ms": 1700000000250,
+            "immediate_response_cold": False,
+            "received_at_ms": 1700000000100,
+            "request_time_ms": 1700000000000,
+        }
+        event = mock_event(text_value="ping") | {"ping": probe}
+        with patch("AsyncWorker.post_response_to_slack") as mock_post, patch(
+            "AsyncWorker.ping.now_ms", return_value=1700000000330
+        ):
+            ret = func.lambda_handler(event, None)
+
+            self.assertEqual(ret, {"statusCode": 200})
+            self.assertEqual(mock_post.call_args_list[0].args, ("test_url", "pong"))
+            report = mock_post.call_args_list[1].args[1]
+            self.assertIn("• invoke → AsyncWorker", report)
+            self.assertIn("• ImmediateResponse (warm): 150 ms", report)
+            self.assertEqual(mock_post.call_count, 2)
+
+    def test_lambda_handler_single_flight_followers(self):
+        event = mock_event(text_value="async") | {"single_flight_key": "dummy-key"}
+        with patch("AsyncWorker.post_response_to_slack") as mock_post, patch(
+            "single_flight.complete", return_value=["follower_url"]
+        ) as mock_complete:
+            func.lambda_handler(event, None)
+
+            message = mock_post.call_args.args[1]
+            mock_complete.assert_called_once_with("dummy-key", message)
+            self.assertEqual(
+                [c.args for c in mock_post.call_args_list],
+                [("test_url", message), ("follower_url", message)],
+            )
+
+    def test_lambda_handler_single_flight_leader_post_failed(self):
+        event = mock_event(text_value="async") | {"single_flight_key": "dummy-key"}
+        with patch(
+            "AsyncWorker.post_response_to_slack", side_effect=Exception("Slack is down")
+        ), patch("single_flight.complete", return_value=["follower_url"]) as mock_complete:
+            with self.assertRaises(Exception):
+                func.lambda_handler(event, None)
+
+            # Released without a result, for the retry to post to the followers
+            mock_complete.assert_called_once_with("dummy-key")
+
+    def test_lambda_handler_single_flight_follower_post_failed(self):
+        event = mock_event(text_value="async") | {"single_flight_key": "dummy-key"}
+        with patch(
+            "AsyncWorker.post_response_to_slack",
+            side_effect=[None, Exception("expired response_url"), None],
+        ) as mock_post, patch(
+            "single_flight.complete", return_value=["follower_url_1", "follower_url_2"]
+        ):
+            ret = func.lambda_handler(event, None)
+
+            self.assertEqual(mock_post.call_args.args[0], "follower_url_2")
+            self.assertEqual(ret, {"statusCode": 200})
+
+    def test_lambda_handler_latency_observed(self):
+        event = mock_event(text_value="async report") | {"latency_route": "report"}
+        with patch("AsyncWorker.post_response_to_slack"), patch(
+            "route_latency.observe"
+        ) as mock_observe:
+            func.lambda_handler(event, None)
+
+            self.assertEqual(mock_observe.call_args.args[0], "report")
+
+    def test_lambda_handler_warmup(self):
+        with patch("AsyncWorker.post_response_to_slack") as mock_post, patch(
+            "AsyncWorker.logging.info"
+        ) as mock_log:
+            ret = func.lambda_handler({"warmup": True}, None)
+            mock_post.assert_not_called()
+            mock_log.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
+    def test_post_response_to_slack_failed(self):
+        with patch("AsyncWorker.http.request") as mock_request, patch(
+            "AsyncWorker.put_metric"
+        ) as mock_put_metric:
+            mock_request.return_value.status = 404
+
+            func.post_response_to_slack("test_url", "message")
+
+            mock_put_metric.assert_called_once_with("SlackPostFailures")
+
+    def test_post_response_to_slack_error(self):
+        with patch("AsyncWorker.http.request", side_effect=Exception("timeout")), patch(
+            "AsyncWorker.put_metric"
+        ) as mock_put_metric:
+            with self.assertRaises(Exception):
+                func.post_response_to_slack("test_url", "message")
+
+            mock_put_metric.assert_called_once_with("SlackPostFailures")
+
 
 if __name__ == "__main__":
     unittest.main()
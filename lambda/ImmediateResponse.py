@@ -3,30 +3,80 @@ ImmediateResponse aims to do
 - authentication and authorization,
 - invoke AsyncWorker or SyncWorker
 - return an immedate response to caller within 3 seconds
+
+Besides slash commands, it takes the interactivity payloads of the app (button clicks and menus,
+modal submissions, shortcuts), posted as `payload=<JSON>` to the same URL. These are mapped to the
+parameters of a slash command, with the text taken from the action value or the callback ID, and
+always handled by an async worker posting to the response_url: Slack does not show the body of the
+response to an interaction, so it is acknowledged with an empty one.
 """
 import json
 import logging
+import math
 import os
+import time
 from urllib.parse import parse_qs
 
-import boto3
+from botocore.exceptions import BotoCoreError, ClientError, ReadTimeoutError
+
+import aws_clients
+import command_events
+import jobs
+import ping
+import request_validation
+import route_latency
+import single_flight
+import slack_apps
+import snapstart
+import tracing
+from capture import capture_request
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import put_cold_start_metric
+from warmup import is_warmup_event, warmup_response
 
 logging.getLogger().setLevel(logging.INFO)
 
-SLACK_APP_ID = os.environ.get("SlackAppId")
-SLACK_CHANNEL_IDS = list(map(str.strip, os.environ.get("SlackChannelIds", "").split(",")))
-SLACK_COMMAND = os.environ.get("SlackCommand")
-SLACK_TEAM_IDS = list(map(str.strip, os.environ.get("SlackTeamIds", "").split(",")))
-SLACK_TEAM_DOMAINS = list(map(str.strip, os.environ.get("SlackDomains", "").split(",")))
-SLACK_VERIFICATION_TOKEN_SSM_PARAMETER_KEY = os.environ.get("SlackVerificationTokenParameterKey")
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get("SecretCacheTtlSeconds", "300"))
+
+# Rendered at synth time, e.g. {"help": {"default": "Usage: {command} ...", "T1111111111": "..."}}
+STATIC_RESPONSES = json.loads(os.environ.get("StaticResponses", "{}"))
 
 CHILD_ASYNC_FUNCTION_NAME = os.environ.get("AsyncWorkerLambdaFunctionName", "AsyncWorker")
 CHILD_SYNC_FUNCTION_NAME = os.environ.get("SyncWorkerLambdaFunctionName", "SyncWorker")
+# Teams with dedicated workers, e.g. {"T1111111111": {"async": "...", "sync": "..."}}
+WORKER_LANES = json.loads(os.environ.get("WorkerLanes", "{}"))
+DEFAULT_WORKER_LANE = {"async": CHILD_ASYNC_FUNCTION_NAME, "sync": CHILD_SYNC_FUNCTION_NAME}
+# Commands with their own function, e.g. {"report": {"function": "...", "async": true}}, and the
+# timeout of the sync ones, e.g. {"status": {"function": "...", "async": false, "timeout_seconds": 2}}
+COMMAND_ROUTES = json.loads(os.environ.get("CommandRoutes", "{}"))
+# Slack's limit for the response, and the part of it kept free when picking the sync worker
+ACK_BUDGET_MS = 3000
+ADAPTIVE_ROUTING_MARGIN_MS = int(os.environ.get("AdaptiveRoutingMarginMs", "500"))
+# Granularity of the read timeout of the sync invokes: each value is a client of its own
+READ_TIMEOUT_STEP_MS = 100
+# Not passed on to the workers with the interactivity payload
+INTERACTION_SENSITIVE_FIELDS = ["response_url", "response_urls", "token", "trigger_id"]
 IS_AWS_SAM_LOCAL = os.environ.get("AWS_SAM_LOCAL") == "true"
-TARGET_REGION = os.environ.get("AWS_REGION", "ap-southeast-2")
 
-lambda_client = boto3.client("lambda", region_name=TARGET_REGION)
-ssm_client = boto3.client("ssm", region_name=TARGET_REGION)
+lambda_client = aws_clients.client("lambda")
+ssm_client = aws_clients.client("ssm")
+
+# Fail fast while SSM or the Lambda API is degraded
+ssm_breaker = CircuitBreaker.from_settings("ssm", slow_call_ms=500)
+lambda_breaker = CircuitBreaker.from_settings("lambda", slow_call_ms=2500)
+
+# SSM parameter values of this region, kept for SECRET_CACHE_TTL_SECONDS: {key: (value, expiry)}
+secret_cache = {}
+
+
+@snapstart.after_restore
+def reconnect():
+    """Replace the clients and secrets copied from the SnapStart snapshot"""
+    global lambda_client, ssm_client
+    aws_clients.reset()
+    lambda_client = aws_clients.client("lambda")
+    ssm_client = aws_clients.client("ssm")
+    secret_cache.clear()
 
 
 def respond(message):
@@ -44,15 +94,44 @@ def respond(message):
     }
 
 
-def authenticate(token):
-    """Verify the token passed in"""
+def acknowledge():
+    """Empty response to an interaction: Slack closes a submitted modal and shows nothing"""
+    return {"body": "", "statusCode": "200"}
+
+
+def respond_unavailable(user_id, channel, command, command_text):
+    return respond(
+        f"<@{user_id}>, your request on {channel} `{command} {command_text}` cannot be"
+        + " processed at the moment. Please try again later."
+    )
+
+
+def respond_degraded(user_id):
+    return respond(
+        f"Sorry <@{user_id}>, the app cannot reach a service it depends on. Please try again shortly."
+    )
+
+
+def get_secret(parameter_key):
+    """Return the value of an SSM SecureString parameter, cached in the container"""
+    value, expiry = secret_cache.get(parameter_key, (None, 0))
+    now = time.monotonic()
+    if now >= expiry:
+        resp = ssm_breaker.call(ssm_client.get_parameter, Name=parameter_key, WithDecryption=True)
+        value = resp["Parameter"]["Value"]
+        secret_cache[parameter_key] = (value, now + SECRET_CACHE_TTL_SECONDS)
+    return value
+
+
+def authenticate(token, app):
+    """Verify the token passed in against the verification token of the app"""
     if IS_AWS_SAM_LOCAL is True:
         return True
 
     try:
-        expected_token = ssm_client.get_parameter(
-            Name=SLACK_VERIFICATION_TOKEN_SSM_PARAMETER_KEY, WithDecryption=True
-        )["Parameter"]["Value"]
+        expected_token = get_secret(app["verification_token_parameter_key"])
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logging.error(f"Unable to retrieve data from parameter store: {e}")
         return False
@@ -64,79 +143,414 @@ def authenticate(token):
     return True
 
 
-def authorize(app_id, channel_id, team_id, team_domain):
-    """Just double check if this app is invoked from the expected app/channel/team"""
-
-    if app_id != SLACK_APP_ID:
-        return f"app ID {app_id}"
+def authorize(app, channel_id, team_id, team_domain):
+    """Just double check if the app is invoked from its expected channel/team; interactions outside
+    a channel (global shortcuts, modals) have no channel ID"""
 
-    if team_id not in SLACK_TEAM_IDS:
+    if team_id not in app["team_ids"]:
         return f"team ID {team_id}"
 
-    if team_domain not in SLACK_TEAM_DOMAINS:
+    if team_domain not in app["team_domains"]:
         return f"team domain {team_domain}"
 
-    if channel_id not in SLACK_CHANNEL_IDS:
+    if channel_id is not None and channel_id not in app["channel_ids"]:
         return f"channel ID {channel_id}"
 
 
-def invoke_lambda(function_namme, payload_json, is_async):
-    payload_str = json.dumps(payload_json)
-    payload_bytes_arr = bytes(payload_str, encoding="utf8")
-    return lambda_client.invoke(
-        FunctionName=function_namme,
-        InvocationType="Event" if is_async else "RequestResponse",
-        Payload=payload_bytes_arr,
+def get_interaction_text(interaction):
+    """Return the command text of an interaction: the value of the button or selected option, else
+    the action ID or the callback ID of the shortcut or modal"""
+    if interaction["type"] == "block_actions":
+        action = interaction["actions"][0]
+        selected_option = action.get("selected_option") or {}
+        return action.get("value") or selected_option.get("value") or action["action_id"]
+    if interaction["type"] == "view_submission":
+        return interaction["view"]["callback_id"]
+    return interaction["callback_id"]
+
+
+def parse_interaction(interaction):
+    """Map an interactivity payload to parse_qs parameters of a slash command, all but `command`.
+
+    The payload itself, without the token, trigger_id and response URLs, is passed on to the
+    workers as `interaction`.
+    """
+    response_url = interaction.get("response_url")
+    channel = interaction.get("channel") or {}
+    if interaction.get("response_urls"):
+        # Modal submissions with a conversation select for the response
+        response_url = interaction["response_urls"][0]["response_url"]
+        channel = channel or {"id": interaction["response_urls"][0]["channel_id"]}
+    params = {
+        "api_app_id": interaction.get("api_app_id"),
+        "channel_id": channel.get("id"),
+        "channel_name": channel.get("name", ""),
+        "interaction": json.dumps(
+            {k: v for k, v in interaction.items() if k not in INTERACTION_SENSITIVE_FIELDS}
+        ),
+        "interaction_type": interaction["type"],
+        "response_url": response_url,
+        "team_domain": interaction["team"]["domain"],
+        "team_id": interaction["team"]["id"],
+        "text": get_interaction_text(interaction),
+        "token": interaction.get("token"),
+        "trigger_id": interaction.get("trigger_id"),
+        "user_id": interaction["user"]["id"],
+        "user_name": interaction["user"].get("username") or interaction["user"].get("name"),
+    }
+    return {k: [v] for k, v in params.items() if v is not None}
+
+
+def get_static_response(command, command_text, team_id):
+    """Return the precomputed response of an informational command (e.g. help), if any.
+
+    None when the command has only variants of other teams: it is then routed to a worker.
+    """
+    variants = STATIC_RESPONSES.get(command_text.split(" ")[0].lower(), {})
+    variant = variants.get(team_id, variants.get("default"))
+    if variant is not None:
+        return variant.replace("{command}", command)
+
+
+def get_worker_function_name(team_id, is_async):
+    """Return the worker of the team's dedicated lane, or the shared default worker"""
+    return WORKER_LANES.get(team_id, DEFAULT_WORKER_LANE)["async" if is_async else "sync"]
+
+
+def get_request_time_ms(event, received_at):
+    """Return when API Gateway received the request, in epoch milliseconds"""
+    return event.get("requestContext", {}).get("requestTimeEpoch", received_at * 1000)
+
+
+def get_ack_remaining_ms(event, received_at):
+    """Return the time left of Slack's budget, from when API Gateway received the request"""
+    return ACK_BUDGET_MS - (time.time() * 1000 - get_request_time_ms(event, received_at))
+
+
+def get_sync_budget_ms(event, received_at):
+    """Return the time left for a sync worker, from when API Gateway received the request"""
+    return get_ack_remaining_ms(event, received_at) - ADAPTIVE_ROUTING_MARGIN_MS
+
+
+def get_sync_read_timeout(command_text, event, received_at):
+    """Return how long to wait for a sync worker, in seconds: the time left for it (rounded down to
+    READ_TIMEOUT_STEP_MS), or the timeout of the command's own function when that is shorter"""
+    budget_ms = max(get_sync_budget_ms(event, received_at), READ_TIMEOUT_STEP_MS)
+    read_timeout = math.floor(budget_ms / READ_TIMEOUT_STEP_MS) * READ_TIMEOUT_STEP_MS / 1000
+    route = COMMAND_ROUTES.get(command_text.split(" ")[0].lower(), {})
+    return min(route.get("timeout_seconds") or read_timeout, read_timeout)
+
+
+def get_latency_route(command_text):
+    """Return the route whose latency is learned, or None for a command with its own function"""
+    if command_text.split(" ")[0].lower() in COMMAND_ROUTES:
+        return None
+    return route_latency.route_key(command_text)
+
+
+def get_route(command_text, team_id, sync_budget_ms=None):
+    """Return the function name and mode (is_async) of the worker for the command text.
+
+    The first word picks a command with its own function, else `async` or `sync` picks the worker.
+    Otherwise the async worker is picked when the latency estimate of the route is over
+    `sync_budget_ms`, and the sync worker when it fits or the route has not been seen yet.
+    """
+    first_word = command_text.split(" ")[0].lower()
+    route = COMMAND_ROUTES.get(first_word)
+    if route is not None:
+        return route["function"], route["async"]
+
+    if first_word in route_latency.MODE_WORDS or sync_budget_ms is None:
+        is_async = first_word == "async"
+    else:
+        with tracing.span("route_latency.predict"):
+            predicted_ms = route_latency.predict(route_latency.route_key(command_text))
+        is_async = predicted_ms is not None and predicted_ms > sync_budget_ms
+    return get_worker_function_name(team_id, is_async), is_async
+
+
+def follow(flight_key, is_async, wait_ms, user_id, channel, command, command_text, request_id):
+    """Reply to a request which joined an identical command already running; a sync one waits up
+    to `wait_ms` for the result"""
+    if is_async:
+        # The worker posts the result to this request's response_url as well
+        command_events.record(command_events.COMPLETED, request_id, coalesced=True)
+        return respond(
+            f"Processing request from <@{user_id}> on {channel}: {command} {command_text}"
+            + " (joined the same request already running)"
+        )
+
+    with tracing.span("single_flight.wait"):
+        result = single_flight.wait_for_result(flight_key, wait_ms)
+    if result is None:
+        command_events.record(command_events.FAILED, request_id, reason="unavailable")
+        return respond_unavailable(user_id, channel, command, command_text)
+    command_events.record(command_events.COMPLETED, request_id, coalesced=True)
+    return respond(f"<@{user_id}>: {command} {command_text}\n{result}")
+
+
+def release(flight_key, job_id):
+    """End the lease of a command which failed, so its followers stop waiting, and fail its job"""
+    single_flight.complete(flight_key)
+    if job_id is not None:
+        jobs.finish(job_id, jobs.FAILED)
+
+
+def dispatch_ping(event, payload, team_id, received_at, is_cold):
+    """Send the latency probe through the team's async worker, which posts the breakdown"""
+    payload["ping"] = ping.create_probe(
+        get_request_time_ms(event, received_at), received_at * 1000, is_cold
     )
+    return invoke_lambda(get_worker_function_name(team_id, True), payload, True)
+
+
+def invoke_lambda(function_namme, payload_json, is_async, read_timeout=None):
+    client = lambda_client
+    if not is_async:
+        # Not retried, and waited for no longer than `read_timeout`
+        client = aws_clients.client("lambda", "lambda_sync", read_timeout=read_timeout)
+    with tracing.span("dispatch", function=function_namme, is_async=is_async):
+        payload_str = json.dumps(tracing.inject(payload_json))
+        payload_bytes_arr = bytes(payload_str, encoding="utf8")
+        return lambda_breaker.call(
+            client.invoke,
+            FunctionName=function_namme,
+            InvocationType="Event" if is_async else "RequestResponse",
+            Payload=payload_bytes_arr,
+            # A sync invoke lasts as long as the worker: a slow one says nothing of the Lambda API
+            timed=is_async,
+            ignored=() if is_async else (ReadTimeoutError,),
+        )
 
 
+@tracing.traced_handler("ImmediateResponse")
+@command_events.published
 def lambda_handler(event, context):
+    is_cold = put_cold_start_metric(event)
+    if is_warmup_event(event):
+        return warmup_response(event)
+
+    received_at = time.time()
+    # Junk traffic to the public endpoint is turned away before parsing or any AWS call
+    rejection = request_validation.check_request(event)
+    if rejection is not None:
+        return request_validation.reject(*rejection)
+
     event_body = event.get("body")
     logging.info(f"Received event[body]: {event_body}")
 
-    params = parse_qs(event_body)
+    with tracing.span("parse"):
+        params = parse_qs(event_body)
+        schema = request_validation.SLASH_COMMAND_SCHEMA
+        # Button clicks, modal submissions and shortcuts
+        if "payload" in params:
+            schema = request_validation.INTERACTION_SCHEMA
+            try:
+                params = parse_interaction(json.loads(params["payload"][0]))
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+                return request_validation.reject(
+                    400, request_validation.MALFORMED, f"invalid payload ({e!r})"
+                )
+        rejection = request_validation.check_fields(params, schema)
+    if rejection is not None:
+        return request_validation.reject(*rejection)
+    interaction_type = params.get("interaction_type", [None])[0]
     app_id = params["api_app_id"][0]
-    channel_id = params["channel_id"][0]
+    channel_id = params.get("channel_id", [None])[0]
     team_domain = params["team_domain"][0]
     team_id = params["team_id"][0]
     user_id = params["user_id"][0]
 
-    if authenticate(params["token"][0]) is False:
+    request_id = getattr(context, "aws_request_id", None)
+    command_events.record(
+        command_events.RECEIVED,
+        request_id,
+        app_id=app_id,
+        channel_id=channel_id,
+        command=params.get("command", [None])[0],
+        interaction_type=interaction_type,
+        team_id=team_id,
+        text=params.get("text", [None])[0],
+        user_id=user_id,
+    )
+
+    # One deployment serves several Slack apps
+    app = slack_apps.get_app(app_id)
+    if app is None:
+        command_events.record(command_events.FAILED, request_id, reason="unknown_app")
+        return respond(f"Sorry <@{user_id}>, this app does not support this app ID {app_id}.")
+    if interaction_type is not None:
+        # Interactions belong to the app's command
+        params["command"] = [app["command"]]
+
+    try:
+        with tracing.span("authenticate"):
+            is_authenticated = authenticate(params["token"][0], app)
+    except CircuitOpenError:
+        command_events.record(command_events.FAILED, request_id, reason="degraded")
+        return respond_degraded(user_id)
+    if is_authenticated is False:
+        command_events.record(command_events.FAILED, request_id, reason="unauthenticated")
         return respond(
             f"Sorry <@{user_id}>, an authentication error occurred. Please contact your admin."
         )
 
-    result = authorize(app_id, channel_id, team_id, team_domain)
+    with tracing.span("authorize"):
+        result = authorize(app, channel_id, team_id, team_domain)
     if result is not None:
+        command_events.record(command_events.FAILED, request_id, reason="unauthorized")
         return respond(f"Sorry <@{user_id}>, this app does not support this {result}.")
+    command_events.record(command_events.AUTHORIZED, request_id)
+
+    capture_request(params, received_at)
 
     user = params["user_name"][0]
     command = params["command"][0]
     channel = params["channel_name"][0]
     command_text = params.get("text", [None])[0]
-    logging.info(f"{user} invoked {command} in {channel} with the following text: {command_text}")
+    logging.info(
+        f"{user} invoked {command} in {channel} with the following text: {command_text}"
+        + (f" ({interaction_type})" if interaction_type else "")
+    )
 
     message = None
 
-    if command == SLACK_COMMAND and command_text:
+    if command == app["command"] and command_text:
         # Remove sensitive data in payload before passing to other functions
         payload = {k: v for k, v in params.items() if k not in ["token", "trigger_id"]}
 
-        mode = command_text.split(" ")[0]
-        is_async = mode.lower() == "async"
-
-        function_name = CHILD_ASYNC_FUNCTION_NAME if is_async is True else CHILD_SYNC_FUNCTION_NAME
-
-        resp = invoke_lambda(function_name, payload, is_async)
+        # Reserved: latency self-diagnosis
+        if ping.is_ping(command_text):
+            command_events.record(
+                command_events.DISPATCHED,
+                request_id,
+                function=get_worker_function_name(team_id, True),
+                is_async=True,
+                route="ping",
+            )
+            command_events.attach(payload)
+            try:
+                resp = dispatch_ping(event, payload, team_id, received_at, is_cold)
+            except CircuitOpenError:
+                command_events.record(command_events.FAILED, request_id, reason="degraded")
+                return respond_degraded(user_id)
+            except (BotoCoreError, ClientError) as e:
+                logging.error(f"Failed to invoke the ping probe: {e}")
+                command_events.record(command_events.FAILED, request_id, reason="unavailable")
+                return respond_unavailable(user_id, channel, command, command_text)
+            if resp["ResponseMetadata"]["HTTPStatusCode"] not in [200, 201, 202]:
+                logging.error(resp)
+                command_events.record(command_events.FAILED, request_id, reason="unavailable")
+                return respond_unavailable(user_id, channel, command, command_text)
+            command_events.clear()
+            if interaction_type is not None:
+                return acknowledge()
+            return respond(f"Pinging for <@{user_id}> on {channel}, the latency breakdown follows")
+
+        # Reserved: job status, from the jobs table
+        if jobs.is_jobs_command(command_text) and interaction_type is None:
+            with tracing.span("jobs.answer"):
+                message = jobs.answer(command_text, team_id, user_id)
+            command_events.record(command_events.COMPLETED, request_id, route="jobs")
+            return respond(f"<@{user_id}>: {command} {command_text}\n{message}")
+
+        static_response = get_static_response(command, command_text, team_id)
+        if static_response is not None and interaction_type is None:
+            command_events.record(command_events.COMPLETED, request_id, route="static")
+            return respond(f"<@{user_id}>: {command} {command_text}\n{static_response}")
+
+        if interaction_type is None:
+            function_name, is_async = get_route(
+                command_text, team_id, get_sync_budget_ms(event, received_at)
+            )
+        else:
+            function_name, is_async = get_route(command_text, team_id)
+            if not is_async:
+                # The response to an interaction is not shown, the result goes to the response_url
+                function_name, is_async = get_worker_function_name(team_id, True), True
+        latency_route = get_latency_route(command_text)
+
+        # Identical commands already running are joined instead of run again
+        flight_key = single_flight.coalescing_key(function_name, command_text, team_id)
+        with tracing.span("single_flight.acquire"):
+            role = single_flight.acquire(flight_key, params.get("response_url", [""])[0])
+        if role == single_flight.FOLLOWER:
+            if interaction_type is not None:
+                return acknowledge()
+            # Not waiting past Slack's budget
+            wait_ms = min(single_flight.WAIT_MS, max(get_sync_budget_ms(event, received_at), 0))
+            return follow(
+                flight_key, is_async, wait_ms, user_id, channel, command, command_text, request_id
+            )
+        if is_async and single_flight.is_enabled():
+            payload["single_flight_key"] = flight_key
+        if is_async and latency_route is not None and route_latency.is_enabled():
+            # AsyncWorker times itself
+            payload["latency_route"] = latency_route
+        job_id = None
+        if is_async and jobs.is_enabled():
+            with tracing.span("jobs.create"):
+                job_id = jobs.create(function_name, team_id, user_id, command_text)
+            if job_id is not None:
+                payload["job_id"] = job_id
+        command_events.record(
+            command_events.DISPATCHED,
+            request_id,
+            function=function_name,
+            is_async=is_async,
+            job_id=job_id,
+        )
+        if is_async:
+            # Published by the worker, after its response
+            command_events.attach(payload)
+
+        read_timeout = None
+        if not is_async:
+            read_timeout = get_sync_read_timeout(command_text, event, received_at)
+        invoked_at = time.monotonic()
+        try:
+            resp = invoke_lambda(function_name, payload, is_async, read_timeout)
+        except CircuitOpenError:
+            release(flight_key, job_id)
+            command_events.record(command_events.FAILED, request_id, reason="degraded")
+            return respond_degraded(user_id)
+        except (BotoCoreError, ClientError) as e:
+            # e.g. a sync worker still running after `read_timeout`
+            logging.error(f"Failed to invoke {function_name}: {e}")
+            if isinstance(e, ReadTimeoutError) and latency_route is not None:
+                # At least that slow: the route goes to the async worker next time
+                invoke_ms = (time.monotonic() - invoked_at) * 1000
+                route_latency.observe(latency_route, max(invoke_ms, read_timeout * 1000))
+            release(flight_key, job_id)
+            command_events.record(command_events.FAILED, request_id, reason="unavailable")
+            return respond_unavailable(user_id, channel, command, command_text)
+        except Exception:
+            # Not left for the followers to wait out
+            release(flight_key, job_id)
+            command_events.record(command_events.FAILED, request_id, reason="error")
+            raise
+        invoke_ms = (time.monotonic() - invoked_at) * 1000
+        if not is_async and latency_route is not None:
+            route_latency.observe(latency_route, invoke_ms)
         if resp["ResponseMetadata"]["HTTPStatusCode"] in [200, 201, 202]:
+            if is_async:
+                command_events.clear()
+            if interaction_type is not None:
+                return acknowledge()
             if is_async:
                 message = (
                     f"Processing request from <@{user_id}> on {channel}: {command} {command_text}"
                 )
+                if job_id is not None:
+                    message += f" (job `{job_id}`)"
             else:
                 try:
                     payload = json.loads(resp["Payload"].read().decode("utf-8"))["body"]
                     message = f"<@{user_id}>: {command} {command_text}\n{payload}"
+                    single_flight.complete(flight_key, payload)
+                    command_events.record(
+                        command_events.COMPLETED, request_id, duration_ms=round(invoke_ms)
+                    )
                 except Exception as e:
                     logging.error(
                         f"Failed to retrieve response from sync lambda {function_name}: {e}"
@@ -144,12 +558,12 @@ def lambda_handler(event, context):
 
         if message is None:
             logging.error(resp)
-            message = (
-                f"<@{user_id}>, your request on {channel} `{command} {command_text}` cannot be"
-                + " processed at the moment. Please try again later."
-            )
+            release(flight_key, job_id)
+            command_events.record(command_events.FAILED, request_id, reason="unavailable")
+            return respond_unavailable(user_id, channel, command, command_text)
 
     if message is None:
+        command_events.record(command_events.FAILED, request_id, reason="unsupported")
         message = f"<@{user_id}>, this app does not support `{command} {command_text}`."
 
     return respond(message)
@@ -1,18 +1,54 @@
 """
 Unit tests for ImmediateResponse.py
 """
+import json
 import os
+import time
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
+from urllib.parse import urlencode
 
-os.environ["SlackAppId"] = "APIID123456"
-os.environ["SlackChannelIds"] = "C1111111111,C2222222222"
-os.environ["SlackCommand"] = "/slack-unittest"
-os.environ["SlackDomains"] = "companya,companyb"
-os.environ["SlackTeamIds"] = "T1111111111,T2222222222"
-os.environ["SlackVerificationTokenParameterKey"] = "/apps/slack_app/dummy/token"
+from botocore.exceptions import ReadTimeoutError
+
+os.environ["SlackApps"] = json.dumps(
+    {
+        "APIID123456": {
+            "command": "/slack-unittest",
+            "verification_token_parameter_key": "/apps/slack_app/dummy/token",
+            "team_ids": ["T1111111111", "T2222222222"],
+            "team_domains": ["companya", "companyb"],
+            "channel_ids": ["C1111111111", "C2222222222"],
+        },
+        "APIID654321": {
+            "command": "/other-unittest",
+            "verification_token_parameter_key": "/apps/other_app/dummy/token",
+            "team_ids": ["T2222222222"],
+            "team_domains": ["companyb"],
+            "channel_ids": ["C2222222222"],
+        },
+    }
+)
 os.environ["AsyncWorkerLambdaFunctionName"] = "Dummy-AsyncWorker"
 os.environ["SyncWorkerLambdaFunctionName"] = "Dummy-SyncWorker"
+os.environ["WorkerLanes"] = json.dumps(
+    {"T2222222222": {"async": "Dummy-AsyncWorker-B", "sync": "Dummy-SyncWorker-B"}}
+)
+os.environ["CommandRoutes"] = json.dumps(
+    {
+        "report": {"function": "Dummy-Command-report", "async": True},
+        "status": {"function": "Dummy-Command-status", "async": False, "timeout_seconds": 1},
+    }
+)
+os.environ["StaticResponses"] = json.dumps(
+    {
+        "help": {
+            "default": "Usage: {command} [async] <text>",
+            "T2222222222": "Usage for company B",
+        },
+        "about": {"T1111111111": "About company A"},
+    }
+)
 
 func = __import__("ImmediateResponse")
 
@@ -23,7 +59,7 @@ def mock_input_data(custom_data={}):
         "channel_id": ["C1111111111"],
         "channel_name": ["dummy-channel-a"],
         "command": ["/slack-unittest"],
-        "response_url": ["dummy-url"],
+        "response_url": ["https://hooks.slack.com/commands/dummy"],
         "team_domain": ["companya"],
         "team_id": ["T1111111111"],
         "text": ["help"],
@@ -35,8 +71,27 @@ def mock_input_data(custom_data={}):
     return data
 
 
-def mock_event():
-    return {"body": mock_input_data()}
+def mock_event(body=None, content_type="application/x-www-form-urlencoded"):
+    return {
+        "body": urlencode(mock_input_data(), doseq=True) if body is None else body,
+        "headers": {"Content-Type": content_type},
+    }
+
+
+def mock_interaction(custom_data={}):
+    data = {
+        "actions": [{"action_id": "run-report", "type": "button", "value": "report weekly"}],
+        "api_app_id": "APIID123456",
+        "channel": {"id": "C1111111111", "name": "dummy-channel-a"},
+        "response_url": "https://hooks.slack.com/commands/dummy",
+        "team": {"domain": "companya", "id": "T1111111111"},
+        "token": "dummy-token",
+        "trigger_id": "dummy-trigger-id",
+        "type": "block_actions",
+        "user": {"id": "dummy-user-id-a", "username": "dummy-user-name-a"},
+    }
+    data.update(custom_data)
+    return {"payload": [json.dumps(data)]}
 
 
 MOCK_LAMBDA_INVOKE_RESPONSE = {
@@ -55,6 +110,24 @@ def mock_response(message):
 
 
 class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.secret_cache.clear()
+        func.ssm_breaker.reset()
+        func.lambda_breaker.reset()
+        # The sync invokes get their client from the factory
+        func.aws_clients.stub("lambda", func.lambda_client)
+
+    def test_lambda_handler_warmup(self):
+        with patch("ImmediateResponse.ssm_client.get_parameter") as mock_get_parameter, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch("ImmediateResponse.logging.info") as mock_log:
+            ret = func.lambda_handler({"warmup": True}, None)
+
+            mock_get_parameter.assert_not_called()
+            mock_lambda_invoke.assert_not_called()
+            mock_log.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
     def test_lambda_handler_async_all_good(self):
         with patch(
             "ImmediateResponse.ssm_client.get_parameter",
@@ -74,12 +147,662 @@ class TestFunction(unittest.TestCase):
                 ),
             )
 
+    def test_lambda_handler_async_worker_lane(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            for team_domain, team_id, function_name in [
+                ("companya", "T1111111111", "Dummy-AsyncWorker"),
+                ("companyb", "T2222222222", "Dummy-AsyncWorker-B"),
+            ]:
+                mock_parse_qs.return_value = mock_input_data(
+                    custom_data={
+                        "team_domain": [team_domain],
+                        "team_id": [team_id],
+                        "text": ["async"],
+                    }
+                )
+
+                func.lambda_handler(mock_event(), None)
+
+                self.assertEqual(mock_lambda_invoke.call_args.kwargs["FunctionName"], function_name)
+
+    def test_lambda_handler_request_captured(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "capture.CAPTURE_DELIVERY_STREAM", "Dummy-Capture"
+        ), patch(
+            "capture.firehose_client"
+        ) as mock_firehose:
+            mock_parse_qs.return_value = mock_input_data(
+                custom_data={"text": ["async"], "trigger_id": ["dummy-trigger-id"]}
+            )
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            func.lambda_handler(mock_event(), None)
+            # Sent by the publisher thread, after the response
+            func.command_events.handoff.join()
+
+            kwargs = mock_firehose.put_record.call_args.kwargs
+            self.assertEqual(kwargs["DeliveryStreamName"], "Dummy-Capture")
+            record = json.loads(kwargs["Record"]["Data"])
+            self.assertEqual(record["params"]["text"], ["async"])
+            for field in ["response_url", "token", "trigger_id"]:
+                self.assertNotIn(field, record["params"])
+            self.assertIn("response_url", mock_parse_qs.return_value)
+
+    def test_lambda_handler_command_route(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            for text, function_name, invocation_type in [
+                ("Report weekly", "Dummy-Command-report", "Event"),
+                ("status prod", "Dummy-Command-status", "RequestResponse"),
+                ("async report", "Dummy-AsyncWorker", "Event"),
+            ]:
+                mock_parse_qs.return_value = mock_input_data(custom_data={"text": [text]})
+
+                func.lambda_handler(mock_event(), None)
+
+                kwargs = mock_lambda_invoke.call_args.kwargs
+                self.assertEqual(kwargs["FunctionName"], function_name)
+                self.assertEqual(kwargs["InvocationType"], invocation_type)
+
+    def test_lambda_handler_interaction_block_actions(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_interaction()
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            self.assertEqual(ret, {"body": "", "statusCode": "200"})
+            kwargs = mock_lambda_invoke.call_args.kwargs
+            self.assertEqual(kwargs["FunctionName"], "Dummy-Command-report")
+            self.assertEqual(kwargs["InvocationType"], "Event")
+            payload = json.loads(kwargs["Payload"])
+            self.assertEqual(payload["command"], ["/slack-unittest"])
+            self.assertEqual(payload["text"], ["report weekly"])
+            self.assertEqual(payload["response_url"], ["https://hooks.slack.com/commands/dummy"])
+            self.assertNotIn("trigger_id", payload)
+            interaction = json.loads(payload["interaction"][0])
+            self.assertEqual(interaction["actions"][0]["action_id"], "run-report")
+            for field in ["response_url", "token", "trigger_id"]:
+                self.assertNotIn(field, interaction)
+
+    def test_lambda_handler_interaction_always_async(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            for interaction, text in [
+                ({"type": "shortcut", "callback_id": "help", "channel": None}, "help"),
+                ({"type": "message_action", "callback_id": "status"}, "status"),
+                (
+                    {
+                        "type": "view_submission",
+                        "view": {"callback_id": "sync feedback"},
+                        "channel": None,
+                        "response_urls": [
+                            {
+                                "channel_id": "C1111111111",
+                                "response_url": "https://hooks.slack.com/app/dummy",
+                            }
+                        ],
+                    },
+                    "sync feedback",
+                ),
+            ]:
+                mock_parse_qs.return_value = mock_interaction(interaction)
+
+                ret = func.lambda_handler(mock_event(), None)
+
+                self.assertEqual(ret, {"body": "", "statusCode": "200"})
+                kwargs = mock_lambda_invoke.call_args.kwargs
+                self.assertEqual(kwargs["FunctionName"], "Dummy-AsyncWorker")
+                self.assertEqual(kwargs["InvocationType"], "Event")
+                self.assertEqual(json.loads(kwargs["Payload"])["text"], [text])
+
+    def test_lambda_handler_interaction_failed_invalid_channel_id(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_interaction(
+                {"channel": {"id": "C3333333333", "name": "dummy-channel-c"}}
+            )
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Sorry <@dummy-user-id-a>, this app does not support this channel ID C3333333333."
+                ),
+            )
+
+    def test_lambda_handler_adaptive_route(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "route_latency.ROUTE_LATENCY_TABLE_NAME", "Dummy-RouteLatency"
+        ), patch(
+            "route_latency.predict",
+            side_effect=lambda route: {"export": 5000, "lookup": 50}.get(route),
+        ):
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            for text, function_name in [
+                ("export all", "Dummy-AsyncWorker"),
+                ("lookup", "Dummy-SyncWorker"),
+                ("hello", "Dummy-SyncWorker"),
+                ("sync export all", "Dummy-SyncWorker"),
+                ("async lookup", "Dummy-AsyncWorker"),
+            ]:
+                mock_parse_qs.return_value = mock_input_data(custom_data={"text": [text]})
+
+                func.lambda_handler(mock_event(), None)
+
+                self.assertEqual(mock_lambda_invoke.call_args.kwargs["FunctionName"], function_name)
+
+            payload = json.loads(mock_lambda_invoke.call_args.kwargs["Payload"])
+            self.assertEqual(payload["latency_route"], "lookup")
+
+    def test_lambda_handler_sync_latency_observed(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "route_latency.observe"
+        ) as mock_observe:
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            for text in ["lookup", "status prod"]:
+                mock_parse_qs.return_value = mock_input_data(custom_data={"text": [text]})
+
+                func.lambda_handler(mock_event(), None)
+
+            # status has its own function and mode
+            mock_observe.assert_called_once()
+            self.assertEqual(mock_observe.call_args.args[0], "lookup")
+
+    def test_lambda_handler_sync_worker_too_slow(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke",
+            side_effect=ReadTimeoutError(endpoint_url="https://lambda"),
+        ) as mock_lambda_invoke, patch(
+            "ImmediateResponse.aws_clients.client", return_value=func.lambda_client
+        ) as mock_client:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["sync export all"]})
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            # Not invoked again: the worker may still be running
+            mock_lambda_invoke.assert_called_once()
+            self.assertEqual(mock_client.call_args.args, ("lambda", "lambda_sync"))
+            # Within the time left of Slack's 3 seconds
+            read_timeout = mock_client.call_args.kwargs["read_timeout"]
+            self.assertLessEqual(read_timeout, (3000 - func.ADAPTIVE_ROUTING_MARGIN_MS) / 1000)
+            self.assertGreater(read_timeout, 2)
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "<@dummy-user-id-a>, your request on dummy-channel-a `/slack-unittest sync export all` cannot be processed at the moment. Please try again later."
+                ),
+            )
+
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["status prod"]})
+            func.lambda_handler(mock_event(), None)
+
+            # The timeout of the command's own function, which is shorter
+            self.assertEqual(mock_client.call_args.kwargs["read_timeout"], 1)
+
+    def test_lambda_handler_sync_timeout_observed(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke",
+            side_effect=ReadTimeoutError(endpoint_url="https://lambda"),
+        ), patch(
+            "route_latency.observe"
+        ) as mock_observe:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["export all"]})
+
+            func.lambda_handler(mock_event(), None)
+
+            # A new route which times out is learned as slow, so it is routed to the async worker
+            route, latency_ms = mock_observe.call_args.args
+            self.assertEqual(route, "export")
+            self.assertGreaterEqual(latency_ms, 1000)
+
+    def test_lambda_handler_slow_sync_workers_keep_breaker_closed(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke",
+            side_effect=ReadTimeoutError(endpoint_url="https://lambda"),
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["sync export all"]})
+            for _ in range(func.lambda_breaker.minimum_calls + 1):
+                func.lambda_handler(mock_event(), None)
+
+            self.assertEqual(func.lambda_breaker.state, "closed")
+            mock_lambda_invoke.side_effect = None
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async export all"]})
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            self.assertEqual(mock_lambda_invoke.call_args.kwargs["InvocationType"], "Event")
+            self.assertIn("Processing request", json.loads(ret["body"])["text"])
+
+    def test_lambda_handler_single_flight_follower_async(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "single_flight.acquire", return_value="follower"
+        ) as mock_acquire:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async status"]})
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            self.assertEqual(
+                mock_acquire.call_args.args[1], "https://hooks.slack.com/commands/dummy"
+            )
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Processing request from <@dummy-user-id-a> on dummy-channel-a: /slack-unittest"
+                    " async status (joined the same request already running)"
+                ),
+            )
+
+    def test_lambda_handler_single_flight_follower_sync(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "single_flight.acquire", return_value="follower"
+        ), patch(
+            "single_flight.wait_for_result", return_value="prod is up"
+        ) as mock_wait_for_result:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["sync status"]})
+            # Received by API Gateway 1.5 s ago
+            event = mock_event()
+            event["requestContext"] = {"requestTimeEpoch": time.time() * 1000 - 1500}
+
+            ret = func.lambda_handler(event, None)
+
+            mock_lambda_invoke.assert_not_called()
+            wait_ms = mock_wait_for_result.call_args.args[1]
+            self.assertLessEqual(wait_ms, 3000 - 1500 - func.ADAPTIVE_ROUTING_MARGIN_MS)
+            self.assertGreater(wait_ms, 900)
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "<@dummy-user-id-a>: /slack-unittest sync status\nprod is up",
+            )
+
+    def test_lambda_handler_single_flight_leader_async(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "single_flight.SINGLE_FLIGHT_TABLE_NAME", "Dummy-SingleFlight"
+        ), patch(
+            "single_flight.acquire", return_value="leader"
+        ):
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async status"]})
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            func.lambda_handler(mock_event(), None)
+
+            payload = json.loads(mock_lambda_invoke.call_args.kwargs["Payload"])
+            self.assertEqual(
+                payload["single_flight_key"],
+                func.single_flight.coalescing_key(
+                    "Dummy-AsyncWorker", "async status", "T1111111111"
+                ),
+            )
+
+    def test_lambda_handler_single_flight_leader_error(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke", side_effect=Exception("unexpected")
+        ), patch(
+            "single_flight.SINGLE_FLIGHT_TABLE_NAME", "Dummy-SingleFlight"
+        ), patch(
+            "single_flight.acquire", return_value="leader"
+        ), patch(
+            "single_flight.complete"
+        ) as mock_complete, patch(
+            "jobs.JOBS_TABLE_NAME", "Dummy-Jobs"
+        ), patch(
+            "jobs.create", return_value="0123456789ab"
+        ), patch(
+            "jobs.finish"
+        ) as mock_finish:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async status"]})
+
+            with self.assertRaises(Exception):
+                func.lambda_handler(mock_event(), None)
+
+            # The followers and the job status do not wait for the lease to expire
+            mock_complete.assert_called_once_with(
+                func.single_flight.coalescing_key(
+                    "Dummy-AsyncWorker", "async status", "T1111111111"
+                )
+            )
+            mock_finish.assert_called_once_with("0123456789ab", "failed")
+
+    def test_lambda_handler_ping(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(
+                custom_data={
+                    "team_domain": ["companyb"],
+                    "team_id": ["T2222222222"],
+                    "text": ["ping"],
+                }
+            )
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+            event = mock_event() | {"requestContext": {"requestTimeEpoch": 1700000000000}}
+
+            ret = func.lambda_handler(event, None)
+
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Pinging for <@dummy-user-id-a> on dummy-channel-a, the latency breakdown follows"
+                ),
+            )
+            kwargs = mock_lambda_invoke.call_args.kwargs
+            self.assertEqual(kwargs["FunctionName"], "Dummy-AsyncWorker-B")
+            self.assertEqual(kwargs["InvocationType"], "Event")
+            probe = json.loads(kwargs["Payload"])["ping"]
+            self.assertEqual(probe["request_time_ms"], 1700000000000)
+            self.assertLessEqual(probe["received_at_ms"], probe["dispatched_at_ms"])
+            self.assertIn("immediate_response_cold", probe)
+
+    def test_lambda_handler_job_tracked(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "jobs.JOBS_TABLE_NAME", "Dummy-Jobs"
+        ), patch(
+            "jobs.create", return_value="0123456789ab"
+        ) as mock_create:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async export"]})
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_create.assert_called_once_with(
+                "Dummy-AsyncWorker", "T1111111111", "dummy-user-id-a", "async export"
+            )
+            payload = json.loads(mock_lambda_invoke.call_args.kwargs["Payload"])
+            self.assertEqual(payload["job_id"], "0123456789ab")
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Processing request from <@dummy-user-id-a> on dummy-channel-a:"
+                    + " /slack-unittest async export (job `0123456789ab`)"
+                ),
+            )
+
+    def test_lambda_handler_jobs_subcommand(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "jobs.JOBS_TABLE_NAME", "Dummy-Jobs"
+        ), patch(
+            "jobs.answer", return_value="No job 0123456789ab."
+        ) as mock_answer:
+            mock_parse_qs.return_value = mock_input_data(
+                custom_data={"text": ["status 0123456789ab"]}
+            )
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            mock_answer.assert_called_once_with(
+                "status 0123456789ab", "T1111111111", "dummy-user-id-a"
+            )
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "<@dummy-user-id-a>: /slack-unittest status 0123456789ab\nNo job 0123456789ab.",
+            )
+
+    def test_lambda_handler_command_events_handed_to_worker(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch(
+            "command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"
+        ), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async export"]})
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            func.lambda_handler(mock_event(), SimpleNamespace(aws_request_id="dummy-request-id"))
+            func.command_events.handoff.join()
+
+            # Published by the worker
+            mock_events.put_events.assert_not_called()
+            payload = json.loads(mock_lambda_invoke.call_args.kwargs["Payload"])
+            events = payload["command_events"]
+            self.assertEqual([e["stage"] for e in events], ["received", "authorized", "dispatched"])
+            self.assertEqual({e["request_id"] for e in events}, {"dummy-request-id"})
+            self.assertEqual(events[0]["text"], "async export")
+            self.assertEqual(events[2]["function"], "Dummy-AsyncWorker")
+
+    def test_lambda_handler_command_events_published(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"
+        ), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["help"]})
+            mock_events.put_events.return_value = {"FailedEntryCount": 0}
+
+            func.lambda_handler(mock_event(), SimpleNamespace(aws_request_id="dummy-request-id"))
+            # Published by the publisher thread, after the response
+            func.command_events.handoff.join()
+
+            mock_events.put_events.assert_called_once()
+            entries = mock_events.put_events.call_args.kwargs["Entries"]
+            self.assertEqual(
+                [e["DetailType"] for e in entries],
+                ["command.received", "command.authorized", "command.completed"],
+            )
+            self.assertEqual(json.loads(entries[2]["Detail"])["route"], "static")
+            self.assertEqual(func.command_events.pending, [])
+
+    def test_lambda_handler_static_response(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["Help me"]})
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "<@dummy-user-id-a>: /slack-unittest Help me\nUsage: /slack-unittest [async] <text>",
+            )
+
+    def test_lambda_handler_static_response_team_variant(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(
+                custom_data={"team_domain": ["companyb"], "team_id": ["T2222222222"]}
+            )
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "<@dummy-user-id-a>: /slack-unittest help\nUsage for company B",
+            )
+
+    def test_lambda_handler_static_response_no_team_variant(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(
+                custom_data={
+                    "team_domain": ["companyb"],
+                    "team_id": ["T2222222222"],
+                    "text": ["about"],
+                }
+            )
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+
+            func.lambda_handler(mock_event(), None)
+
+            # No variant for company B and no default: handled by its worker
+            self.assertEqual(
+                mock_lambda_invoke.call_args.kwargs["FunctionName"], "Dummy-SyncWorker-B"
+            )
+
+    def test_authenticate_token_cached(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ) as mock_get_parameter:
+            app = func.slack_apps.get_app("APIID123456")
+            self.assertTrue(func.authenticate("dummy-token", app))
+            self.assertFalse(func.authenticate("other-token", app))
+            mock_get_parameter.assert_called_once_with(
+                Name="/apps/slack_app/dummy/token", WithDecryption=True
+            )
+
+    def test_reconnect_after_restore(self):
+        func.secret_cache["/apps/slack_app/dummy/token"] = ("snapshotted-token", float("inf"))
+        lambda_client = func.lambda_client
+        func.aws_clients.stub("lambda", None)
+
+        func.reconnect()
+
+        self.assertEqual(func.secret_cache, {})
+        self.assertIsNot(func.lambda_client, lambda_client)
+
+    def test_lambda_handler_lambda_api_unavailable(self):
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            return_value={"Parameter": {"Value": "dummy-token"}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke", side_effect=Exception("throttled")
+        ) as mock_lambda_invoke:
+            mock_parse_qs.return_value = mock_input_data(custom_data={"text": ["async"]})
+
+            for _ in range(func.lambda_breaker.minimum_calls):
+                with self.assertRaises(Exception):
+                    func.lambda_handler(mock_event(), None)
+            mock_lambda_invoke.reset_mock()
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_lambda_invoke.assert_not_called()
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Sorry <@dummy-user-id-a>, the app cannot reach a service it depends on. Please try again shortly."
+                ),
+            )
+
     def test_lambda_handler_failed_no_token(self):
+        with patch("ImmediateResponse.ssm_client.get_parameter") as mock_get_parameter, patch(
+            "ImmediateResponse.parse_qs"
+        ) as mock_parse_qs:
+            data = mock_input_data()
+            del data["token"]
+            mock_parse_qs.return_value = data
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_get_parameter.assert_not_called()
+            self.assertEqual(ret["statusCode"], "400")
+            self.assertEqual(json.loads(ret["body"]), {"error": "missing field token"})
+
+    def test_lambda_handler_failed_wrong_token(self):
         with patch(
             "ImmediateResponse.ssm_client.get_parameter",
             return_value={"Parameter": {"Value": "dummy-token"}},
         ), patch("ImmediateResponse.parse_qs") as mock_parse_qs:
-            mock_parse_qs.return_value = mock_input_data({"token": [None]})
+            mock_parse_qs.return_value = mock_input_data({"token": ["wrong-token"]})
 
             ret = func.lambda_handler(mock_event(), None)
 
@@ -90,6 +813,37 @@ class TestFunction(unittest.TestCase):
                 ),
             )
 
+    def test_lambda_handler_rejected_early(self):
+        with patch("ImmediateResponse.ssm_client.get_parameter") as mock_get_parameter, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke, patch("request_validation.put_metric") as mock_put_metric:
+            for event, status_code, reason in [
+                (mock_event(body="x" * 70000), "413", "body_too_large"),
+                (mock_event(content_type="application/json"), "415", "content_type"),
+                ({"body": urlencode(mock_input_data(), doseq=True)}, "415", "content_type"),
+                (mock_event(body="GET / HTTP/1.1"), "400", "missing_field"),
+                (
+                    mock_event(body=urlencode(mock_input_data({"team_id": ["T1\n"]}), doseq=True)),
+                    "400",
+                    "invalid_field",
+                ),
+                (mock_event(body="payload=%7Bnot+json"), "400", "malformed"),
+                (
+                    mock_event(body=urlencode({"payload": '{"type": "shortcut"}'})),
+                    "400",
+                    "malformed",
+                ),
+            ]:
+                ret = func.lambda_handler(event, None)
+
+                self.assertEqual(ret["statusCode"], status_code)
+                mock_put_metric.assert_called_with(
+                    "RequestsRejected", dimensions={"Reason": reason}
+                )
+
+            mock_get_parameter.assert_not_called()
+            mock_lambda_invoke.assert_not_called()
+
     def test_lambda_handler_failed_invalid_team_domain(self):
         with patch(
             "ImmediateResponse.ssm_client.get_parameter",
@@ -138,6 +892,70 @@ class TestFunction(unittest.TestCase):
                 ),
             )
 
+    def test_lambda_handler_second_app(self):
+        tokens = {
+            "/apps/slack_app/dummy/token": "dummy-token",
+            "/apps/other_app/dummy/token": "other-token",
+        }
+        with patch(
+            "ImmediateResponse.ssm_client.get_parameter",
+            side_effect=lambda Name, WithDecryption: {"Parameter": {"Value": tokens[Name]}},
+        ), patch("ImmediateResponse.parse_qs") as mock_parse_qs, patch(
+            "ImmediateResponse.lambda_client.invoke"
+        ) as mock_lambda_invoke:
+            mock_lambda_invoke.return_value = MOCK_LAMBDA_INVOKE_RESPONSE
+            mock_parse_qs.return_value = mock_input_data(
+                {
+                    "api_app_id": ["APIID654321"],
+                    "channel_id": ["C2222222222"],
+                    "command": ["/other-unittest"],
+                    "team_domain": ["companyb"],
+                    "team_id": ["T2222222222"],
+                    "text": ["async"],
+                    "token": ["other-token"],
+                }
+            )
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "Processing request from <@dummy-user-id-a> on dummy-channel-a: /other-unittest async",
+            )
+
+            # The apps' commands and teams are kept apart
+            mock_parse_qs.return_value["command"] = ["/slack-unittest"]
+            ret = func.lambda_handler(mock_event(), None)
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "<@dummy-user-id-a>, this app does not support `/slack-unittest async`.",
+            )
+
+            mock_parse_qs.return_value = mock_input_data(
+                {"api_app_id": ["APIID654321"], "token": ["other-token"]}
+            )
+            ret = func.lambda_handler(mock_event(), None)
+            self.assertEqual(
+                json.loads(ret["body"])["text"],
+                "Sorry <@dummy-user-id-a>, this app does not support this team ID T1111111111.",
+            )
+
+    def test_lambda_handler_failed_invalid_app_id(self):
+        with patch("ImmediateResponse.ssm_client.get_parameter") as mock_get_parameter, patch(
+            "ImmediateResponse.parse_qs"
+        ) as mock_parse_qs:
+            mock_parse_qs.return_value = mock_input_data({"api_app_id": ["APIID000000"]})
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_get_parameter.assert_not_called()
+            self.assertDictEqual(
+                ret,
+                mock_response(
+                    "Sorry <@dummy-user-id-a>, this app does not support this app ID APIID000000."
+                ),
+            )
+
     def test_lambda_handler_failed_invalid_command(self):
         with patch(
             "ImmediateResponse.ssm_client.get_parameter",
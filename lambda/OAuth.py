@@ -1,6 +1,8 @@
 """
 Perform OAuth 2.0 flow and turn the auth code into access token then store it in a DynamoDB table.
 
+The redirect URL of each Slack app served is /oauth2/<app ID>; /oauth2 is the one of the first app.
+
 For details of Slack OAuth 2.0 v2 see
 - https://api.slack.com/authentication/oauth-v2
 - https://api.slack.com/methods/oauth.v2.access
@@ -11,38 +13,45 @@ import os
 from datetime import datetime
 from urllib.parse import urlencode
 
-import boto3
 import urllib3
 
+import aws_clients
+import slack_apps
+import snapstart
+import tracing
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import put_cold_start_metric
+from warmup import is_warmup_event, warmup_response
+
 logging.getLogger().setLevel(logging.INFO)
 logging.getLogger("botocore").setLevel(logging.CRITICAL)
 logging.getLogger("boto3").setLevel(logging.CRITICAL)
 logging.getLogger("urllib3.connectionpool").setLevel(logging.CRITICAL)
 
-SLACK_APP_ID = os.environ.get("SlackAppId")
-SLACK_APP_CLIENT_ID_PARAMETER_KEY = os.environ.get("SlackAppClientIdParameterKey")
-SLACK_APP_CLIENT_SECRET_PARAMETER_KEY = os.environ.get("SlackAppClientSecretParameterKey")
 SLACK_API_OAUTH_V2_URL = "https://slack.com/api/oauth.v2.access"
-SLACK_CHANNEL_IDS = list(map(str.strip, os.environ.get("SlackChannelIds", "").split(",")))
-SLACK_TEAM_IDS = list(map(str.strip, os.environ.get("SlackTeamIds", "").split(",")))
 OAUTH_DDB_TABLE_NAME = os.environ.get("OAuthDynamoDBTable")
 
 IS_AWS_SAM_LOCAL = os.environ.get("AWS_SAM_LOCAL") == "true"
-TARGET_REGION = os.environ.get("AWS_REGION", "ap-southeast-2")
 
-oauth_table = boto3.resource("dynamodb", region_name=TARGET_REGION).Table(OAUTH_DDB_TABLE_NAME)
+oauth_table = aws_clients.table(OAUTH_DDB_TABLE_NAME)
 http = urllib3.PoolManager()
 
+# Fail fast while slack.com is degraded
+slack_breaker = CircuitBreaker.from_settings("slack", slow_call_ms=2000)
+
+# Client ID and secret of the apps, read on first use: {app_id: (client_id, client_secret)}
+credentials_cache = {}
 
-def retrieve_client_credentials():
+
+def retrieve_client_credentials(app):
     try:
-        ssm_client = boto3.client("ssm", region_name=TARGET_REGION)
-        v1 = ssm_client.get_parameter(Name=SLACK_APP_CLIENT_ID_PARAMETER_KEY, WithDecryption=True)[
+        ssm_client = aws_clients.client("ssm")
+        v1 = ssm_client.get_parameter(Name=app["client_id_parameter_key"], WithDecryption=True)[
+            "Parameter"
+        ]["Value"]
+        v2 = ssm_client.get_parameter(Name=app["client_secret_parameter_key"], WithDecryption=True)[
             "Parameter"
         ]["Value"]
-        v2 = ssm_client.get_parameter(
-            Name=SLACK_APP_CLIENT_SECRET_PARAMETER_KEY, WithDecryption=True
-        )["Parameter"]["Value"]
         return v1, v2
     except Exception as e:
         if IS_AWS_SAM_LOCAL is False:
@@ -50,25 +59,37 @@ def retrieve_client_credentials():
     return None, None
 
 
-CLIENT_ID, CLIENT_SECRET = retrieve_client_credentials()
+@snapstart.after_restore
+def reconnect():
+    """Replace the clients, connections and credentials copied from the SnapStart snapshot"""
+    global oauth_table
+    aws_clients.reset()
+    oauth_table = aws_clients.table(OAUTH_DDB_TABLE_NAME)
+    http.clear()
+    credentials_cache.clear()
 
 
-def client_credentials():
-    """Return CLIENT_ID, CLIENT_SECRET. Defined for mocking CLIENT_ID, CLIENT_SECRET content"""
-    return CLIENT_ID, CLIENT_SECRET
+def client_credentials(app_id):
+    """Return the client ID and secret of the app, cached in the container once read"""
+    if app_id not in credentials_cache:
+        credentials = retrieve_client_credentials(slack_apps.get_app(app_id))
+        if None in credentials:
+            return credentials
+        credentials_cache[app_id] = credentials
+    return credentials_cache[app_id]
 
 
-def authorize(response_data):
-    """Check if app is invoked from the expected domain channel"""
+def authorize(response_data, app_id):
+    """Check if the app is installed from its expected team and channel"""
     try:
-        app_id = response_data["app_id"]
+        app = slack_apps.get_app(app_id)
         team_id = response_data["team"]["id"]
         channel_id = response_data["incoming_webhook"]["channel_id"]
 
         if (
-            app_id == SLACK_APP_ID
-            and team_id in SLACK_TEAM_IDS
-            and channel_id in SLACK_CHANNEL_IDS
+            response_data["app_id"] == app_id
+            and team_id in app["team_ids"]
+            and channel_id in app["channel_ids"]
         ):
             return True
 
@@ -88,21 +109,34 @@ def put_data_to_dynamodb(response_data):
             elif k not in ["ok"]:
                 data[k] = v
 
-        oauth_table.put_item(TableName=OAUTH_DDB_TABLE_NAME, Item=data)
+        with tracing.span("dynamodb.put_item"):
+            oauth_table.put_item(TableName=OAUTH_DDB_TABLE_NAME, Item=data)
     except Exception as e:
         logging.error(e)
 
 
+@tracing.traced_handler("OAuth")
 def lambda_handler(event, context):
+    put_cold_start_metric(event)
+    if is_warmup_event(event):
+        return warmup_response(event)
+
     logging.info(json.dumps(event))
 
     auth_code = event.get("queryStringParameters", {}).get("code")
     logging.info(auth_code)
 
+    app_id = (event.get("pathParameters") or {}).get("app_id", slack_apps.DEFAULT_APP_ID)
+    if slack_apps.get_app(app_id) is None:
+        return {
+            "statusCode": 404,
+            "body": json.dumps(f"Error: Unknown app {app_id}."),
+        }
+
     if auth_code:
         # Turn the auth code into access token
 
-        client_id, client_secret = client_credentials()
+        client_id, client_secret = client_credentials(app_id)
         data = {
             "code": auth_code,
             "client_id": client_id,
@@ -110,16 +144,28 @@ def lambda_handler(event, context):
         }
         encoded_args = urlencode(data)
         url = f"{SLACK_API_OAUTH_V2_URL}?{encoded_args}"
-        resp = http.request(
-            "POST", url, headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
+        try:
+            with tracing.span("http.post", target=SLACK_API_OAUTH_V2_URL) as span:
+                resp = slack_breaker.call(
+                    http.request,
+                    "POST",
+                    url,
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                    is_failure=lambda r: r.status >= 500,
+                )
+                span.set_attribute("status", resp.status)
+        except CircuitOpenError:
+            return {
+                "statusCode": 503,
+                "body": json.dumps("Error: Slack is not available. Please try again shortly."),
+            }
 
         status = resp.status
         resp_data = json.loads(resp.data.decode("utf-8"))
         logging.info(resp_data)
 
         if resp_data.get("ok", False) is True:
-            if authorize(resp_data):
+            if authorize(resp_data, app_id):
                 message = "Installation request accepted and registration completed."
                 put_data_to_dynamodb(resp_data)
             else:
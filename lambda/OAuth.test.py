@@ -7,23 +7,37 @@ import unittest
 from dataclasses import dataclass
 from unittest.mock import patch
 
-os.environ["SlackAppId"] = "APIID123456"
-os.environ["SlackAppClientIdParameterKey"] = "/apps/slack_app/dummy/client_id"
-os.environ["SlackAppClientSecretParameterKey"] = "/apps/slack_app/dummy/client_secret"
-os.environ["SlackChannelIds"] = "C1111111111,C2222222222"
-os.environ["SlackTeamIds"] = "T1111111111,T2222222222"
+os.environ["SlackApps"] = json.dumps(
+    {
+        "APIID123456": {
+            "client_id_parameter_key": "/apps/slack_app/dummy/client_id",
+            "client_secret_parameter_key": "/apps/slack_app/dummy/client_secret",
+            "team_ids": ["T1111111111", "T2222222222"],
+            "channel_ids": ["C1111111111", "C2222222222"],
+        },
+        "APIID654321": {
+            "client_id_parameter_key": "/apps/other_app/dummy/client_id",
+            "client_secret_parameter_key": "/apps/other_app/dummy/client_secret",
+            "team_ids": ["T2222222222"],
+            "channel_ids": ["C2222222222"],
+        },
+    }
+)
 os.environ["OAuthDynamoDBTable"] = "DummyDDB"
 func = __import__("OAuth")
 
 MOCK_CLIENT_CREDENTIALS = "test-client-id", "test-client-secret"
 
 
-def mock_event(code="test_code"):
-    return {
+def mock_event(code="test_code", app_id=None):
+    event = {
         "queryStringParameters": {
             "code": code,
         }
     }
+    if app_id:
+        event["pathParameters"] = {"app_id": app_id}
+    return event
 
 
 @dataclass
@@ -45,6 +59,69 @@ def mock_http_response(status=200, ok=True, app_id=None, team_id=None, channel_i
 
 
 class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.slack_breaker.reset()
+
+    def test_lambda_handler_warmup(self):
+        with patch("urllib3.PoolManager.request") as mock_http_request, patch(
+            "OAuth.oauth_table.put_item"
+        ) as mock_table_put_item, patch("OAuth.logging.info") as mock_log:
+            ret = func.lambda_handler({"warmup": True}, None)
+
+            mock_http_request.assert_not_called()
+            mock_table_put_item.assert_not_called()
+            mock_log.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
+    def test_reconnect_after_restore(self):
+        func.credentials_cache["APIID123456"] = MOCK_CLIENT_CREDENTIALS
+        with patch("OAuth.http.clear") as mock_http_clear:
+            func.reconnect()
+
+            self.assertEqual(func.credentials_cache, {})
+            mock_http_clear.assert_called_once()
+
+    def test_client_credentials_cached_per_app(self):
+        with patch(
+            "OAuth.retrieve_client_credentials", side_effect=lambda app: (app["team_ids"][0], "s")
+        ) as mock_retrieve, patch.dict(func.credentials_cache, clear=True):
+            self.assertEqual(func.client_credentials("APIID123456"), ("T1111111111", "s"))
+            self.assertEqual(func.client_credentials("APIID654321"), ("T2222222222", "s"))
+            self.assertEqual(func.client_credentials("APIID123456"), ("T1111111111", "s"))
+            self.assertEqual(mock_retrieve.call_count, 2)
+
+    def test_lambda_handler_second_app(self):
+        with patch(
+            "OAuth.client_credentials", return_value=MOCK_CLIENT_CREDENTIALS
+        ) as mock_client_credentials, patch(
+            "urllib3.PoolManager.request"
+        ) as mock_http_request, patch(
+            "OAuth.oauth_table.put_item"
+        ) as mock_table_put_item:
+            mock_http_request.return_value = mock_http_response(
+                app_id="APIID654321", team_id="T2222222222", channel_id="C2222222222"
+            )
+
+            ret = func.lambda_handler(mock_event(app_id="APIID654321"), None)
+
+            mock_client_credentials.assert_called_once_with("APIID654321")
+            mock_table_put_item.assert_called_once()
+            self.assertEqual(ret["statusCode"], 200)
+
+            # Only the teams of the app can install it
+            mock_http_request.return_value = mock_http_response(
+                app_id="APIID654321", team_id="T1111111111", channel_id="C2222222222"
+            )
+            ret = func.lambda_handler(mock_event(app_id="APIID654321"), None)
+            self.assertEqual(ret["statusCode"], 403)
+
+    def test_lambda_handler_unknown_app(self):
+        with patch("OAuth.client_credentials") as mock_client_credentials:
+            ret = func.lambda_handler(mock_event(app_id="APIID000000"), None)
+
+            mock_client_credentials.assert_not_called()
+            self.assertEqual(ret, {"body": '"Error: Unknown app APIID000000."', "statusCode": 404})
+
     def test_lambda_handler_no_auth_code(self):
         ret = func.lambda_handler(mock_event(None), None)
         self.assertEqual(
@@ -75,6 +152,28 @@ class TestFunction(unittest.TestCase):
                 },
             )
 
+    def test_lambda_handler_slack_unavailable(self):
+        with patch("OAuth.client_credentials", return_value=MOCK_CLIENT_CREDENTIALS), patch(
+            "urllib3.PoolManager.request"
+        ) as mock_http_request, patch("OAuth.oauth_table.put_item") as mock_table_put_item:
+            mock_http_request.return_value = mock_http_response(503, ok=False)
+
+            for _ in range(func.slack_breaker.minimum_calls):
+                func.lambda_handler(mock_event(), None)
+            mock_http_request.reset_mock()
+
+            ret = func.lambda_handler(mock_event(), None)
+
+            mock_http_request.assert_not_called()
+            mock_table_put_item.assert_not_called()
+            self.assertEqual(
+                ret,
+                {
+                    "body": '"Error: Slack is not available. Please try again shortly."',
+                    "statusCode": 503,
+                },
+            )
+
     def test_lambda_handler_oauth2_failed(self):
         with patch("OAuth.client_credentials", return_value=MOCK_CLIENT_CREDENTIALS), patch(
             "urllib3.PoolManager.request"
@@ -0,0 +1,121 @@
+"""
+SlackEvents receives Slack Events API requests (https://api.slack.com/apis/connections/events-api)
+- answers the url_verification challenge,
+- queues app_uninstalled and tokens_revoked events for TokenCleanup,
+- acknowledges every request straight away, as Slack expects a response within 3 seconds.
+"""
+import json
+import logging
+import os
+import time
+
+import aws_clients
+import slack_apps
+import snapstart
+import tracing
+from metrics import put_cold_start_metric
+from warmup import is_warmup_event, warmup_response
+
+logging.getLogger().setLevel(logging.INFO)
+
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get("SecretCacheTtlSeconds", "300"))
+TOKEN_CLEANUP_QUEUE_URL = os.environ.get("TokenCleanupQueueUrl")
+CLEANUP_EVENT_TYPES = ["app_uninstalled", "tokens_revoked"]
+
+IS_AWS_SAM_LOCAL = os.environ.get("AWS_SAM_LOCAL") == "true"
+
+sqs_client = aws_clients.client("sqs")
+ssm_client = aws_clients.client("ssm")
+
+# {key: (value, expiry)}
+secret_cache = {}
+
+
+@snapstart.after_restore
+def reconnect():
+    """Replace the clients and secrets copied from the SnapStart snapshot"""
+    global sqs_client, ssm_client
+    aws_clients.reset()
+    sqs_client = aws_clients.client("sqs")
+    ssm_client = aws_clients.client("ssm")
+    secret_cache.clear()
+
+
+def respond(status, body=""):
+    return {
+        "body": body,
+        "headers": {
+            "Content-Type": "text/plain",
+        },
+        "statusCode": status,
+    }
+
+
+def get_secret(parameter_key):
+    """Return the value of an SSM SecureString parameter, cached in the container"""
+    value, expiry = secret_cache.get(parameter_key, (None, 0))
+    now = time.monotonic()
+    if now >= expiry:
+        resp = ssm_client.get_parameter(Name=parameter_key, WithDecryption=True)
+        value = resp["Parameter"]["Value"]
+        secret_cache[parameter_key] = (value, now + SECRET_CACHE_TTL_SECONDS)
+    return value
+
+
+def authenticate(token, app_id):
+    """Verify the token passed in against the token of the app.
+
+    url_verification requests and events of other apps are checked against the token of every app.
+    """
+    if IS_AWS_SAM_LOCAL is True:
+        return True
+
+    app = slack_apps.get_app(app_id)
+    apps = [app] if app is not None else list(slack_apps.SLACK_APPS.values())
+    try:
+        return any(token == get_secret(a["verification_token_parameter_key"]) for a in apps)
+    except Exception as e:
+        logging.error(f"Unable to retrieve data from parameter store: {e}")
+        return False
+
+
+def queue_cleanup(body):
+    """Queue the event for TokenCleanup, which deletes the affected installations in batches"""
+    message = {
+        "api_app_id": body.get("api_app_id"),
+        "event": body["event"],
+        "event_id": body.get("event_id"),
+        "team_id": body.get("team_id"),
+    }
+    with tracing.span("sqs.send_message"):
+        sqs_client.send_message(QueueUrl=TOKEN_CLEANUP_QUEUE_URL, MessageBody=json.dumps(message))
+
+
+@tracing.traced_handler("SlackEvents")
+def lambda_handler(event, context):
+    put_cold_start_metric(event)
+    if is_warmup_event(event):
+        return warmup_response(event)
+
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except ValueError:
+        return respond(400)
+
+    if authenticate(body.get("token"), body.get("api_app_id")) is False:
+        logging.error("Request token does not match expected")
+        return respond(401)
+
+    if body.get("type") == "url_verification":
+        return respond(200, body.get("challenge", ""))
+
+    event_type = body.get("event", {}).get("type")
+    logging.info(f"Received {event_type} ({body.get('event_id')}) from team {body.get('team_id')}")
+
+    if slack_apps.get_app(body.get("api_app_id")) is None:
+        logging.error(f"Ignored event for app ID {body.get('api_app_id')}")
+    elif body.get("type") == "event_callback" and event_type in CLEANUP_EVENT_TYPES:
+        queue_cleanup(body)
+
+    # Slack retries deliveries which are not acknowledged with a 2xx
+    return respond(200)
@@ -0,0 +1,128 @@
+"""
+Unit tests for SlackEvents.py
+"""
+import json
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ["SlackApps"] = json.dumps(
+    {
+        "APIID123456": {"verification_token_parameter_key": "/apps/slack_app/dummy/token"},
+        "APIID654321": {"verification_token_parameter_key": "/apps/other_app/dummy/token"},
+    }
+)
+os.environ["TokenCleanupQueueUrl"] = "https://sqs.ap-southeast-2.amazonaws.com/123/Dummy"
+func = __import__("SlackEvents")
+
+MOCK_GET_PARAMETER_RESPONSE = {"Parameter": {"Value": "dummy-token"}}
+
+
+def mock_event(event_type="app_uninstalled", token="dummy-token", app_id="APIID123456"):
+    body = {
+        "api_app_id": app_id,
+        "event": {"type": event_type},
+        "event_id": "Ev1111111111",
+        "team_id": "T1111111111",
+        "token": token,
+        "type": "event_callback",
+    }
+    return {"body": json.dumps(body)}
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.secret_cache.clear()
+
+    def test_lambda_handler_warmup(self):
+        with patch("SlackEvents.ssm_client.get_parameter") as mock_get_parameter, patch(
+            "SlackEvents.sqs_client.send_message"
+        ) as mock_send_message:
+            ret = func.lambda_handler({"warmup": True}, None)
+
+            mock_get_parameter.assert_not_called()
+            mock_send_message.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
+    def test_lambda_handler_url_verification(self):
+        body = {"token": "dummy-token", "challenge": "dummy-challenge", "type": "url_verification"}
+        with patch(
+            "SlackEvents.ssm_client.get_parameter", return_value=MOCK_GET_PARAMETER_RESPONSE
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler({"body": json.dumps(body)}, None)
+
+            mock_send_message.assert_not_called()
+            self.assertEqual(ret["statusCode"], 200)
+            self.assertEqual(ret["body"], "dummy-challenge")
+
+    def test_lambda_handler_app_uninstalled(self):
+        with patch(
+            "SlackEvents.ssm_client.get_parameter", return_value=MOCK_GET_PARAMETER_RESPONSE
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler(mock_event(), None)
+
+            self.assertEqual(ret["statusCode"], 200)
+            mock_send_message.assert_called_once()
+            kwargs = mock_send_message.call_args.kwargs
+            self.assertEqual(kwargs["QueueUrl"], os.environ["TokenCleanupQueueUrl"])
+            self.assertEqual(
+                json.loads(kwargs["MessageBody"]),
+                {
+                    "api_app_id": "APIID123456",
+                    "event": {"type": "app_uninstalled"},
+                    "event_id": "Ev1111111111",
+                    "team_id": "T1111111111",
+                },
+            )
+
+    def test_lambda_handler_other_event_ignored(self):
+        with patch(
+            "SlackEvents.ssm_client.get_parameter", return_value=MOCK_GET_PARAMETER_RESPONSE
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler(mock_event(event_type="app_mention"), None)
+
+            mock_send_message.assert_not_called()
+            self.assertEqual(ret["statusCode"], 200)
+
+    def test_lambda_handler_second_app(self):
+        tokens = {
+            "/apps/slack_app/dummy/token": "dummy-token",
+            "/apps/other_app/dummy/token": "other-token",
+        }
+        with patch(
+            "SlackEvents.ssm_client.get_parameter",
+            side_effect=lambda Name, WithDecryption: {"Parameter": {"Value": tokens[Name]}},
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler(mock_event(token="other-token", app_id="APIID654321"), None)
+            self.assertEqual(ret["statusCode"], 200)
+            mock_send_message.assert_called_once()
+
+            # Each app has its own token
+            ret = func.lambda_handler(mock_event(token="dummy-token", app_id="APIID654321"), None)
+            self.assertEqual(ret["statusCode"], 401)
+
+    def test_lambda_handler_other_app_ignored(self):
+        with patch(
+            "SlackEvents.ssm_client.get_parameter", return_value=MOCK_GET_PARAMETER_RESPONSE
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler(mock_event(app_id="APIID999999"), None)
+
+            mock_send_message.assert_not_called()
+            self.assertEqual(ret["statusCode"], 200)
+
+    def test_lambda_handler_invalid_token(self):
+        with patch(
+            "SlackEvents.ssm_client.get_parameter", return_value=MOCK_GET_PARAMETER_RESPONSE
+        ), patch("SlackEvents.sqs_client.send_message") as mock_send_message:
+            ret = func.lambda_handler(mock_event(token="invalid-token"), None)
+
+            mock_send_message.assert_not_called()
+            self.assertEqual(ret["statusCode"], 401)
+
+    def test_lambda_handler_invalid_body(self):
+        ret = func.lambda_handler({"body": "not-json"}, None)
+        self.assertEqual(ret["statusCode"], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,10 +4,19 @@ For processing requests that will take less than 3 seconds to process.
 import json
 import logging
 
+import tracing
+from metrics import put_cold_start_metric
+from warmup import is_warmup_event, warmup_response
+
 logging.getLogger().setLevel(logging.INFO)
 
 
+@tracing.traced_handler("SyncWorker")
 def lambda_handler(event, context):
+    put_cold_start_metric(event)
+    if is_warmup_event(event):
+        return warmup_response(event)
+
     logging.info(json.dumps(event, indent=2))
     user_id = event["user_id"][0]
     command = event["command"][0]
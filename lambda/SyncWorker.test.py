@@ -2,6 +2,7 @@
 Unit tests for SyncWorker.py
 """
 import unittest
+from unittest.mock import patch
 
 func = __import__("SyncWorker")
 
@@ -28,6 +29,12 @@ class TestFunction(unittest.TestCase):
             },
         )
 
+    def test_lambda_handler_warmup(self):
+        with patch("SyncWorker.logging.info") as mock_log:
+            ret = func.lambda_handler({"warmup": True}, None)
+            mock_log.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
 
 if __name__ == "__main__":
     unittest.main()
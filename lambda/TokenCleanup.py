@@ -0,0 +1,144 @@
+"""
+TokenCleanup deletes installations from the OAuth DynamoDB table, in batches from the SQS queue
+filled by SlackEvents.
+
+- app_uninstalled: every installation of the app (api_app_id) in the team is deleted.
+- tokens_revoked: the installations of the revoked bot (bot_user_id) tokens are deleted. An item is
+  keyed by its bot token, so when only its user (authed_user_id) token is revoked, the
+  authed_user_* attributes are removed and the installation is kept.
+
+Failed records are returned in batchItemFailures so that only those are retried.
+"""
+import json
+import logging
+import os
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import aws_clients
+import snapstart
+import tracing
+from metrics import put_cold_start_metric, put_metric
+
+logging.getLogger().setLevel(logging.INFO)
+logging.getLogger("botocore").setLevel(logging.CRITICAL)
+logging.getLogger("boto3").setLevel(logging.CRITICAL)
+
+OAUTH_DDB_TABLE_NAME = os.environ.get("OAuthDynamoDBTable")
+OAUTH_DDB_TEAM_INDEX_NAME = os.environ.get("OAuthDynamoDBTeamIndex", "team_id-index")
+USER_TOKEN_PREFIX = "authed_user_"  # attributes of the user token, see OAuth.py
+
+oauth_table = aws_clients.table(OAUTH_DDB_TABLE_NAME)
+
+
+@snapstart.after_restore
+def reconnect():
+    """Replace the client copied from the SnapStart snapshot"""
+    global oauth_table
+    aws_clients.reset()
+    oauth_table = aws_clients.table(OAUTH_DDB_TABLE_NAME)
+
+
+def get_installations(team_id):
+    """Return all items of the team, via the team_id index"""
+    items = []
+    kwargs = {
+        "IndexName": OAUTH_DDB_TEAM_INDEX_NAME,
+        "KeyConditionExpression": Key("team_id").eq(team_id),
+    }
+    while True:
+        resp = oauth_table.query(**kwargs)
+        items.extend(resp["Items"])
+        if "LastEvaluatedKey" not in resp:
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def is_bot_revoked(item, event):
+    """Check if the item holds a bot token revoked in a tokens_revoked event"""
+    return item.get("bot_user_id") in event.get("tokens", {}).get("bot", [])
+
+
+def is_user_revoked(item, event):
+    """Check if the item holds a user token revoked in a tokens_revoked event"""
+    return item.get("authed_user_id") in event.get("tokens", {}).get("oauth", [])
+
+
+def get_installation_changes(message):
+    """Return the access tokens of the installations to delete, and the installations to remove
+    the user token from ({access_token: item})"""
+    event = message["event"]
+    items = get_installations(message["team_id"])
+    # The team may have installed other apps served by this deployment
+    if message.get("api_app_id"):
+        items = [item for item in items if item.get("app_id") in [None, message["api_app_id"]]]
+    if event["type"] != "tokens_revoked":
+        return [item["access_token"] for item in items], {}
+    return [item["access_token"] for item in items if is_bot_revoked(item, event)], {
+        item["access_token"]: item
+        for item in items
+        if is_user_revoked(item, event) and not is_bot_revoked(item, event)
+    }
+
+
+def remove_user_token(item):
+    """Remove the authed_user_* attributes of the installation, unless it is gone or another user
+    has installed it since"""
+    names = sorted(k for k in item if k.startswith(USER_TOKEN_PREFIX))
+    try:
+        oauth_table.update_item(
+            Key={"access_token": item["access_token"]},
+            UpdateExpression="REMOVE " + ", ".join(f"#n{i}" for i in range(len(names))),
+            ConditionExpression="authed_user_id = :user_id",
+            ExpressionAttributeNames={f"#n{i}": name for i, name in enumerate(names)},
+            ExpressionAttributeValues={":user_id": item["authed_user_id"]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+@tracing.traced_handler("TokenCleanup")
+def lambda_handler(event, context):
+    put_cold_start_metric(event)
+
+    access_tokens = set()
+    user_token_items = {}
+    message_ids = []
+    failures = []
+
+    for record in event.get("Records", []):
+        try:
+            message = json.loads(record["body"])
+            logging.info(
+                f"Processing {message['event']['type']} ({message.get('event_id')}) "
+                f"from team {message['team_id']}"
+            )
+            with tracing.span("dynamodb.query"):
+                to_delete, to_update = get_installation_changes(message)
+            access_tokens.update(to_delete)
+            user_token_items.update(to_update)
+            message_ids.append(record["messageId"])
+        except Exception as e:
+            logging.error(f"Failed to process message {record.get('messageId')}: {e}")
+            failures.append({"itemIdentifier": record["messageId"]})
+
+    # One batch write for all messages; deleting an item that is already gone is not an error,
+    # and neither is removing a user token that is already gone, so a retried message is harmless
+    user_token_items = {k: v for k, v in user_token_items.items() if k not in access_tokens}
+    try:
+        with tracing.span("dynamodb.batch_write_item", count=len(access_tokens)):
+            with oauth_table.batch_writer() as batch:
+                for access_token in access_tokens:
+                    batch.delete_item(Key={"access_token": access_token})
+        put_metric("InstallationsDeleted", len(access_tokens))
+        with tracing.span("dynamodb.update_item", count=len(user_token_items)):
+            for item in user_token_items.values():
+                remove_user_token(item)
+        put_metric("UserTokensRemoved", len(user_token_items))
+    except Exception as e:
+        logging.error(f"Failed to update installations: {e}")
+        failures.extend({"itemIdentifier": message_id} for message_id in message_ids)
+
+    return {"batchItemFailures": failures}
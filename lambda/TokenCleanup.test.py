@@ -0,0 +1,183 @@
+"""
+Unit tests for TokenCleanup.py
+"""
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+os.environ["OAuthDynamoDBTable"] = "DummyDDB"
+func = __import__("TokenCleanup")
+
+INSTALLATIONS = [
+    {
+        "access_token": "xoxb-1",
+        "team_id": "T1111111111",
+        "bot_user_id": "B1111111111",
+        "authed_user_id": "U1111111111",
+        "authed_user_access_token": "xoxp-1",
+    },
+    {
+        "access_token": "xoxb-2",
+        "team_id": "T1111111111",
+        "bot_user_id": "B2222222222",
+        "authed_user_id": "U2222222222",
+        "authed_user_access_token": "xoxp-2",
+        "authed_user_scope": "chat:write",
+    },
+    {"access_token": "xoxb-3", "team_id": "T1111111111", "bot_user_id": "B3333333333"},
+]
+
+
+def mock_record(message_id, event, team_id="T1111111111", app_id=None):
+    message = {"event": event, "event_id": f"Ev{message_id}", "team_id": team_id}
+    if app_id:
+        message["api_app_id"] = app_id
+    return {"messageId": message_id, "body": json.dumps(message)}
+
+
+def mock_batch_writer():
+    batch = MagicMock()
+    batch_writer = MagicMock()
+    batch_writer.return_value.__enter__.return_value = batch
+    return batch_writer, batch
+
+
+def deleted_tokens(batch):
+    return sorted(c.kwargs["Key"]["access_token"] for c in batch.delete_item.call_args_list)
+
+
+class TestFunction(unittest.TestCase):
+    def test_lambda_handler_app_uninstalled(self):
+        batch_writer, batch = mock_batch_writer()
+        with patch(
+            "TokenCleanup.oauth_table.query", return_value={"Items": INSTALLATIONS}
+        ) as mock_query, patch("TokenCleanup.oauth_table.batch_writer", batch_writer):
+            ret = func.lambda_handler(
+                {"Records": [mock_record("1", {"type": "app_uninstalled"})]}, None
+            )
+
+            self.assertEqual(mock_query.call_args.kwargs["IndexName"], "team_id-index")
+            self.assertEqual(deleted_tokens(batch), ["xoxb-1", "xoxb-2", "xoxb-3"])
+            self.assertEqual(ret, {"batchItemFailures": []})
+
+    def test_lambda_handler_app_uninstalled_other_apps_kept(self):
+        installations = [
+            {"access_token": "xoxp-1", "team_id": "T1111111111", "app_id": "APIID123456"},
+            {"access_token": "xoxp-2", "team_id": "T1111111111", "app_id": "APIID654321"},
+        ]
+        batch_writer, batch = mock_batch_writer()
+        with patch("TokenCleanup.oauth_table.query", return_value={"Items": installations}), patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ):
+            record = mock_record("1", {"type": "app_uninstalled"}, app_id="APIID654321")
+            func.lambda_handler({"Records": [record]}, None)
+
+            self.assertEqual(deleted_tokens(batch), ["xoxp-2"])
+
+    def test_lambda_handler_tokens_revoked(self):
+        event = {
+            "type": "tokens_revoked",
+            "tokens": {"oauth": ["U2222222222"], "bot": ["B3333333333"]},
+        }
+        batch_writer, batch = mock_batch_writer()
+        with patch("TokenCleanup.oauth_table.query", return_value={"Items": INSTALLATIONS}), patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ), patch("TokenCleanup.oauth_table.update_item") as mock_update_item:
+            ret = func.lambda_handler({"Records": [mock_record("1", event)]}, None)
+
+            # The installation of a revoked user token is kept, without the user token
+            self.assertEqual(deleted_tokens(batch), ["xoxb-3"])
+            mock_update_item.assert_called_once()
+            kwargs = mock_update_item.call_args.kwargs
+            self.assertEqual(kwargs["Key"], {"access_token": "xoxb-2"})
+            self.assertEqual(kwargs["UpdateExpression"], "REMOVE #n0, #n1, #n2")
+            self.assertEqual(
+                sorted(kwargs["ExpressionAttributeNames"].values()),
+                ["authed_user_access_token", "authed_user_id", "authed_user_scope"],
+            )
+            self.assertEqual(kwargs["ExpressionAttributeValues"], {":user_id": "U2222222222"})
+            self.assertEqual(ret, {"batchItemFailures": []})
+
+    def test_lambda_handler_tokens_revoked_user_and_bot(self):
+        event = {
+            "type": "tokens_revoked",
+            "tokens": {"oauth": ["U1111111111"], "bot": ["B1111111111"]},
+        }
+        batch_writer, batch = mock_batch_writer()
+        with patch("TokenCleanup.oauth_table.query", return_value={"Items": INSTALLATIONS}), patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ), patch("TokenCleanup.oauth_table.update_item") as mock_update_item:
+            func.lambda_handler({"Records": [mock_record("1", event)]}, None)
+
+            self.assertEqual(deleted_tokens(batch), ["xoxb-1"])
+            mock_update_item.assert_not_called()
+
+    def test_lambda_handler_tokens_revoked_installation_changed(self):
+        event = {"type": "tokens_revoked", "tokens": {"oauth": ["U1111111111"]}}
+        batch_writer, batch = mock_batch_writer()
+        with patch("TokenCleanup.oauth_table.query", return_value={"Items": INSTALLATIONS}), patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ), patch(
+            "TokenCleanup.oauth_table.update_item",
+            side_effect=ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem"
+            ),
+        ):
+            ret = func.lambda_handler({"Records": [mock_record("1", event)]}, None)
+
+            # Deleted or installed again since: nothing to retry
+            self.assertEqual(ret, {"batchItemFailures": []})
+
+    def test_lambda_handler_query_paginated(self):
+        pages = [
+            {"Items": INSTALLATIONS[:1], "LastEvaluatedKey": {"access_token": "xoxb-1"}},
+            {"Items": INSTALLATIONS[1:]},
+        ]
+        batch_writer, batch = mock_batch_writer()
+        with patch("TokenCleanup.oauth_table.query", side_effect=pages) as mock_query, patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ):
+            func.lambda_handler({"Records": [mock_record("1", {"type": "app_uninstalled"})]}, None)
+
+            self.assertEqual(mock_query.call_count, 2)
+            self.assertEqual(
+                mock_query.call_args.kwargs["ExclusiveStartKey"], {"access_token": "xoxb-1"}
+            )
+            self.assertEqual(deleted_tokens(batch), ["xoxb-1", "xoxb-2", "xoxb-3"])
+
+    def test_lambda_handler_partial_failure(self):
+        batch_writer, batch = mock_batch_writer()
+        with patch(
+            "TokenCleanup.oauth_table.query",
+            side_effect=[Exception("throttled"), {"Items": INSTALLATIONS[:1]}],
+        ), patch("TokenCleanup.oauth_table.batch_writer", batch_writer):
+            ret = func.lambda_handler(
+                {
+                    "Records": [
+                        mock_record("1", {"type": "app_uninstalled"}),
+                        mock_record("2", {"type": "app_uninstalled"}),
+                    ]
+                },
+                None,
+            )
+
+            self.assertEqual(deleted_tokens(batch), ["xoxb-1"])
+            self.assertEqual(ret, {"batchItemFailures": [{"itemIdentifier": "1"}]})
+
+    def test_lambda_handler_delete_failure(self):
+        batch_writer = MagicMock(side_effect=Exception("throttled"))
+        with patch("TokenCleanup.oauth_table.query", return_value={"Items": INSTALLATIONS}), patch(
+            "TokenCleanup.oauth_table.batch_writer", batch_writer
+        ):
+            ret = func.lambda_handler(
+                {"Records": [mock_record("1", {"type": "app_uninstalled"})]}, None
+            )
+
+            self.assertEqual(ret, {"batchItemFailures": [{"itemIdentifier": "1"}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
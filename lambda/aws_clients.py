@@ -0,0 +1,128 @@
+"""
+Shared factory of the boto3 clients and DynamoDB tables of the handlers.
+
+botocore's defaults (legacy retries, 60 second connect and read timeouts) let one slow SSM or
+Lambda API call outlast Slack's 3 second budget, so each client gets the settings of a profile:
+connect and read timeouts (seconds), retry mode ("standard" or "adaptive") and total attempts
+(the first one included), TCP keep-alive and connection pool size. The profile of a client is the
+one of its service, or "default"; "best_effort" is for calls which are dropped rather than allowed
+to delay a response (traffic capture, command events), "lambda_sync" for RequestResponse invokes,
+which are never retried: a timed out worker may still be running, and would run twice. The read
+timeout of a client can also be set by the caller, e.g. to the time the worker is allowed.
+
+Clients are created on first use, not on import (AsyncWorker does not otherwise import boto3, which
+adds to its cold start), and reused by every invocation of the container. `reset()` drops them,
+which it does after a SnapStart restore: modules which keep a client or table of the factory in a
+global register an `on_reset` hook to drop it as well. `stub(service, client)` makes the factory return `client` instead,
+for tests and benchmarks.
+
+Configuration (environment variables set by the CDK stacks):
+- AwsClientProfiles: JSON overrides of PROFILES, e.g. {"ssm": {"read_timeout": 2}}
+"""
+import json
+import os
+
+import snapstart
+
+TARGET_REGION = os.environ.get("AWS_REGION", "ap-southeast-2")
+
+DEFAULT_PROFILE = {
+    "connect_timeout": 2,
+    "read_timeout": 10,
+    "retry_mode": "standard",
+    "total_max_attempts": 3,
+    "tcp_keepalive": True,
+    "max_pool_connections": 10,
+}
+PROFILES = {
+    "default": {},
+    "best_effort": {"connect_timeout": 1, "read_timeout": 1, "total_max_attempts": 1},
+    "dynamodb": {"connect_timeout": 1, "read_timeout": 1},
+    "lambda": {"connect_timeout": 1, "read_timeout": 3, "total_max_attempts": 2},
+    # Not retried: a read timeout does not stop the worker, a retry would run it again
+    "lambda_sync": {"connect_timeout": 1, "read_timeout": 3, "total_max_attempts": 1},
+    "sqs": {"connect_timeout": 1, "read_timeout": 2},
+    # Slows down on throttling, which GetParameter hits when many containers start at once
+    "ssm": {"connect_timeout": 1, "read_timeout": 1, "retry_mode": "adaptive"},
+}
+PROFILE_OVERRIDES = json.loads(os.environ.get("AwsClientProfiles", "{}"))
+
+# Created on first use: {(kind, service, profile, region, read_timeout): client or resource}
+clients = {}
+# Returned instead of the real ones: {(kind, service): client or resource}
+stubs = {}
+# Run by reset()
+reset_hooks = []
+
+
+def get_profile(name):
+    """Settings of the profile, with the overrides of AwsClientProfiles"""
+    return DEFAULT_PROFILE | PROFILES.get(name, {}) | PROFILE_OVERRIDES.get(name, {})
+
+
+def create_config(name, read_timeout=None):
+    from botocore.config import Config
+
+    profile = get_profile(name)
+    return Config(
+        connect_timeout=profile["connect_timeout"],
+        max_pool_connections=profile["max_pool_connections"],
+        read_timeout=read_timeout or profile["read_timeout"],
+        retries={"mode": profile["retry_mode"], "total_max_attempts": profile["total_max_attempts"]},
+        tcp_keepalive=profile["tcp_keepalive"],
+    )
+
+
+def get(kind, service, profile=None, region=None, read_timeout=None):
+    if (kind, service) in stubs:
+        return stubs[(kind, service)]
+    profile = profile or (service if service in PROFILES else "default")
+    key = (kind, service, profile, region or TARGET_REGION, read_timeout)
+    if key not in clients:
+        import boto3
+
+        create = boto3.client if kind == "client" else boto3.resource
+        config = create_config(profile, read_timeout)
+        clients[key] = create(service, config=config, region_name=key[3])
+    return clients[key]
+
+
+def client(service, profile=None, region=None, read_timeout=None):
+    """The boto3 client of `service`, with the settings of `profile` (default: the service's).
+
+    `read_timeout` (seconds) replaces the one of the profile; keep it to a few distinct values,
+    each one is a client of its own.
+    """
+    return get("client", service, profile, region, read_timeout)
+
+
+def resource(service, profile=None, region=None):
+    """The boto3 resource of `service`, with the settings of `profile` (default: the service's)"""
+    return get("resource", service, profile, region)
+
+
+def table(name, profile=None, region=None):
+    """The DynamoDB table `name`"""
+    return resource("dynamodb", profile, region).Table(name)
+
+
+def stub(service, stub_client, kind="client"):
+    """Return `stub_client` for `service` (a resource with kind="resource"); None removes it"""
+    if stub_client is None:
+        stubs.pop((kind, service), None)
+    else:
+        stubs[(kind, service)] = stub_client
+
+
+def on_reset(func):
+    """Decorator: run `func` on `reset()`, to drop a client or table kept in a global"""
+    reset_hooks.append(func)
+    return func
+
+
+@snapstart.after_restore
+def reset():
+    """Drop the clients, and those kept by the modules, so the next use creates new ones"""
+    clients.clear()
+    for hook in reset_hooks:
+        hook()
@@ -0,0 +1,128 @@
+"""
+Unit tests for aws_clients.py
+"""
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ReadTimeoutError
+
+func = __import__("aws_clients")
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.reset()
+        func.stubs.clear()
+
+    def test_profile_of_service(self):
+        config = func.client("ssm").meta.config
+
+        self.assertEqual(config.connect_timeout, 1)
+        self.assertEqual(config.read_timeout, 1)
+        self.assertEqual(config.retries, {"mode": "adaptive", "total_max_attempts": 3})
+        self.assertTrue(config.tcp_keepalive)
+
+    def test_default_profile(self):
+        config = func.client("sts").meta.config
+
+        self.assertEqual(config.read_timeout, func.DEFAULT_PROFILE["read_timeout"])
+        self.assertEqual(config.retries["mode"], "standard")
+
+    def test_profile_overrides(self):
+        with patch("aws_clients.PROFILE_OVERRIDES", {"lambda": {"read_timeout": 5}}):
+            config = func.client("lambda").meta.config
+
+        self.assertEqual(config.read_timeout, 5)
+        self.assertEqual(config.connect_timeout, 1)
+
+    def test_best_effort_without_retries(self):
+        config = func.client("firehose", "best_effort").meta.config
+
+        self.assertEqual(config.retries["total_max_attempts"], 1)
+
+    def test_sync_invoke_not_retried(self):
+        requests = []
+
+        class SlowWorker(BaseHTTPRequestHandler):
+            def do_POST(self):
+                requests.append(self.path)
+                time.sleep(2)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowWorker)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        import boto3
+
+        credentials = {"AWS_ACCESS_KEY_ID": "dummy", "AWS_SECRET_ACCESS_KEY": "dummy"}
+        with patch.dict(os.environ, credentials):
+            lambda_client = boto3.client(
+                "lambda",
+                config=func.create_config("lambda_sync", read_timeout=1),
+                endpoint_url=f"http://127.0.0.1:{server.server_port}",
+                region_name="ap-southeast-2",
+            )
+            with self.assertRaises(ReadTimeoutError):
+                lambda_client.invoke(FunctionName="Dummy-SyncWorker", Payload=b"{}")
+        server.shutdown()
+
+        self.assertEqual(len(requests), 1)
+
+    def test_read_timeout(self):
+        lambda_client = func.client("lambda", "lambda_sync", read_timeout=5)
+
+        self.assertEqual(lambda_client.meta.config.read_timeout, 5)
+        self.assertEqual(lambda_client.meta.config.retries["total_max_attempts"], 1)
+        self.assertIs(func.client("lambda", "lambda_sync", read_timeout=5), lambda_client)
+        self.assertIsNot(func.client("lambda", "lambda_sync"), lambda_client)
+
+    def test_clients_reused(self):
+        ssm_client = func.client("ssm")
+
+        self.assertIs(func.client("ssm"), ssm_client)
+        self.assertIsNot(func.client("ssm", "best_effort"), ssm_client)
+        self.assertEqual(func.table("Dummy-Table").meta.client.meta.config.read_timeout, 1)
+
+        func.reset()
+        self.assertIsNot(func.client("ssm"), ssm_client)
+
+    def test_reset_drops_module_globals(self):
+        modules = {
+            "capture": "firehose_client",
+            "command_events": "events_client",
+            "jobs": "table",
+            "route_latency": "table",
+            "single_flight": "table",
+        }
+        for module, name in modules.items():
+            setattr(__import__(module), name, MagicMock())
+
+        func.reset()
+
+        for module, name in modules.items():
+            self.assertIsNone(getattr(__import__(module), name), module)
+
+    def test_stub(self):
+        stub_client = MagicMock()
+        stub_resource = MagicMock()
+
+        func.stub("lambda", stub_client)
+        func.stub("dynamodb", stub_resource, kind="resource")
+
+        self.assertIs(func.client("lambda"), stub_client)
+        self.assertIs(func.table("Dummy-Table"), stub_resource.Table.return_value)
+        stub_resource.Table.assert_called_once_with("Dummy-Table")
+
+        func.stub("lambda", None)
+        self.assertIsNot(func.client("lambda"), stub_client)
+
+
+if __name__ == "__main__":
+    unittest.main()
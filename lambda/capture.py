@@ -0,0 +1,85 @@
+"""
+Opt-in capture of the slash command requests received by ImmediateResponse, for replaying real
+traffic with scripts/replay_traffic.py.
+
+When CaptureDeliveryStream is set, a sampled share (CaptureSampleRate) of the accepted requests is
+written to that Firehose delivery stream, which batches the records into S3 as JSON lines. The
+token, trigger_id and response_url are removed before the record leaves the function.
+
+The record is sent by the publisher thread of command_events once the response is back, so
+PutRecord is never on the way to Slack's 3 seconds.
+"""
+import json
+import logging
+import os
+import random
+
+import aws_clients
+import command_events
+import snapstart
+import tracing
+
+CAPTURE_DELIVERY_STREAM = os.environ.get("CaptureDeliveryStream")
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CaptureSampleRate", "1.0"))
+SENSITIVE_FIELDS = ["response_url", "token", "trigger_id"]
+
+# Created on first use, so functions without capture do not pay for it; a slow Firehose must not
+# hold up the next invocation, hence the short timeouts and no retries
+firehose_client = None
+
+
+def is_enabled():
+    return bool(CAPTURE_DELIVERY_STREAM)
+
+
+if is_enabled():
+    # Registers the publisher's extension while the function initializes
+    command_events.start_publisher()
+
+
+def get_firehose_client():
+    global firehose_client
+    if firehose_client is None:
+        firehose_client = aws_clients.client("firehose", "best_effort")
+    return firehose_client
+
+
+@snapstart.before_snapshot
+def create_firehose_client():
+    """Create the client before the SnapStart snapshot, not on the first captured request"""
+    if is_enabled():
+        get_firehose_client()
+
+
+@aws_clients.on_reset
+def drop_firehose_client():
+    global firehose_client
+    firehose_client = None
+
+
+def sanitize(params):
+    return {k: v for k, v in params.items() if k not in SENSITIVE_FIELDS}
+
+
+def create_record(params, received_at):
+    return {"received_at": received_at, "params": sanitize(params)}
+
+
+def capture_request(params, received_at):
+    """Send a sanitized record of the request (parse_qs params, epoch seconds) to the sink, after
+    the response"""
+    if not is_enabled() or random.random() >= CAPTURE_SAMPLE_RATE:
+        return
+
+    command_events.defer(put_record, create_record(params, received_at))
+
+
+def put_record(record):
+    try:
+        data = json.dumps(record) + "\n"
+        with tracing.span("firehose.put_record"):
+            get_firehose_client().put_record(
+                DeliveryStreamName=CAPTURE_DELIVERY_STREAM, Record={"Data": data.encode("utf-8")}
+            )
+    except Exception as e:
+        logging.error(f"Failed to capture request: {e}")
@@ -0,0 +1,82 @@
+"""
+Unit tests for capture.py
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+func = __import__("capture")
+
+PARAMS = {
+    "command": ["/slack-unittest"],
+    "response_url": ["dummy-url"],
+    "team_id": ["T1111111111"],
+    "text": ["async hello"],
+    "token": ["dummy-token"],
+    "trigger_id": ["dummy-trigger-id"],
+}
+
+
+def run_deferred():
+    for function, args in func.command_events.deferred:
+        function(*args)
+    func.command_events.deferred.clear()
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.command_events.deferred.clear()
+
+    def test_disabled(self):
+        with patch("capture.CAPTURE_DELIVERY_STREAM", None), patch(
+            "capture.firehose_client"
+        ) as mock_firehose:
+            func.capture_request(PARAMS, 1700000000.5)
+            run_deferred()
+
+            mock_firehose.put_record.assert_not_called()
+
+    def test_record_sanitized(self):
+        with patch("capture.CAPTURE_DELIVERY_STREAM", "Dummy-Capture"), patch(
+            "capture.firehose_client"
+        ) as mock_firehose:
+            func.capture_request(PARAMS, 1700000000.5)
+            # Sent after the response
+            mock_firehose.put_record.assert_not_called()
+            run_deferred()
+
+            data = mock_firehose.put_record.call_args.kwargs["Record"]["Data"].decode("utf-8")
+            self.assertTrue(data.endswith("\n"))
+            self.assertEqual(
+                json.loads(data),
+                {
+                    "received_at": 1700000000.5,
+                    "params": {
+                        "command": ["/slack-unittest"],
+                        "team_id": ["T1111111111"],
+                        "text": ["async hello"],
+                    },
+                },
+            )
+
+    def test_not_sampled(self):
+        with patch("capture.CAPTURE_DELIVERY_STREAM", "Dummy-Capture"), patch(
+            "capture.CAPTURE_SAMPLE_RATE", 0.0
+        ), patch("capture.firehose_client") as mock_firehose:
+            func.capture_request(PARAMS, 1700000000.5)
+            run_deferred()
+
+            mock_firehose.put_record.assert_not_called()
+
+    def test_failure_ignored(self):
+        with patch("capture.CAPTURE_DELIVERY_STREAM", "Dummy-Capture"), patch(
+            "capture.firehose_client"
+        ) as mock_firehose:
+            mock_firehose.put_record.side_effect = Exception("timeout")
+
+            func.capture_request(PARAMS, 1700000000.5)
+            run_deferred()
+
+
+if __name__ == "__main__":
+    unittest.main()
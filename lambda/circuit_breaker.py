@@ -0,0 +1,125 @@
+"""
+Per-container circuit breakers for the downstream dependencies (SSM, the Lambda API, slack.com).
+
+When a dependency is failing or slow, the breaker opens and calls fail fast with CircuitOpenError
+instead of waiting out timeouts and SDK retries, so the handler can still reply within Slack's 3
+seconds. After `open_seconds` a few probe calls are let through (half-open); the breaker closes
+again if they succeed.
+
+A call counts as bad if it raises, if `is_failure(result)` is true, or if it takes longer than
+`slow_call_ms`. A call whose duration depends on more than the dependency itself (e.g. a sync
+Lambda invoke, which lasts as long as the worker) is made with `timed=False`, and the exceptions in
+`ignored` (e.g. its read timeout) are raised without counting as bad. The breaker opens when at
+least `minimum_calls` of the last `window_size` calls were made and the rate of bad calls reaches
+`failure_rate_threshold`.
+
+The defaults can be overridden per breaker with the CircuitBreakers environment variable, e.g.
+{"ssm": {"slow_call_ms": 500, "open_seconds": 10}}.
+"""
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from metrics import put_metric
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+SETTINGS = json.loads(os.environ.get("CircuitBreakers", "{}"))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        failure_rate_threshold=0.5,
+        slow_call_ms=1000,
+        window_size=20,
+        minimum_calls=5,
+        open_seconds=30,
+        half_open_max_calls=1,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self.outcomes = deque(maxlen=window_size)  # True for a bad call
+        self.state = CLOSED
+        self.opened_at = 0
+        self.half_open_calls = 0
+
+    @classmethod
+    def from_settings(cls, name, **defaults):
+        """Create a breaker with the defaults given, overridden by the CircuitBreakers settings"""
+        return cls(name, **{**defaults, **SETTINGS.get(name, {})})
+
+    def reset(self):
+        self.outcomes.clear()
+        self.state = CLOSED
+        self.half_open_calls = 0
+
+    def call(self, fn, *args, is_failure=None, timed=True, ignored=(), **kwargs):
+        self.before_call()
+
+        start = self.clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record(bad=not isinstance(e, ignored))
+            raise
+
+        elapsed_ms = (self.clock() - start) * 1000
+        failed = is_failure is not None and is_failure(result)
+        self.record(bad=failed or (timed and elapsed_ms > self.slow_call_ms))
+        return result
+
+    def before_call(self):
+        if self.state == OPEN:
+            if self.clock() - self.opened_at < self.open_seconds:
+                put_metric("CircuitBreakerRejected", dimensions={"Dependency": self.name})
+                raise CircuitOpenError(f"Circuit breaker {self.name} is open")
+            self.transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                put_metric("CircuitBreakerRejected", dimensions={"Dependency": self.name})
+                raise CircuitOpenError(f"Circuit breaker {self.name} is half open")
+            self.half_open_calls += 1
+
+    def record(self, bad):
+        if self.state == HALF_OPEN:
+            self.transition(OPEN if bad else CLOSED)
+            return
+
+        self.outcomes.append(bad)
+        if len(self.outcomes) >= self.minimum_calls:
+            if sum(self.outcomes) / len(self.outcomes) >= self.failure_rate_threshold:
+                self.transition(OPEN)
+
+    def transition(self, state):
+        logging.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.half_open_calls = 0
+        if state == OPEN:
+            self.opened_at = self.clock()
+        elif state == CLOSED:
+            self.outcomes.clear()
+        put_metric(
+            "CircuitBreakerState",
+            STATE_VALUES[state],
+            unit="None",
+            dimensions={"Dependency": self.name},
+        )
@@ -0,0 +1,113 @@
+"""
+Unit tests for circuit_breaker.py
+"""
+import unittest
+from unittest.mock import patch
+
+func = __import__("circuit_breaker")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fail():
+    raise ConnectionError("unavailable")
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = func.CircuitBreaker(
+            "dummy", minimum_calls=4, open_seconds=10, slow_call_ms=100, clock=self.clock
+        )
+        patcher = patch("circuit_breaker.put_metric")
+        self.mock_put_metric = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def trip(self):
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(fail)
+
+    def test_opens_on_error_rate(self):
+        self.breaker.call(lambda: "ok")
+        self.breaker.call(lambda: "ok")
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, func.CLOSED)
+
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+        self.assertEqual(self.breaker.state, func.OPEN)
+
+        with self.assertRaises(func.CircuitOpenError):
+            self.breaker.call(lambda: "ok")
+        self.mock_put_metric.assert_any_call(
+            "CircuitBreakerState", 2, unit="None", dimensions={"Dependency": "dummy"}
+        )
+        self.mock_put_metric.assert_any_call(
+            "CircuitBreakerRejected", dimensions={"Dependency": "dummy"}
+        )
+
+    def test_opens_on_slow_calls_and_failed_results(self):
+        def slow():
+            self.clock.now += 0.2
+            return "ok"
+
+        self.assertEqual(self.breaker.call(slow), "ok")
+        self.assertEqual(self.breaker.call(slow), "ok")
+        self.breaker.call(lambda: 500, is_failure=lambda status: status >= 500)
+        self.breaker.call(lambda: 500, is_failure=lambda status: status >= 500)
+
+        self.assertEqual(self.breaker.state, func.OPEN)
+
+    def test_untimed_calls_and_ignored_errors(self):
+        def slow():
+            self.clock.now += 0.2
+            raise TimeoutError("still running")
+
+        for _ in range(4):
+            self.clock.now += 0.2
+            self.breaker.call(lambda: "ok", timed=False)
+            with self.assertRaises(TimeoutError):
+                self.breaker.call(slow, timed=False, ignored=(TimeoutError,))
+
+        self.assertEqual(self.breaker.state, func.CLOSED)
+        with self.assertRaises(TimeoutError):
+            self.breaker.call(slow, timed=False)
+        self.assertEqual(sum(self.breaker.outcomes), 1)
+
+    def test_half_open_probe_success_closes(self):
+        self.trip()
+        self.clock.now += 10
+
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+
+        self.assertEqual(self.breaker.state, func.CLOSED)
+        self.assertEqual(len(self.breaker.outcomes), 0)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.trip()
+        self.clock.now += 10
+
+        with self.assertRaises(ConnectionError):
+            self.breaker.call(fail)
+
+        self.assertEqual(self.breaker.state, func.OPEN)
+        with self.assertRaises(func.CircuitOpenError):
+            self.breaker.call(lambda: "ok")
+
+    def test_from_settings(self):
+        with patch.dict("circuit_breaker.SETTINGS", {"ssm": {"open_seconds": 5}}):
+            breaker = func.CircuitBreaker.from_settings("ssm", open_seconds=30, slow_call_ms=500)
+        self.assertEqual(breaker.open_seconds, 5)
+        self.assertEqual(breaker.slow_call_ms, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
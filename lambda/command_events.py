@@ -0,0 +1,264 @@
+"""
+Opt-in lifecycle events of the slash commands, published to an EventBridge bus for audit and
+usage analytics. Consumers are rules on the bus, so none of them touches the handlers.
+
+Each command goes through some of: received, authorized, dispatched, completed, failed. An event is
+a compact JSON detail with the request ID (of the ImmediateResponse invocation), the stage, the
+time in epoch ms and a few fields of the stage, e.g.
+    {"request_id": "...", "stage": "dispatched", "at": 1700000000000, "function": "...", ...}
+
+`record()` only buffers the event in the container; nothing is sent on the way to the response:
+- a command dispatched to an async worker carries the buffered events in the invoke payload
+  (`attach()`), and the worker publishes them together with its own completed or failed event,
+  after posting to Slack;
+- any other request hands its events over to a publisher thread when the handler returns
+  (`@published`), which puts them in PutEvents calls with short timeouts and no retries.
+
+Other work which must not delay the response, e.g. the traffic capture, is handed over to the same
+thread with `defer()`, and runs after the events are published.
+
+In Lambda, the publisher thread is an internal extension: the response goes back as soon as the
+handler returns, and the invocation only ends once the extension has published its events and
+asks for the next one, so the container is not frozen halfway through a PutEvents call. Under
+SnapStart (which restores the process, not the extension's connection to the Extensions API) and
+outside Lambda, it is a plain daemon thread.
+
+Delivery is at least once: a retried async invocation publishes its events again.
+
+Configuration (environment variables set by the CDK stack):
+- CommandEventBus: name of the event bus, no events are recorded when unset
+- CommandEventSource: source of the events (default "slack-command-app")
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from functools import wraps
+
+import aws_clients
+import snapstart
+import tracing
+from metrics import put_metric
+
+COMMAND_EVENT_BUS = os.environ.get("CommandEventBus")
+COMMAND_EVENT_SOURCE = os.environ.get("CommandEventSource", "slack-command-app")
+EVENTS_KEY = "command_events"  # in the invoke payload of the async workers
+MAX_ENTRIES = 10  # per PutEvents call
+MAX_TEXT_CHARS = 200
+LAMBDA_RUNTIME_API = os.environ.get("AWS_LAMBDA_RUNTIME_API")
+IS_SNAPSTART = os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") == "snap-start"
+EXTENSION_NAME = "command-events"
+# Left of the invocation's deadline for the publishing, when waiting for its events
+PUBLISH_MARGIN_SECONDS = 3
+
+RECEIVED = "received"
+AUTHORIZED = "authorized"
+DISPATCHED = "dispatched"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Created on first use: AsyncWorker does not otherwise import boto3, which adds to its cold start
+events_client = None
+
+# Events of the current request, not published yet
+pending = []
+# Work of the current request left for after the response, as (function, args)
+deferred = []
+# Events and deferred work of the finished requests, one pair per invocation, taken by the
+# publisher thread
+handoff = queue.Queue()
+publisher = None
+
+
+def is_enabled():
+    return bool(COMMAND_EVENT_BUS)
+
+
+def get_events_client():
+    global events_client
+    if events_client is None:
+        # A slow EventBridge must not hold up a response: short timeouts and no retries
+        events_client = aws_clients.client("events", "best_effort")
+    return events_client
+
+
+@snapstart.before_snapshot
+def create_events_client():
+    """Create the client before the SnapStart snapshot, not on the first published event"""
+    if is_enabled():
+        get_events_client()
+
+
+@aws_clients.on_reset
+def drop_events_client():
+    global events_client
+    events_client = None
+
+
+def record(stage, request_id, **fields):
+    """Buffer an event of the request; fields which are None are left out"""
+    if not is_enabled():
+        return
+    if fields.get("text") is not None:
+        fields["text"] = fields["text"][:MAX_TEXT_CHARS]
+    pending.append(
+        {
+            "request_id": request_id,
+            "stage": stage,
+            "at": int(time.time() * 1000),
+            **{k: v for k, v in fields.items() if v is not None},
+        }
+    )
+
+
+def attach(payload):
+    """Hand the buffered events over to the async worker invoked with `payload`.
+
+    They stay buffered until `clear()`, so they are still published when the invoke fails.
+    """
+    if pending:
+        payload[EVENTS_KEY] = list(pending)
+
+
+def clear():
+    pending.clear()
+
+
+def defer(function, *args):
+    """Call `function(*args)` on the publisher thread, once the handler has returned.
+
+    The publisher has to be started while the function initializes (`start_publisher()`).
+    """
+    deferred.append((function, args))
+
+
+def receive(payload):
+    """Take over the events attached to the payload; return the request ID they belong to"""
+    events = payload.get(EVENTS_KEY) or []
+    pending.extend(events)
+    return events[0]["request_id"] if events else None
+
+
+def to_entry(event):
+    return {
+        "Detail": json.dumps(event, separators=(",", ":")),
+        "DetailType": f"command.{event['stage']}",
+        "EventBusName": COMMAND_EVENT_BUS,
+        "Source": COMMAND_EVENT_SOURCE,
+    }
+
+
+def publish(events):
+    """Publish `events`, in batches of MAX_ENTRIES; events which fail are dropped"""
+    failed = 0
+    for i in range(0, len(events), MAX_ENTRIES):
+        batch = events[i:][:MAX_ENTRIES]
+        try:
+            with tracing.span("events.put_events", count=len(batch)):
+                resp = get_events_client().put_events(Entries=[to_entry(e) for e in batch])
+            failed += resp.get("FailedEntryCount", 0)
+        except Exception as e:
+            logging.error(f"Failed to publish {len(batch)} command events: {e}")
+            failed += len(batch)
+    if failed:
+        put_metric("CommandEventsFailed", failed)
+
+
+def flush():
+    """Publish the buffered events now"""
+    events = list(pending)
+    pending.clear()
+    if events:
+        publish(events)
+
+
+def publish_handed_off(timeout=None):
+    """Publish the events of one finished invocation and run its deferred work; raise queue.Empty
+    after `timeout` seconds"""
+    events, tasks = handoff.get(timeout=timeout)
+    try:
+        if events:
+            publish(events)
+        for function, args in tasks:
+            try:
+                function(*args)
+            except Exception as e:
+                logging.error(f"Deferred {function.__name__} failed: {e}")
+    finally:
+        handoff.task_done()
+
+
+def run_publisher():
+    while True:
+        publish_handed_off()
+
+
+def call_extensions_api(method, path, extension_id=None, body=None):
+    from urllib.request import Request, urlopen
+
+    headers = {"Lambda-Extension-Name": EXTENSION_NAME}
+    if extension_id is not None:
+        headers = {"Lambda-Extension-Identifier": extension_id}
+    request = Request(
+        f"http://{LAMBDA_RUNTIME_API}/2020-01-01/extension/{path}",
+        data=None if body is None else json.dumps(body).encode("utf-8"),
+        headers=headers,
+        method=method,
+    )
+    with urlopen(request) as resp:
+        return resp.headers, json.loads(resp.read() or b"{}")
+
+
+def run_extension(extension_id):
+    """Publish the events of each invocation before asking for the next one"""
+    while True:
+        _, event = call_extensions_api("GET", "event/next", extension_id)
+        remaining = event.get("deadlineMs", 0) / 1000 - time.time() - PUBLISH_MARGIN_SECONDS
+        try:
+            publish_handed_off(timeout=max(remaining, 0))
+        except queue.Empty:
+            logging.warning(f"No command events handed over by {event.get('requestId')}")
+
+
+def start_publisher():
+    """Start the publisher thread, as an internal extension when the function runs in Lambda.
+
+    Extensions can only register while the function initializes, i.e. when the handler module is
+    imported: this is called by `@published`.
+    """
+    global publisher
+    if publisher is not None:
+        return
+    target, args = run_publisher, ()
+    if LAMBDA_RUNTIME_API and not IS_SNAPSTART:
+        try:
+            headers, _ = call_extensions_api("POST", "register", body={"events": ["INVOKE"]})
+            target, args = run_extension, (headers["Lambda-Extension-Identifier"],)
+        except Exception as e:
+            logging.error(f"Failed to register the {EXTENSION_NAME} extension: {e}")
+    publisher = threading.Thread(target=target, args=args, name=EXTENSION_NAME, daemon=True)
+    publisher.start()
+
+
+def published(handler):
+    """Hand the events still buffered and the deferred work over to the publisher when `handler`
+    returns or raises"""
+    if is_enabled():
+        start_publisher()
+
+    @wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            if is_enabled() or deferred:
+                start_publisher()
+            if publisher is not None:
+                # Every invocation hands over its share, which the extension waits for
+                handoff.put((list(pending), list(deferred)))
+            pending.clear()
+            deferred.clear()
+
+    return wrapper
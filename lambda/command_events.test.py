@@ -0,0 +1,171 @@
+"""
+Unit tests for command_events.py
+"""
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+func = __import__("command_events")
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.clear()
+
+    def test_disabled(self):
+        with patch("command_events.COMMAND_EVENT_BUS", None), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            func.record(func.RECEIVED, "dummy-request-id", team_id="T1111111111")
+            func.flush()
+
+            self.assertEqual(func.pending, [])
+            mock_events.put_events.assert_not_called()
+
+    def test_record_compact(self):
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"):
+            func.record(func.RECEIVED, "dummy-request-id", job_id=None, text="x" * 500)
+
+            event = func.pending[0]
+            self.assertEqual(set(event), {"request_id", "stage", "at", "text"})
+            self.assertEqual(len(event["text"]), func.MAX_TEXT_CHARS)
+
+    def test_attach_and_receive(self):
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"):
+            func.record(func.DISPATCHED, "dummy-request-id", function="Dummy-AsyncWorker")
+            payload = {}
+
+            func.attach(payload)
+            # Kept until the invoke succeeds
+            self.assertEqual(len(func.pending), 1)
+            func.clear()
+
+            self.assertEqual(func.receive(json.loads(json.dumps(payload))), "dummy-request-id")
+            self.assertEqual(func.pending[0]["function"], "Dummy-AsyncWorker")
+            self.assertIsNone(func.receive({}))
+
+    def test_flush_batched(self):
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            mock_events.put_events.return_value = {"FailedEntryCount": 0}
+            for i in range(25):
+                func.record(func.COMPLETED, f"dummy-request-id-{i}")
+
+            func.flush()
+
+            self.assertEqual(
+                [len(c.kwargs["Entries"]) for c in mock_events.put_events.call_args_list],
+                [10, 10, 5],
+            )
+            entry = mock_events.put_events.call_args.kwargs["Entries"][0]
+            self.assertEqual(entry["DetailType"], "command.completed")
+            self.assertEqual(entry["EventBusName"], "Dummy-CommandEvents")
+            self.assertEqual(func.pending, [])
+
+    def test_flush_failures_counted(self):
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"), patch(
+            "command_events.events_client"
+        ) as mock_events, patch("command_events.put_metric") as mock_put_metric:
+            mock_events.put_events.side_effect = [{"FailedEntryCount": 1}, Exception("timeout")]
+            for i in range(12):
+                func.record(func.COMPLETED, f"dummy-request-id-{i}")
+
+            func.flush()
+
+            mock_put_metric.assert_called_once_with("CommandEventsFailed", 3)
+            self.assertEqual(func.pending, [])
+
+    def test_published_on_error(self):
+        @func.published
+        def handler(event, context):
+            func.record(func.FAILED, "dummy-request-id", reason="slack_post_failed")
+            raise Exception("Slack is down")
+
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            mock_events.put_events.return_value = {"FailedEntryCount": 0}
+            with self.assertRaises(Exception):
+                handler({}, None)
+            func.handoff.join()
+
+            mock_events.put_events.assert_called_once()
+
+    def test_published_after_response(self):
+        @func.published
+        def handler(event, context):
+            func.record(func.COMPLETED, "dummy-request-id", route="static")
+            return {"statusCode": 200}
+
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"), patch(
+            "command_events.events_client"
+        ) as mock_events:
+            released, done = threading.Event(), threading.Event()
+
+            def put_events(**kwargs):
+                released.wait(5)
+                done.set()
+                return {"FailedEntryCount": 0}
+
+            mock_events.put_events.side_effect = put_events
+
+            ret = handler({}, None)
+
+            # The response is back while PutEvents is still running, or yet to be called
+            self.assertEqual(ret, {"statusCode": 200})
+            self.assertFalse(done.is_set())
+            released.set()
+            func.handoff.join()
+            self.assertTrue(done.is_set())
+            mock_events.put_events.assert_called_once()
+            self.assertEqual(func.pending, [])
+
+    def test_deferred_after_response(self):
+        calls = []
+
+        @func.published
+        def handler(event, context):
+            func.defer(calls.append, "deferred")
+            func.defer(lambda: 1 / 0)
+            calls.append("handler")
+            return {"statusCode": 200}
+
+        with patch("command_events.COMMAND_EVENT_BUS", None):
+            ret = handler({}, None)
+            func.handoff.join()
+
+            # Run even without events to publish; a failure is only logged
+            self.assertEqual(ret, {"statusCode": 200})
+            self.assertEqual(calls, ["handler", "deferred"])
+            self.assertEqual(func.deferred, [])
+
+    def test_extension_publishes_before_next_invocation(self):
+        calls = []
+
+        def call_extensions_api(method, path, extension_id=None, body=None):
+            calls.append(path)
+            if len(calls) > 1:
+                raise StopIteration
+            return {}, {"deadlineMs": time.time() * 1000 + 10000, "requestId": "dummy-request-id"}
+
+        with patch("command_events.COMMAND_EVENT_BUS", "Dummy-CommandEvents"), patch(
+            "command_events.events_client"
+        ) as mock_events, patch("command_events.call_extensions_api", call_extensions_api):
+            mock_events.put_events.side_effect = lambda **kwargs: (
+                calls.append("put_events") or {"FailedEntryCount": 0}
+            )
+            func.handoff.put(
+                ([{"request_id": "dummy-request-id", "stage": "completed", "at": 0}], [])
+            )
+
+            with self.assertRaises(StopIteration):
+                func.run_extension("dummy-extension-id")
+
+            self.assertEqual(calls, ["event/next", "put_events", "event/next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+"""
+Job tracking of the async commands, and the `jobs` and `status <job ID>` subcommands.
+
+ImmediateResponse writes a job to the JobsTable DynamoDB table when it dispatches a command to an
+async worker, and gives its ID in the response; the worker marks it running, then succeeded or
+failed, with the start and end times and a preview of the result, whose full text went to the
+response_url.
+
+`<command> jobs` lists the last jobs of the user and `<command> status <job ID>` shows one job of
+the team. ImmediateResponse answers both from the table, without invoking a worker; the answers are
+cached in the container for JobsCacheSeconds, so repeated checks cost one read. Jobs expire after
+JobsRetentionDays, and any DynamoDB error only leaves the job untracked.
+"""
+import logging
+import os
+import time
+import uuid
+
+import aws_clients
+import snapstart
+
+JOBS_TABLE_NAME = os.environ.get("JobsTable")
+JOBS_REQUESTER_INDEX_NAME = "requester-index"
+CACHE_SECONDS = int(os.environ.get("JobsCacheSeconds", "5"))
+RETENTION_DAYS = int(os.environ.get("JobsRetentionDays", "7"))
+MAX_CACHE_ENTRIES = 256
+MAX_LISTED_JOBS = 10
+MAX_RESULT_CHARS = 500
+
+JOBS_WORD = "jobs"
+STATUS_WORD = "status"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Created on first use: AsyncWorker does not otherwise import boto3, which adds to its cold start
+table = None
+
+# Answers of this container: {(team ID, user ID, command text): (message, expiry)}
+cache = {}
+
+
+def is_enabled():
+    return bool(JOBS_TABLE_NAME)
+
+
+def get_table():
+    global table
+    if table is None:
+        table = aws_clients.table(JOBS_TABLE_NAME)
+    return table
+
+
+@snapstart.before_snapshot
+def create_table():
+    """Import boto3 and load the DynamoDB model before the SnapStart snapshot, not on first use"""
+    if is_enabled():
+        get_table()
+
+
+@aws_clients.on_reset
+def drop_table():
+    global table
+    table = None
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def requester_key(team_id, user_id):
+    return f"{team_id}#{user_id}"
+
+
+def create(route, team_id, user_id, command_text):
+    """Write a queued job of the command dispatched to the `route` function, and return its ID
+    (None when jobs are not tracked or the write failed)"""
+    if not is_enabled():
+        return None
+
+    job_id = uuid.uuid4().hex[:12]
+    created_at = now_ms()
+    try:
+        get_table().put_item(
+            Item={
+                "job_id": job_id,
+                "command_text": command_text,
+                "created_at": created_at,
+                "expires_at": created_at // 1000 + RETENTION_DAYS * 24 * 3600,
+                "requester": requester_key(team_id, user_id),
+                "route": route,
+                "state": QUEUED,
+                "team_id": team_id,
+                "user_id": user_id,
+            }
+        )
+        return job_id
+    except Exception as e:
+        logging.error(f"Failed to create job: {e}")
+        return None
+
+
+def update(job_id, **attributes):
+    names = {f"#{k}": k for k in attributes}
+    values = {f":{k}": v for k, v in attributes.items()}
+    try:
+        get_table().update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET " + ", ".join(f"#{k} = :{k}" for k in attributes),
+            ConditionExpression="attribute_exists(job_id)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except Exception as e:
+        logging.error(f"Failed to update job {job_id}: {e}")
+
+
+def start(job_id):
+    update(job_id, state=RUNNING, started_at=now_ms())
+
+
+def finish(job_id, state, result=None):
+    """Mark the job succeeded or failed, with a preview of its result"""
+    attributes = {"state": state, "completed_at": now_ms()}
+    if result is not None:
+        attributes["result_preview"] = result[:MAX_RESULT_CHARS]
+    update(job_id, **attributes)
+
+
+def is_jobs_command(command_text):
+    return is_enabled() and command_text.split(" ")[0].lower() in [JOBS_WORD, STATUS_WORD]
+
+
+def format_duration(start_ms, end_ms):
+    if start_ms is None or end_ms is None:
+        return "-"
+    return f"{(int(end_ms) - int(start_ms)) / 1000:.1f} s"
+
+
+def format_job(item):
+    """One line per job: ID, text, state, time queued and time running"""
+    return (
+        f"`{item['job_id']}` `{item['command_text']}`: {item['state']}"
+        f", queued {format_duration(item['created_at'], item.get('started_at'))}"
+        f", ran {format_duration(item.get('started_at'), item.get('completed_at'))}"
+    )
+
+
+def get_status_message(job_id, team_id):
+    item = get_table().get_item(Key={"job_id": job_id}).get("Item")
+    # Only the jobs of the team
+    if item is None or item["team_id"] != team_id:
+        return f"No job {job_id}."
+    message = f"Job of <@{item['user_id']}> {format_job(item)}"
+    if item.get("result_preview"):
+        message += f"\n{item['result_preview']}"
+    return message
+
+
+def get_jobs_message(team_id, user_id):
+    from boto3.dynamodb.conditions import Key
+
+    items = get_table().query(
+        IndexName=JOBS_REQUESTER_INDEX_NAME,
+        KeyConditionExpression=Key("requester").eq(requester_key(team_id, user_id)),
+        Limit=MAX_LISTED_JOBS,
+        ScanIndexForward=False,
+    )["Items"]
+    if not items:
+        return "No jobs in the last days."
+    return "\n".join(f"• {format_job(item)}" for item in items)
+
+
+def answer(command_text, team_id, user_id):
+    """Return the answer to `jobs` or `status <job ID>`, cached for CACHE_SECONDS"""
+    key = (team_id, user_id, " ".join(command_text.lower().split()))
+    message, expiry = cache.get(key, (None, 0))
+    now = time.monotonic()
+    if now < expiry:
+        return message
+
+    words = command_text.split()
+    try:
+        if words[0].lower() == JOBS_WORD:
+            message = get_jobs_message(team_id, user_id)
+        elif len(words) < 2:
+            return f"Usage: {STATUS_WORD} <job ID>"
+        else:
+            message = get_status_message(words[1].lower(), team_id)
+    except Exception as e:
+        logging.error(f"Failed to read jobs: {e}")
+        return "The jobs cannot be read at the moment. Please try again shortly."
+
+    if len(cache) >= MAX_CACHE_ENTRIES:
+        cache.pop(next(iter(cache)))
+    cache[key] = (message, now + CACHE_SECONDS)
+    return message
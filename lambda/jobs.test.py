@@ -0,0 +1,122 @@
+"""
+Unit tests for jobs.py
+"""
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ["JobsTable"] = "Dummy-Jobs"
+func = __import__("jobs")
+
+
+def mock_item(custom_data={}):
+    item = {
+        "job_id": "0123456789ab",
+        "command_text": "report weekly",
+        "created_at": 1700000000000,
+        "requester": "T1111111111#U1111111111",
+        "route": "Dummy-AsyncWorker",
+        "state": "succeeded",
+        "team_id": "T1111111111",
+        "user_id": "U1111111111",
+        "started_at": 1700000000500,
+        "completed_at": 1700000002000,
+        "result_preview": "Weekly report",
+    }
+    item.update(custom_data)
+    return item
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.cache.clear()
+        self.table = MagicMock()
+        patcher = patch("jobs.table", self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create(self):
+        with patch("jobs.time.time", return_value=1700000000.0):
+            job_id = func.create("Dummy-AsyncWorker", "T1111111111", "U1111111111", "report")
+
+        item = self.table.put_item.call_args.kwargs["Item"]
+        self.assertEqual(item["job_id"], job_id)
+        self.assertEqual(len(job_id), 12)
+        self.assertEqual(item["state"], "queued")
+        self.assertEqual(item["requester"], "T1111111111#U1111111111")
+        self.assertEqual(item["created_at"], 1700000000000)
+        self.assertEqual(item["expires_at"], 1700000000 + 7 * 24 * 3600)
+
+    def test_create_failed(self):
+        self.table.put_item.side_effect = Exception("DynamoDB is down")
+
+        self.assertIsNone(func.create("Dummy-AsyncWorker", "T1111111111", "U1111111111", "report"))
+
+    def test_create_disabled(self):
+        with patch("jobs.JOBS_TABLE_NAME", None):
+            self.assertIsNone(func.create("Dummy-AsyncWorker", "T1", "U1", "report"))
+            self.assertFalse(func.is_jobs_command("jobs"))
+
+        self.table.put_item.assert_not_called()
+
+    def test_finish(self):
+        func.finish("0123456789ab", func.SUCCEEDED, "x" * 1000)
+
+        kwargs = self.table.update_item.call_args.kwargs
+        self.assertEqual(kwargs["Key"], {"job_id": "0123456789ab"})
+        self.assertEqual(
+            kwargs["UpdateExpression"],
+            "SET #state = :state, #completed_at = :completed_at, #result_preview = :result_preview",
+        )
+        self.assertEqual(kwargs["ExpressionAttributeValues"][":state"], "succeeded")
+        self.assertEqual(len(kwargs["ExpressionAttributeValues"][":result_preview"]), 500)
+
+    def test_answer_jobs_cached(self):
+        self.table.query.return_value = {"Items": [mock_item()]}
+
+        for _ in range(2):
+            message = func.answer("jobs", "T1111111111", "U1111111111")
+
+        self.table.query.assert_called_once()
+        self.assertEqual(
+            message,
+            "• `0123456789ab` `report weekly`: succeeded, queued 0.5 s, ran 1.5 s",
+        )
+
+    def test_answer_status(self):
+        self.table.get_item.return_value = {"Item": mock_item({"state": "running"})}
+
+        message = func.answer("status 0123456789AB", "T1111111111", "U2222222222")
+
+        self.table.get_item.assert_called_once_with(Key={"job_id": "0123456789ab"})
+        self.assertEqual(
+            message.split("\n"),
+            [
+                "Job of <@U1111111111> `0123456789ab` `report weekly`: running, queued 0.5 s"
+                ", ran 1.5 s",
+                "Weekly report",
+            ],
+        )
+
+    def test_answer_status_other_team(self):
+        self.table.get_item.return_value = {"Item": mock_item()}
+
+        message = func.answer("status 0123456789ab", "T2222222222", "U2222222222")
+
+        self.assertEqual(message, "No job 0123456789ab.")
+
+    def test_answer_failed(self):
+        self.table.get_item.side_effect = Exception("DynamoDB is down")
+
+        self.assertEqual(
+            func.answer("status", "T1111111111", "U1111111111"), "Usage: status <job ID>"
+        )
+        self.assertEqual(
+            func.answer("status 0123456789ab", "T1111111111", "U1111111111"),
+            "The jobs cannot be read at the moment. Please try again shortly.",
+        )
+        self.assertEqual(func.cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+CloudWatch metrics written as Embedded Metric Format (EMF) log lines.
+
+Writing a log line needs no API call, CloudWatch extracts the metrics from the function's log group.
+See https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+"""
+import json
+import os
+import sys
+import time
+
+from warmup import is_warmup_event
+
+NAMESPACE = os.environ.get("MetricsNamespace", "SlackCommandApp")
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+
+# Until the container has handled its first event
+cold_start = True
+
+
+def put_metric(name, value=1, unit="Count", dimensions=None):
+    """Write one metric value, with the FunctionName dimension plus the given dimensions"""
+    dimensions = {"FunctionName": FUNCTION_NAME, **(dimensions or {})}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": unit}],
+                }
+            ],
+        },
+        name: value,
+        **dimensions,
+    }
+    # Not through logging: EMF needs the whole log event to be JSON
+    sys.stdout.write(json.dumps(record) + "\n")
+
+
+def put_cold_start_metric(event):
+    """Write ColdStart: 1 for the first request handled by the container, 0 for the next ones, and
+    return whether it was the first.
+
+    A warm-up event only marks the container as warm, so the rate is the one users see.
+    """
+    global cold_start
+    is_cold = cold_start
+    if not is_warmup_event(event):
+        put_metric("ColdStart", 1 if is_cold else 0)
+    cold_start = False
+    return is_cold
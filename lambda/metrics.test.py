@@ -0,0 +1,46 @@
+"""
+Unit tests for metrics.py
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+func = __import__("metrics")
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.cold_start = True
+
+    def test_put_metric(self):
+        with patch("metrics.sys.stdout.write") as mock_write:
+            func.put_metric("SlackPostFailures", dimensions={"Dependency": "slack"})
+
+            record = json.loads(mock_write.call_args.args[0])
+            self.assertEqual(record["SlackPostFailures"], 1)
+            self.assertEqual(record["Dependency"], "slack")
+            self.assertEqual(
+                record["_aws"]["CloudWatchMetrics"][0]["Dimensions"],
+                [["FunctionName", "Dependency"]],
+            )
+
+    def test_put_cold_start_metric(self):
+        with patch("metrics.put_metric") as mock_put_metric:
+            self.assertTrue(func.put_cold_start_metric({}))
+            self.assertFalse(func.put_cold_start_metric({}))
+
+            self.assertEqual(
+                [c.args for c in mock_put_metric.call_args_list],
+                [("ColdStart", 1), ("ColdStart", 0)],
+            )
+
+    def test_put_cold_start_metric_after_warmup(self):
+        with patch("metrics.put_metric") as mock_put_metric:
+            func.put_cold_start_metric({"warmup": True})
+            func.put_cold_start_metric({})
+
+            mock_put_metric.assert_called_once_with("ColdStart", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Latency self-diagnosis with the reserved `ping` subcommand, e.g. `/testcdk ping`.
+
+The probe takes the real path of an async command: API Gateway, ImmediateResponse, the Lambda invoke,
+AsyncWorker and the response_url. ImmediateResponse adds it to the worker payload with its own
+timestamps and whether its container was cold; AsyncWorker times a first post ("pong") to the
+response_url, then posts the breakdown per hop. Timestamps are epoch milliseconds of the clocks of
+the containers, so a hop can be off by the clock difference between them (a few ms).
+"""
+import time
+
+PING_WORD = "ping"
+
+
+def is_ping(command_text):
+    return command_text.split(" ")[0].lower() == PING_WORD
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def create_probe(request_time_ms, received_at_ms, is_cold):
+    """Return the probe passed from ImmediateResponse to AsyncWorker, just before the invoke"""
+    return {
+        "dispatched_at_ms": now_ms(),
+        "immediate_response_cold": is_cold,
+        "received_at_ms": int(received_at_ms),
+        "request_time_ms": int(request_time_ms),
+    }
+
+
+def cold_or_warm(is_cold):
+    return "cold" if is_cold else "warm"
+
+
+def format_report(probe, started_at_ms, is_cold, post_ms):
+    """Return the latency breakdown, with the AsyncWorker start and the time of its post to the
+    response_url.
+
+    The first hop includes the initialization of a cold ImmediateResponse container, the invoke hop
+    the queueing of the async event and the initialization of a cold AsyncWorker container.
+    """
+    hops = [
+        ("API Gateway → ImmediateResponse", probe["received_at_ms"] - probe["request_time_ms"]),
+        (
+            f"ImmediateResponse ({cold_or_warm(probe['immediate_response_cold'])})",
+            probe["dispatched_at_ms"] - probe["received_at_ms"],
+        ),
+        (
+            f"invoke → AsyncWorker ({cold_or_warm(is_cold)})",
+            started_at_ms - probe["dispatched_at_ms"],
+        ),
+        ("AsyncWorker → response_url", post_ms),
+    ]
+    total_ms = started_at_ms - probe["request_time_ms"] + post_ms
+    lines = [f"Ping: {total_ms:.0f} ms end to end"]
+    lines.extend(f"• {hop}: {ms:.0f} ms" for hop, ms in hops)
+    return "\n".join(lines)
@@ -0,0 +1,54 @@
+"""
+Unit tests for ping.py
+"""
+import unittest
+from unittest.mock import patch
+
+func = __import__("ping")
+
+
+class TestFunction(unittest.TestCase):
+    def test_is_ping(self):
+        self.assertTrue(func.is_ping("ping"))
+        self.assertTrue(func.is_ping("PING now"))
+        self.assertFalse(func.is_ping("pingpong"))
+        self.assertFalse(func.is_ping("async ping"))
+
+    def test_create_probe(self):
+        with patch("ping.time.time", return_value=1700000000.25):
+            probe = func.create_probe(1700000000000, 1700000000100.5, True)
+
+        self.assertEqual(
+            probe,
+            {
+                "dispatched_at_ms": 1700000000250,
+                "immediate_response_cold": True,
+                "received_at_ms": 1700000000100,
+                "request_time_ms": 1700000000000,
+            },
+        )
+
+    def test_format_report(self):
+        probe = {
+            "dispatched_at_ms": 1700000000250,
+            "immediate_response_cold": True,
+            "received_at_ms": 1700000000100,
+            "request_time_ms": 1700000000000,
+        }
+
+        report = func.format_report(probe, 1700000000330, False, 120.4)
+
+        self.assertEqual(
+            report.split("\n"),
+            [
+                "Ping: 450 ms end to end",
+                "• API Gateway → ImmediateResponse: 100 ms",
+                "• ImmediateResponse (cold): 150 ms",
+                "• invoke → AsyncWorker (warm): 80 ms",
+                "• AsyncWorker → response_url: 120 ms",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Early validation of the requests to ImmediateResponse, before any AWS call.
+
+Anything can be posted to the public endpoint. Requests which cannot come from Slack get a 4xx
+response straight away, without reading the verification token from SSM or invoking a worker:
+
+- 413 when the body is larger than RequestMaxBodyBytes (default 64 KiB)
+- 415 when the body is not application/x-www-form-urlencoded
+- 400 when a field required by the schema of a slash command or an interaction is missing or
+  does not match its pattern
+
+Each rejection writes the RequestsRejected metric (EMF, no API call) with the reason as dimension.
+"""
+import json
+import logging
+import os
+import re
+
+from metrics import put_metric
+
+MAX_BODY_BYTES = int(os.environ.get("RequestMaxBodyBytes", "65536"))
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+
+BODY_TOO_LARGE = "body_too_large"
+CONTENT_TYPE = "content_type"
+MALFORMED = "malformed"
+MISSING_FIELD = "missing_field"
+INVALID_FIELD = "invalid_field"
+
+# Compiled once per container; a value has to match the whole pattern
+ID_PATTERN = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+NAME_PATTERN = re.compile(r"[^\x00-\x1f\x7f]{0,256}")
+
+# {field: (pattern, required)}, for the parse_qs parameters
+SLASH_COMMAND_SCHEMA = {
+    "api_app_id": (ID_PATTERN, True),
+    "channel_id": (ID_PATTERN, True),
+    "channel_name": (NAME_PATTERN, True),
+    "command": (re.compile(r"/[^\s/]{1,64}"), True),
+    "response_url": (re.compile(r"https?://\S{1,2048}"), False),
+    "team_domain": (ID_PATTERN, True),
+    "team_id": (ID_PATTERN, True),
+    "token": (re.compile(r"\S{1,256}"), True),
+    "user_id": (ID_PATTERN, True),
+    "user_name": (NAME_PATTERN, True),
+}
+# Interactions are mapped to the same parameters (see ImmediateResponse.parse_interaction), but
+# `command`, and global shortcuts and modals have no channel
+INTERACTION_SCHEMA = SLASH_COMMAND_SCHEMA | {
+    "channel_id": (ID_PATTERN, False),
+    "channel_name": (NAME_PATTERN, False),
+    "command": (SLASH_COMMAND_SCHEMA["command"][0], False),
+    "interaction_type": (
+        re.compile(r"block_actions|message_action|shortcut|view_submission"),
+        True,
+    ),
+}
+
+
+def get_header(event, name):
+    """Return a header of the API Gateway event, whatever its case"""
+    headers = event.get("headers") or {}
+    return next((v for k, v in headers.items() if k.lower() == name.lower()), None)
+
+
+def check_request(event):
+    """Return (status code, reason, detail) when the body is too large or not a form, else None"""
+    body = event.get("body") or ""
+    # A form body is ASCII, so its length is its size in bytes
+    if len(body) > MAX_BODY_BYTES:
+        return 413, BODY_TOO_LARGE, f"body is larger than {MAX_BODY_BYTES} bytes"
+
+    content_type = (get_header(event, "Content-Type") or "").split(";")[0].strip().lower()
+    if content_type != FORM_CONTENT_TYPE:
+        return 415, CONTENT_TYPE, f"content type must be {FORM_CONTENT_TYPE}"
+
+
+def check_fields(params, schema):
+    """Return (status code, reason, detail) when the parameters do not match the schema, else None"""
+    for field, (pattern, required) in schema.items():
+        values = params.get(field)
+        if values is None:
+            if required:
+                return 400, MISSING_FIELD, f"missing field {field}"
+            continue
+        if not isinstance(values[0], str) or pattern.fullmatch(values[0]) is None:
+            return 400, INVALID_FIELD, f"invalid field {field}"
+
+
+def reject(status_code, reason, detail):
+    """Count the rejection and return the 4xx response"""
+    put_metric("RequestsRejected", dimensions={"Reason": reason})
+    logging.warning(f"Rejected request, {detail}")
+    return {
+        "body": json.dumps({"error": detail}),
+        "headers": {
+            "Content-Type": "application/json",
+        },
+        "statusCode": str(status_code),
+    }
@@ -0,0 +1,89 @@
+"""
+Unit tests for request_validation.py
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+func = __import__("request_validation")
+
+
+def mock_params(custom_data={}):
+    data = {
+        "api_app_id": ["APIID123456"],
+        "channel_id": ["C1111111111"],
+        "channel_name": ["dummy-channel-a"],
+        "command": ["/slack-unittest"],
+        "response_url": ["https://hooks.slack.com/commands/dummy"],
+        "team_domain": ["companya"],
+        "team_id": ["T1111111111"],
+        "text": ["async"],
+        "token": ["dummy-token"],
+        "user_id": ["U1111111111"],
+        "user_name": ["dummy user"],
+    }
+    data.update(custom_data)
+    return data
+
+
+class TestFunction(unittest.TestCase):
+    def test_check_request(self):
+        headers = {"content-type": "application/x-www-form-urlencoded; charset=utf-8"}
+
+        self.assertIsNone(func.check_request({"body": "text=async", "headers": headers}))
+        self.assertEqual(
+            func.check_request({"body": "x" * (func.MAX_BODY_BYTES + 1), "headers": headers})[:2],
+            (413, func.BODY_TOO_LARGE),
+        )
+        self.assertEqual(
+            func.check_request({"body": "{}", "headers": {"Content-Type": "application/json"}})[:2],
+            (415, func.CONTENT_TYPE),
+        )
+        self.assertEqual(func.check_request({"body": None})[:2], (415, func.CONTENT_TYPE))
+
+    def test_check_fields_slash_command(self):
+        self.assertIsNone(func.check_fields(mock_params(), func.SLASH_COMMAND_SCHEMA))
+        self.assertIsNone(
+            func.check_fields(mock_params({"text": ["a\nb"]}), func.SLASH_COMMAND_SCHEMA)
+        )
+
+        for custom_data, reason in [
+            ({"command": ["slack-unittest"]}, func.INVALID_FIELD),
+            ({"response_url": ["file:///etc/passwd"]}, func.INVALID_FIELD),
+            ({"team_id": ["T" * 65]}, func.INVALID_FIELD),
+            ({"user_name": ["dummy\x00"]}, func.INVALID_FIELD),
+        ]:
+            ret = func.check_fields(mock_params(custom_data), func.SLASH_COMMAND_SCHEMA)
+            self.assertEqual(ret[:2], (400, reason))
+
+        params = mock_params()
+        del params["channel_id"]
+        self.assertEqual(
+            func.check_fields(params, func.SLASH_COMMAND_SCHEMA),
+            (400, func.MISSING_FIELD, "missing field channel_id"),
+        )
+
+    def test_check_fields_interaction(self):
+        params = mock_params({"channel_name": [""], "interaction_type": ["shortcut"]})
+        del params["channel_id"]
+        del params["command"]
+
+        self.assertIsNone(func.check_fields(params, func.INTERACTION_SCHEMA))
+        params["interaction_type"] = ["view_closed"]
+        self.assertEqual(
+            func.check_fields(params, func.INTERACTION_SCHEMA)[:2], (400, func.INVALID_FIELD)
+        )
+
+    def test_reject(self):
+        with patch("request_validation.put_metric") as mock_put_metric:
+            ret = func.reject(413, func.BODY_TOO_LARGE, "body is too large")
+
+            mock_put_metric.assert_called_once_with(
+                "RequestsRejected", dimensions={"Reason": "body_too_large"}
+            )
+            self.assertEqual(ret["statusCode"], "413")
+            self.assertEqual(json.loads(ret["body"]), {"error": "body is too large"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Per-route latency estimates, for choosing between the sync and async workers.
+
+A route is the first word of the command text (e.g. `report`), without the `async`/`sync` mode
+word. ImmediateResponse times the sync invocations and AsyncWorker its own run, and both feed the
+durations into an exponentially weighted moving average (EWMA), where a new sample weighs
+RouteLatencyAlpha.
+
+The estimates are shared through the RouteLatencyTable DynamoDB table and cached in the container:
+each route is read and written at most once every RouteLatencyCacheSeconds. Containers writing at
+the same time overwrite each other, which only drops a few samples from the average. Routes not
+seen for RETENTION_DAYS expire, and any DynamoDB error leaves the container with its own estimate.
+"""
+import logging
+import os
+import time
+
+import aws_clients
+import snapstart
+
+ROUTE_LATENCY_TABLE_NAME = os.environ.get("RouteLatencyTable")
+ALPHA = float(os.environ.get("RouteLatencyAlpha", "0.2"))
+CACHE_SECONDS = int(os.environ.get("RouteLatencyCacheSeconds", "60"))
+RETENTION_DAYS = 30
+MODE_WORDS = ["async", "sync"]
+
+# Created on first use: AsyncWorker does not otherwise import boto3, which adds to its cold start
+table = None
+
+# Estimates of this container: {route: {"ewma_ms": ..., "fetch_after": ..., "persist_after": ...}}
+estimates = {}
+
+
+def is_enabled():
+    return bool(ROUTE_LATENCY_TABLE_NAME)
+
+
+def get_table():
+    global table
+    if table is None:
+        table = aws_clients.table(ROUTE_LATENCY_TABLE_NAME)
+    return table
+
+
+@snapstart.before_snapshot
+def create_table():
+    """Import boto3 and load the DynamoDB model before the SnapStart snapshot, not on first use"""
+    if is_enabled():
+        get_table()
+
+
+@aws_clients.on_reset
+def drop_table():
+    global table
+    table = None
+
+
+def route_key(command_text):
+    """Return the route of the command text: its first word after the mode word"""
+    words = command_text.lower().split()
+    if words and words[0] in MODE_WORDS:
+        words = words[1:]
+    return words[0] if words else ""
+
+
+def get_estimate(route):
+    return estimates.setdefault(route, {"ewma_ms": None, "fetch_after": 0, "persist_after": 0})
+
+
+def predict(route):
+    """Return the estimated duration of the route in ms, or None if it has not been seen yet"""
+    if not is_enabled():
+        return None
+
+    estimate = get_estimate(route)
+    now = time.monotonic()
+    if now >= estimate["fetch_after"]:
+        estimate["fetch_after"] = now + CACHE_SECONDS
+        try:
+            item = get_table().get_item(Key={"route": route}).get("Item")
+            if item is not None:
+                estimate["ewma_ms"] = float(item["ewma_ms"])
+        except Exception as e:
+            logging.error(f"Failed to read the latency of route {route}: {e}")
+    return estimate["ewma_ms"]
+
+
+def observe(route, duration_ms):
+    """Add a duration of the route to its estimate"""
+    if not is_enabled():
+        return
+
+    ewma_ms = predict(route)
+    estimate = get_estimate(route)
+    if ewma_ms is None:
+        estimate["ewma_ms"] = float(duration_ms)
+    else:
+        estimate["ewma_ms"] = ewma_ms + ALPHA * (duration_ms - ewma_ms)
+
+    now = time.monotonic()
+    if now >= estimate["persist_after"]:
+        estimate["persist_after"] = now + CACHE_SECONDS
+        try:
+            get_table().put_item(
+                Item={
+                    "route": route,
+                    "ewma_ms": round(estimate["ewma_ms"]),
+                    "expires_at": int(time.time()) + RETENTION_DAYS * 24 * 3600,
+                }
+            )
+        except Exception as e:
+            logging.error(f"Failed to write the latency of route {route}: {e}")
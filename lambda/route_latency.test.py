@@ -0,0 +1,66 @@
+"""
+Unit tests for route_latency.py
+"""
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ["RouteLatencyTable"] = "Dummy-RouteLatency"
+func = __import__("route_latency")
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.estimates.clear()
+        self.table = MagicMock()
+        self.table.get_item.return_value = {}
+        patcher = patch("route_latency.table", self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_route_key(self):
+        self.assertEqual(func.route_key("Report weekly"), "report")
+        self.assertEqual(func.route_key("async  report weekly"), "report")
+        self.assertEqual(func.route_key("sync"), "")
+
+    def test_predict_disabled(self):
+        with patch("route_latency.ROUTE_LATENCY_TABLE_NAME", None):
+            self.assertIsNone(func.predict("report"))
+            func.observe("report", 1000)
+        self.table.get_item.assert_not_called()
+        self.table.put_item.assert_not_called()
+
+    def test_predict_cached(self):
+        self.table.get_item.return_value = {"Item": {"route": "report", "ewma_ms": 4200}}
+
+        self.assertEqual(func.predict("report"), 4200)
+        self.assertEqual(func.predict("report"), 4200)
+        self.table.get_item.assert_called_once_with(Key={"route": "report"})
+
+    def test_observe_ewma(self):
+        self.table.get_item.return_value = {"Item": {"route": "report", "ewma_ms": 1000}}
+
+        func.observe("report", 2000)
+        func.observe("report", 2000)
+
+        self.assertAlmostEqual(func.predict("report"), 1000 + 0.2 * 1000 + 0.2 * 800)
+        # Written once per cache period
+        self.table.put_item.assert_called_once()
+        self.assertEqual(self.table.put_item.call_args.kwargs["Item"]["ewma_ms"], 1200)
+
+    def test_observe_first_sample(self):
+        func.observe("report", 350)
+
+        self.assertEqual(func.predict("report"), 350)
+
+    def test_table_unavailable(self):
+        self.table.get_item.side_effect = Exception("DynamoDB unavailable")
+        self.table.put_item.side_effect = Exception("DynamoDB unavailable")
+
+        self.assertIsNone(func.predict("report"))
+        func.observe("report", 350)
+        self.assertEqual(func.predict("report"), 350)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Single-flight coalescing of identical commands.
+
+While a command is running, identical requests (same team, worker function and normalized text)
+join it instead of invoking the worker again. The first request takes a short-lived lease, an item
+in the SingleFlightTable DynamoDB table, and runs the command (leader); the next ones find the lease
+and become followers:
+
+- async: the follower's response_url is added to the lease, and the worker posts its result to
+  the leader's and every follower's response_url (see `complete()`).
+- sync: the follower waits up to SingleFlightWaitMs for the leader to store the result in the
+  lease, and replies with it.
+
+Leases this container knows about are kept in a map, so a follower on the same container goes
+straight to joining. A lease expires after SingleFlightLeaseSeconds, so a crashed leader only holds
+up identical commands until then. Any DynamoDB error lets the request run on its own.
+"""
+import hashlib
+import logging
+import os
+import time
+
+import aws_clients
+import snapstart
+
+SINGLE_FLIGHT_TABLE_NAME = os.environ.get("SingleFlightTable")
+LEASE_SECONDS = int(os.environ.get("SingleFlightLeaseSeconds", "60"))
+WAIT_MS = int(os.environ.get("SingleFlightWaitMs", "2000"))
+POLL_MS = 100
+
+LEADER = "leader"
+FOLLOWER = "follower"
+
+# Created on first use: AsyncWorker does not otherwise import boto3, which adds to its cold start
+table = None
+
+# Leases seen by this container: {key: expires_at}
+local_leases = {}
+
+
+def is_enabled():
+    return bool(SINGLE_FLIGHT_TABLE_NAME)
+
+
+def get_table():
+    global table
+    if table is None:
+        table = aws_clients.table(SINGLE_FLIGHT_TABLE_NAME)
+    return table
+
+
+@snapstart.before_snapshot
+def create_table():
+    """Import boto3 and load the DynamoDB model before the SnapStart snapshot, not on first use"""
+    if is_enabled():
+        get_table()
+
+
+@aws_clients.on_reset
+def drop_table():
+    global table
+    table = None
+
+
+def is_condition_failure(e):
+    """Check for a botocore ClientError of a failed condition (botocore is imported lazily)"""
+    code = getattr(e, "response", {}).get("Error", {}).get("Code")
+    return code == "ConditionalCheckFailedException"
+
+
+def coalescing_key(function_name, command_text, team_id):
+    """Key of identical commands: same team, worker function and text (case and spaces ignored)"""
+    text = " ".join(command_text.lower().split())
+    return hashlib.sha256(f"{team_id}\n{function_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def take_lease(key, now):
+    get_table().put_item(
+        Item={"flight_key": key, "expires_at": int(now) + LEASE_SECONDS, "followers": []},
+        ConditionExpression=(
+            "attribute_not_exists(flight_key) OR expires_at < :now"
+            " OR attribute_exists(completed_at)"
+        ),
+        ExpressionAttributeValues={":now": int(now)},
+    )
+    local_leases[key] = int(now) + LEASE_SECONDS
+
+
+def join_lease(key, response_url, now):
+    resp = get_table().update_item(
+        Key={"flight_key": key},
+        UpdateExpression="SET followers = list_append(followers, :url)",
+        ConditionExpression=(
+            "attribute_exists(flight_key) AND expires_at >= :now"
+            " AND attribute_not_exists(completed_at)"
+        ),
+        ExpressionAttributeValues={":now": int(now), ":url": [response_url]},
+        ReturnValues="ALL_NEW",
+    )
+    local_leases[key] = int(resp["Attributes"]["expires_at"])
+
+
+def acquire(key, response_url):
+    """Return LEADER if this request should run the command, or FOLLOWER if it joined one"""
+    if not is_enabled():
+        return LEADER
+
+    now = time.time()
+    try:
+        # Two rounds: the lease may complete or expire between taking and joining it
+        for _ in range(2):
+            if local_leases.get(key, 0) < now:
+                try:
+                    take_lease(key, now)
+                    return LEADER
+                except Exception as e:
+                    if not is_condition_failure(e):
+                        raise
+            try:
+                join_lease(key, response_url, now)
+                return FOLLOWER
+            except Exception as e:
+                if not is_condition_failure(e):
+                    raise
+                local_leases.pop(key, None)
+    except Exception as e:
+        logging.error(f"Single-flight lease of {key} not available: {e}")
+    return LEADER
+
+
+def complete(key, result=None):
+    """Store the result, end the lease and return the response_urls of the followers"""
+    if not is_enabled():
+        return []
+
+    local_leases.pop(key, None)
+    try:
+        resp = get_table().update_item(
+            Key={"flight_key": key},
+            UpdateExpression="SET completed_at = :now, result_text = :result",
+            ConditionExpression="attribute_exists(flight_key)",
+            ExpressionAttributeValues={":now": int(time.time()), ":result": result},
+            ReturnValues="ALL_NEW",
+        )
+        return resp["Attributes"].get("followers", [])
+    except Exception as e:
+        logging.error(f"Failed to complete single-flight lease {key}: {e}")
+        return []
+
+
+def wait_for_result(key, wait_ms=None):
+    """Return the result stored by the leader, or None if it is not there within `wait_ms`"""
+    deadline = time.monotonic() + (WAIT_MS if wait_ms is None else wait_ms) / 1000
+    try:
+        while True:
+            item = get_table().get_item(Key={"flight_key": key}, ConsistentRead=True).get("Item")
+            if item and "completed_at" in item:
+                return item.get("result_text")
+            if time.monotonic() + POLL_MS / 1000 > deadline:
+                return None
+            time.sleep(POLL_MS / 1000)
+    except Exception as e:
+        logging.error(f"Failed to read single-flight lease {key}: {e}")
+        return None
@@ -0,0 +1,104 @@
+"""
+Unit tests for single_flight.py
+"""
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+os.environ["SingleFlightTable"] = "Dummy-SingleFlight"
+func = __import__("single_flight")
+
+
+def condition_failed():
+    e = Exception("The conditional request failed")
+    e.response = {"Error": {"Code": "ConditionalCheckFailedException"}}
+    return e
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        func.local_leases.clear()
+        self.table = MagicMock()
+        self.table.update_item.return_value = {
+            "Attributes": {"expires_at": 2000000000, "followers": ["url-b", "url-c"]}
+        }
+        patcher = patch("single_flight.table", self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_coalescing_key(self):
+        key = func.coalescing_key("Dummy-AsyncWorker", "status  Prod", "T1111111111")
+
+        self.assertEqual(
+            key, func.coalescing_key("Dummy-AsyncWorker", "status prod", "T1111111111")
+        )
+        self.assertNotEqual(
+            key, func.coalescing_key("Dummy-SyncWorker", "status prod", "T1111111111")
+        )
+        self.assertNotEqual(
+            key, func.coalescing_key("Dummy-AsyncWorker", "status prod", "T2222222222")
+        )
+
+    def test_acquire_disabled(self):
+        with patch("single_flight.SINGLE_FLIGHT_TABLE_NAME", None):
+            self.assertEqual(func.acquire("key", "url-a"), func.LEADER)
+            self.assertEqual(func.complete("key"), [])
+        self.table.put_item.assert_not_called()
+
+    def test_acquire_leader(self):
+        self.assertEqual(func.acquire("key", "url-a"), func.LEADER)
+        self.table.update_item.assert_not_called()
+        self.assertIn("key", func.local_leases)
+
+    def test_acquire_follower(self):
+        self.table.put_item.side_effect = condition_failed()
+
+        self.assertEqual(func.acquire("key", "url-b"), func.FOLLOWER)
+        values = self.table.update_item.call_args.kwargs["ExpressionAttributeValues"]
+        self.assertEqual(values[":url"], ["url-b"])
+        self.assertEqual(func.local_leases["key"], 2000000000)
+
+    def test_acquire_follower_of_local_lease(self):
+        func.local_leases["key"] = 2000000000
+
+        self.assertEqual(func.acquire("key", "url-b"), func.FOLLOWER)
+        self.table.put_item.assert_not_called()
+
+    def test_acquire_leader_after_lease_completed(self):
+        self.table.put_item.side_effect = [condition_failed(), None]
+        self.table.update_item.side_effect = condition_failed()
+
+        self.assertEqual(func.acquire("key", "url-b"), func.LEADER)
+        self.assertEqual(self.table.put_item.call_count, 2)
+
+    def test_acquire_table_unavailable(self):
+        self.table.put_item.side_effect = Exception("ProvisionedThroughputExceededException")
+
+        self.assertEqual(func.acquire("key", "url-a"), func.LEADER)
+
+    def test_complete(self):
+        func.local_leases["key"] = 2000000000
+
+        self.assertEqual(func.complete("key", "result"), ["url-b", "url-c"])
+        values = self.table.update_item.call_args.kwargs["ExpressionAttributeValues"]
+        self.assertEqual(values[":result"], "result")
+        self.assertNotIn("key", func.local_leases)
+
+    def test_wait_for_result(self):
+        self.table.get_item.side_effect = [
+            {"Item": {"flight_key": "key"}},
+            {"Item": {"flight_key": "key", "completed_at": 1, "result_text": "result"}},
+        ]
+
+        with patch("single_flight.time.sleep") as mock_sleep:
+            self.assertEqual(func.wait_for_result("key"), "result")
+            mock_sleep.assert_called_once()
+
+    def test_wait_for_result_timeout(self):
+        self.table.get_item.return_value = {"Item": {"flight_key": "key"}}
+
+        self.assertIsNone(func.wait_for_result("key", wait_ms=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+"""
+Registry of the Slack apps served by one deployment.
+
+The CDK stacks render the apps listed in env_<stage>.json into the SlackApps environment variable,
+keyed by app ID (`api_app_id` of the requests) and with the fields the function needs, e.g.
+
+    {"A1111111111": {"command": "/testcdk", "verification_token_parameter_key": "/apps/...",
+                     "team_ids": ["T1111111111"], "team_domains": ["companya"],
+                     "channel_ids": ["C1111111111"]}}
+
+The registry is parsed once per container. The first app is the default one, e.g. for the OAuth
+redirect URL without an app ID. Secrets stay in SSM and are cached by the handlers.
+"""
+import json
+import os
+
+SLACK_APPS = json.loads(os.environ.get("SlackApps", "{}"))
+DEFAULT_APP_ID = next(iter(SLACK_APPS), None)
+
+
+def get_app(app_id):
+    """Return the settings of the app, or None if this deployment does not serve it"""
+    return SLACK_APPS.get(app_id)
@@ -0,0 +1,39 @@
+"""
+SnapStart support shared by all functions.
+
+With SnapStart, Lambda initializes a published version once, snapshots its memory and resumes new
+containers from that snapshot. Module level state is then shared by every container, so modules
+register hooks with `before_snapshot` (finish loading what the first request would otherwise load)
+and `after_restore` (reconnect, refresh secrets). The random generator is reseeded here, so the
+containers do not all sample and make trace IDs alike.
+
+The hooks are registered with the runtime's `snapshot_restore_py` module. Without it (no SnapStart,
+unit tests, SAM local) nothing is registered and the decorated functions are left as they are.
+"""
+import logging
+import random
+
+try:
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:
+    register_after_restore = register_before_snapshot = None
+
+
+def before_snapshot(func):
+    """Decorator: run `func` before the snapshot is taken"""
+    if register_before_snapshot is not None:
+        register_before_snapshot(func)
+    return func
+
+
+def after_restore(func):
+    """Decorator: run `func` when a container is resumed from the snapshot"""
+    if register_after_restore is not None:
+        register_after_restore(func)
+    return func
+
+
+@after_restore
+def reseed_random():
+    random.seed()
+    logging.info("Restored from snapshot")
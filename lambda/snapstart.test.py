@@ -0,0 +1,44 @@
+"""
+Unit tests for snapstart.py
+"""
+import random
+import unittest
+from unittest.mock import MagicMock, patch
+
+func = __import__("snapstart")
+
+
+class TestFunction(unittest.TestCase):
+    def test_hooks_without_snapstart(self):
+        def hook():
+            pass
+
+        self.assertIsNone(func.register_before_snapshot)
+        self.assertIs(func.before_snapshot(hook), hook)
+        self.assertIs(func.after_restore(hook), hook)
+
+    def test_hooks_registered(self):
+        def hook():
+            pass
+
+        register_before_snapshot, register_after_restore = MagicMock(), MagicMock()
+        with patch("snapstart.register_before_snapshot", register_before_snapshot), patch(
+            "snapstart.register_after_restore", register_after_restore
+        ):
+            self.assertIs(func.before_snapshot(hook), hook)
+            self.assertIs(func.after_restore(hook), hook)
+
+        register_before_snapshot.assert_called_once_with(hook)
+        register_after_restore.assert_called_once_with(hook)
+
+    def test_reseed_random(self):
+        random.seed(1)
+        snapshotted = random.getstate()
+
+        func.reseed_random()
+
+        self.assertNotEqual(random.getstate(), snapshotted)
+
+
+if __name__ == "__main__":
+    unittest.main()
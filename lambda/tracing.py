@@ -0,0 +1,258 @@
+"""
+Opt-in tracing of a slash command across ImmediateResponse, the workers and Slack.
+
+Handlers are decorated with `@traced_handler("Name")` and create child spans with
+`with span("name", key=value):`. When tracing is disabled, or the trace is not sampled, `span()`
+returns a shared no-op span, so the cost is a single check.
+
+The trace context is carried to the workers inside the Lambda invoke payload: `inject(payload)` in
+ImmediateResponse, then `traced_handler` in the worker picks it up again.
+
+Configuration (environment variables set by the CDK stacks):
+- TracingEnabled: "true" to enable tracing
+- TracingSampleRate: fraction of new traces recorded (default 1.0)
+- TracingExporter: "log" (default, one JSON line per span) or "xray" (X-Ray daemon)
+"""
+import json
+import logging
+import os
+import random
+import socket
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+
+import snapstart  # noqa: F401 reseeds `random` (trace IDs, sampling) after a SnapStart restore
+from warmup import is_warmup_event
+
+TRACE_CONTEXT_KEY = "trace_context"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str = None
+    start_time: float = field(default_factory=time.time)
+    end_time: float = None
+    error: bool = False
+    attributes: dict = field(default_factory=dict)
+    is_entry: bool = False  # first span of this invocation
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class NoopSpan:
+    """Returned by span() when there is no sampled trace"""
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class InMemoryExporter:
+    """Keep finished spans in memory, for unit tests and local runs"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans = []
+
+
+class LogExporter:
+    """Write each finished span as one JSON line, to be queried with CloudWatch Logs Insights"""
+
+    def export(self, span):
+        logging.info(json.dumps({"span": asdict(span)}))
+
+
+class XRayExporter:
+    """Send each finished span as a subsegment to the X-Ray daemon of the Lambda environment.
+
+    The entry span of a new trace is attached to the segment created by Lambda for the invocation;
+    the one of a trace continued in a worker, to the span of the caller (see `start_trace`).
+    """
+
+    HEADER = json.dumps({"format": "json", "version": 1}) + "\n"
+
+    def __init__(self):
+        host, port = os.environ.get("AWS_XRAY_DAEMON_ADDRESS", "127.0.0.1:2000").split(":")
+        self.address = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def export(self, span):
+        segment = {
+            "type": "subsegment",
+            "id": span.span_id,
+            "trace_id": span.trace_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start_time": span.start_time,
+            "end_time": span.end_time,
+            "error": span.error,
+            "metadata": {"default": span.attributes},
+        }
+        try:
+            self.sock.sendto((self.HEADER + json.dumps(segment)).encode(), self.address)
+        except Exception as e:
+            logging.error(f"Failed to send span to X-Ray daemon: {e}")
+
+
+@dataclass
+class Config:
+    enabled: bool = False
+    sample_rate: float = 1.0
+    exporter: object = None
+
+
+EXPORTERS = {"log": LogExporter, "xray": XRayExporter, "memory": InMemoryExporter}
+
+_config = Config()
+_current_span: ContextVar = ContextVar("current_span", default=None)
+_entry_parent: ContextVar = ContextVar("entry_parent", default=None)
+_sampled: ContextVar = ContextVar("sampled", default=False)
+
+
+def configure(enabled, sample_rate=1.0, exporter=None):
+    """Set up tracing; exporter is an exporter instance or one of the EXPORTERS names"""
+    if isinstance(exporter, str) or exporter is None:
+        exporter = EXPORTERS[exporter or "log"]() if enabled else None
+    _config.enabled = enabled
+    _config.sample_rate = sample_rate
+    _config.exporter = exporter
+
+
+def configure_from_environment():
+    configure(
+        enabled=os.environ.get("TracingEnabled") == "true",
+        sample_rate=float(os.environ.get("TracingSampleRate", "1.0")),
+        exporter=os.environ.get("TracingExporter", "log"),
+    )
+
+
+def lambda_trace_header():
+    """Parse _X_AMZN_TRACE_ID, e.g. "Root=1-5759e988-bd862e3fe1be46a994272793;Parent=53995c3f;Sampled=1" """
+    header = os.environ.get("_X_AMZN_TRACE_ID", "")
+    return dict(part.split("=", 1) for part in header.split(";") if "=" in part)
+
+
+def new_trace_id():
+    """X-Ray compatible trace ID"""
+    return f"1-{int(time.time()):08x}-{random.getrandbits(96):024x}"
+
+
+def new_span_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+def start_trace(trace_context=None):
+    """Start (or continue, from a propagated trace_context) the trace of this invocation.
+
+    Returns False if the invocation is not traced.
+    """
+    _current_span.set(None)
+    if not _config.enabled:
+        _sampled.set(False)
+        return False
+
+    if trace_context:
+        sampled = trace_context.get("sampled", False) is True
+        parent = Span("remote", trace_context["trace_id"], trace_context["span_id"])
+    else:
+        header = lambda_trace_header()
+        sampled = header.get("Sampled", "1") == "1" and random.random() < _config.sample_rate
+        parent = None
+        if sampled:
+            # Use the X-Ray trace ID when there is one, so both views line up; the parent of the
+            # entry span is then the segment of the invocation, from the same header
+            root = header.get("Root")
+            parent = Span("root", root or new_trace_id(), header.get("Parent") if root else None)
+
+    _sampled.set(sampled)
+    _current_span.set(parent)
+    _entry_parent.set(parent)
+    return sampled
+
+
+def end_trace():
+    _sampled.set(False)
+    _current_span.set(None)
+    _entry_parent.set(None)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Record a span around the block, as a child of the current span"""
+    parent = _current_span.get()
+    if not _sampled.get() or parent is None:
+        yield NOOP_SPAN
+        return
+
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id,
+        span_id=new_span_id(),
+        parent_id=parent.span_id,
+        attributes=attributes,
+        is_entry=parent is _entry_parent.get(),
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception:
+        current.error = True
+        raise
+    finally:
+        current.end_time = time.time()
+        _current_span.reset(token)
+        _config.exporter.export(current)
+
+
+def inject(payload):
+    """Add the current trace context to a payload sent to another function"""
+    current = _current_span.get()
+    if _sampled.get() and current is not None:
+        payload[TRACE_CONTEXT_KEY] = {
+            "trace_id": current.trace_id,
+            "span_id": current.span_id,
+            "sampled": True,
+        }
+    return payload
+
+
+def extract(event):
+    return event.get(TRACE_CONTEXT_KEY) if isinstance(event, dict) else None
+
+
+def traced_handler(name):
+    """Decorate a lambda_handler to run it in a root span, continuing any propagated trace"""
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(event, context):
+            if not _config.enabled or is_warmup_event(event):
+                return handler(event, context)
+
+            start_trace(extract(event))
+            try:
+                with span(name):
+                    return handler(event, context)
+            finally:
+                end_trace()
+
+        return wrapper
+
+    return decorator
+
+
+configure_from_environment()
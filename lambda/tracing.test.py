@@ -0,0 +1,122 @@
+"""
+Unit tests for tracing.py
+"""
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+func = __import__("tracing")
+
+
+def worker_handler(event, context):
+    with func.span("work"):
+        return {"statusCode": 200}
+
+
+def immediate_response_handler(event, context):
+    with func.span("parse"):
+        pass
+    with func.span("dispatch") as span:
+        span.set_attribute("function", "AsyncWorker")
+        payload = func.inject({"text": ["async"]})
+    return func.traced_handler("AsyncWorker")(worker_handler)(payload, None)
+
+
+class TestFunction(unittest.TestCase):
+    def setUp(self):
+        self.exporter = func.InMemoryExporter()
+
+    def tearDown(self):
+        func.end_trace()
+        func.configure(enabled=False)
+
+    def test_disabled(self):
+        func.configure(enabled=False)
+        handler = func.traced_handler("ImmediateResponse")(immediate_response_handler)
+
+        ret = handler({}, None)
+
+        self.assertEqual(ret, {"statusCode": 200})
+        with func.span("parse") as span:
+            self.assertIs(span, func.NOOP_SPAN)
+        self.assertEqual(func.inject({}), {})
+
+    def test_not_sampled(self):
+        func.configure(enabled=True, sample_rate=0.0, exporter=self.exporter)
+        handler = func.traced_handler("ImmediateResponse")(immediate_response_handler)
+
+        handler({}, None)
+
+        self.assertEqual(self.exporter.spans, [])
+
+    def test_trace_propagated_to_worker(self):
+        func.configure(enabled=True, sample_rate=1.0, exporter=self.exporter)
+        handler = func.traced_handler("ImmediateResponse")(immediate_response_handler)
+
+        handler({}, None)
+
+        spans = {s.name: s for s in self.exporter.spans}
+        self.assertEqual(
+            sorted(spans), ["AsyncWorker", "ImmediateResponse", "dispatch", "parse", "work"]
+        )
+        self.assertEqual(len({s.trace_id for s in self.exporter.spans}), 1)
+        self.assertTrue(spans["ImmediateResponse"].is_entry)
+        self.assertEqual(spans["parse"].parent_id, spans["ImmediateResponse"].span_id)
+        self.assertEqual(spans["AsyncWorker"].parent_id, spans["dispatch"].span_id)
+        self.assertTrue(spans["AsyncWorker"].is_entry)
+        self.assertEqual(spans["work"].parent_id, spans["AsyncWorker"].span_id)
+        self.assertEqual(spans["dispatch"].attributes, {"function": "AsyncWorker"})
+
+    def test_xray_parents_in_same_trace(self):
+        exporter = func.XRayExporter()
+        exporter.sock = MagicMock()
+        func.configure(enabled=True, sample_rate=1.0, exporter=exporter)
+        root = "1-5759e988-bd862e3fe1be46a994272793"
+        immediate_response_header = f"Root={root};Parent=53995c3f00000001;Sampled=1"
+        # The worker's own invocation is in another trace
+        worker_header = "Root=1-5759e988-00000000000000000000000a;Parent=53995c3f00000002;Sampled=1"
+
+        def handler(event, context):
+            with func.span("dispatch"):
+                payload = func.inject({"text": ["async"]})
+            with patch.dict(os.environ, {"_X_AMZN_TRACE_ID": worker_header}):
+                func.traced_handler("AsyncWorker")(worker_handler)(payload, None)
+
+        with patch.dict(os.environ, {"_X_AMZN_TRACE_ID": immediate_response_header}):
+            func.traced_handler("ImmediateResponse")(handler)({}, None)
+
+        segments = {}
+        for call in exporter.sock.sendto.call_args_list:
+            segment = json.loads(call.args[0].decode().split("\n", 1)[1])
+            segments[segment["name"]] = segment
+        self.assertEqual({s["trace_id"] for s in segments.values()}, {root})
+        self.assertEqual(segments["ImmediateResponse"]["parent_id"], "53995c3f00000001")
+        self.assertEqual(segments["AsyncWorker"]["parent_id"], segments["dispatch"]["id"])
+        ids = {s["id"] for s in segments.values()}
+        for name, segment in segments.items():
+            if name != "ImmediateResponse":
+                self.assertIn(segment["parent_id"], ids, name)
+
+    def test_error_recorded(self):
+        func.configure(enabled=True, sample_rate=1.0, exporter=self.exporter)
+        func.start_trace()
+
+        with self.assertRaises(ValueError):
+            with func.span("http.post"):
+                raise ValueError("boom")
+
+        self.assertTrue(self.exporter.spans[0].error)
+        self.assertIsNotNone(self.exporter.spans[0].end_time)
+
+    def test_warmup_not_traced(self):
+        func.configure(enabled=True, sample_rate=1.0, exporter=self.exporter)
+        handler = func.traced_handler("SyncWorker")(worker_handler)
+
+        handler({"warmup": True}, None)
+
+        self.assertEqual(self.exporter.spans, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+"""
+Keep-warm support shared by all functions.
+
+The CDK stacks can create an EventBridge schedule which invokes each function with an event like
+`{"warmup": true, "concurrency": 2, "hold_ms": 100}`. A handler checks `is_warmup_event()` before
+doing anything else and returns `warmup_response()`. By then the module level clients have been
+created by the import, so a warm-up never logs the event or calls Slack or AWS.
+"""
+import time
+
+WARMUP_EVENT_KEY = "warmup"
+
+
+def is_warmup_event(event):
+    return isinstance(event, dict) and event.get(WARMUP_EVENT_KEY) is True
+
+
+def warmup_response(event):
+    """Return the warm-up response.
+
+    When several warm-up events are sent at once (concurrency > 1) the container is held for
+    `hold_ms`, so the other events cannot reuse it and each one warms up a separate container.
+    """
+    hold_ms = event.get("hold_ms", 0)
+    if event.get("concurrency", 1) > 1 and hold_ms > 0:
+        time.sleep(hold_ms / 1000)
+
+    return {
+        "statusCode": 200,
+        "body": "warm",
+    }
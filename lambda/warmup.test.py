@@ -0,0 +1,30 @@
+"""
+Unit tests for warmup.py
+"""
+import unittest
+from unittest.mock import patch
+
+func = __import__("warmup")
+
+
+class TestFunction(unittest.TestCase):
+    def test_is_warmup_event(self):
+        self.assertTrue(func.is_warmup_event({"warmup": True}))
+        self.assertFalse(func.is_warmup_event({"warmup": "true"}))
+        self.assertFalse(func.is_warmup_event({"body": "warmup=true"}))
+        self.assertFalse(func.is_warmup_event(None))
+
+    def test_warmup_response_single(self):
+        with patch("warmup.time.sleep") as mock_sleep:
+            ret = func.warmup_response({"warmup": True, "concurrency": 1, "hold_ms": 100})
+            mock_sleep.assert_not_called()
+            self.assertEqual(ret, {"statusCode": 200, "body": "warm"})
+
+    def test_warmup_response_concurrent(self):
+        with patch("warmup.time.sleep") as mock_sleep:
+            func.warmup_response({"warmup": True, "concurrency": 3, "hold_ms": 100})
+            mock_sleep.assert_called_once_with(0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import boto3
 
-AWS_REGION = "ap-southeast-2"
+AWS_REGIONS = ["ap-southeast-2"]  # SSM parameters are regional; list every region in env_<stage>.json "regions"
 DATA = {
     "verification_token": None,  # Slack Verification Token
     "client_id": None,  # optional: required for deploying K-CDK-SlackCommandAppSharing for app sharing with oauth 2.0
@@ -11,8 +11,8 @@ PARAMETER_KEY_PREFIX = "/apps/slack_app/k_cdk_slack_command_app"
 # key_id = "TODO The KMS Key ID (optional)"
 
 
-def create_parameter(name, value):
-    resp = boto3.client("ssm", region_name=AWS_REGION).put_parameter(
+def create_parameter(region, name, value):
+    resp = boto3.client("ssm", region_name=region).put_parameter(
         Name=f"{PARAMETER_KEY_PREFIX}/{name}",
         Description=f"{SLACK_APP_NAME} {name}",
         Value=value,
@@ -28,6 +28,7 @@ def create_parameter(name, value):
     print(resp)
 
 
-for key, value in DATA.items():
-    if value:
-        create_parameter(key, value)
+for region in AWS_REGIONS:
+    for key, value in DATA.items():
+        if value:
+            create_parameter(region, key, value)
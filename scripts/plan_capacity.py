@@ -0,0 +1,453 @@
+"""
+Plan the Lambda concurrency and the monthly cost of the command app for a traffic profile, offline.
+
+The functions come from env_<stage>.json: ImmediateResponse, the shared workers, the worker lanes
+and the commands with their own function (memory, reserved concurrency, mode, SnapStart). The
+traffic comes from a profile (JSON) and/or captured requests (see lambda/capture.py):
+
+    {
+        "rate_per_second": [0.2, 0.1, ..., 4.0, ...],   24 hourly rates (UTC), or one rate
+        "routes": {
+            "report": {"share": 0.1, "duration_ms": {"p50": 4000, "p99": 30000}},
+            "*": {"mode": "sync", "duration_ms": {"p50": 300, "p99": 1500}}
+        },
+        "lanes": {"<lane>": 0.3},                        share of the requests from lane teams
+        "immediate_response_ms": {"p50": 40, "p99": 250},
+        "cold_start_ms": 800, "snapstart_restore_ms": 300, "gateway_ms": 15,
+        "prices": {...}                                  overrides of PRICES
+    }
+
+A route is the first word of the command text; `*` takes the share left by the others. The mode
+(async or sync) of a route without its own function picks the worker, sync by default. With
+captures, the hourly rates and the route and mode mix are taken from the records instead, and the
+durations from the profile. Durations are log-normal, fitted to their p50 and p99.
+
+The peak hour is simulated `--trials` times (after a warm-up of the pools): Poisson arrivals are
+processed in order, each function keeps a pool of containers reused while idle for less than
+`--idle-minutes`, a sync invocation over the concurrency limit is throttled and an async one waits
+for a container. Unreserved functions share the account limit minus the reserved concurrency.
+
+Usage:
+    python scripts/plan_capacity.py --profile profile.json
+    python scripts/plan_capacity.py --env env_prd.json --captures capture/ --scale 5
+"""
+import argparse
+import json
+import math
+import random
+import sys
+from collections import Counter
+
+from replay_traffic import load_records, percentile
+
+ACK_BUDGET_MS = 3000
+DEFAULT_MEMORY_MB = 128
+MODE_WORDS = ["async", "sync"]
+HOURS_PER_MONTH = 730
+Z_99 = 2.326  # p99 of the standard normal distribution
+
+# USD, us-east-1 list prices, x86
+PRICES = {
+    "api_gateway_per_million": 3.50,  # REST API, first 333 million requests
+    "lambda_requests_per_million": 0.20,
+    "lambda_gb_second": 0.0000166667,
+    "dynamodb_write_per_million": 0.625,  # on-demand write request units
+    "dynamodb_read_per_million": 0.125,  # on-demand read request units
+}
+
+DEFAULT_PROFILE = {
+    "rate_per_second": 1.0,
+    "routes": {"*": {"mode": "sync", "duration_ms": {"p50": 300, "p99": 1500}}},
+    "lanes": {},
+    "immediate_response_ms": {"p50": 40, "p99": 250},
+    "cold_start_ms": 800,
+    "snapstart_restore_ms": 300,
+    "gateway_ms": 15,
+    "prices": {},
+}
+
+
+def get_functions(settings, account_concurrency):
+    """Map each function name to its memory and reserved concurrency (None: unreserved)"""
+    functions = {"ImmediateResponse": {"memory_mb": DEFAULT_MEMORY_MB, "reserved": None}}
+    for handler_module in ["AsyncWorker", "SyncWorker"]:
+        functions[handler_module] = {"memory_mb": DEFAULT_MEMORY_MB, "reserved": None}
+    for lane, lane_settings in settings.get("worker_lanes", {}).items():
+        for handler_module in ["AsyncWorker", "SyncWorker"]:
+            functions[f"{handler_module}-{lane}"] = {
+                "memory_mb": DEFAULT_MEMORY_MB,
+                "reserved": lane_settings.get("reserved_concurrency"),
+            }
+    for name, command in settings.get("commands", {}).items():
+        functions[f"Command-{name.lower()}"] = {
+            "memory_mb": command.get("memory_mb", DEFAULT_MEMORY_MB),
+            "reserved": command.get("reserved_concurrency"),
+        }
+
+    reserved = sum(f["reserved"] or 0 for f in functions.values())
+    if reserved >= account_concurrency:
+        sys.exit(f"Reserved concurrency ({reserved}) leaves nothing of the account limit")
+    snapstart = settings.get("snapstart", {}).get("functions", [])
+    for name, function in functions.items():
+        function["snapstart"] = name in snapstart
+    return functions, account_concurrency - reserved
+
+
+def load_profile(path):
+    profile = dict(DEFAULT_PROFILE)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            profile.update(json.load(f))
+    rate = profile["rate_per_second"]
+    profile["rate_per_second"] = rate if isinstance(rate, list) else [rate] * 24
+    if len(profile["rate_per_second"]) != 24:
+        sys.exit("rate_per_second must be one rate or 24 hourly rates")
+    return profile
+
+
+def split_command_text(text):
+    """Return the route (first word after the mode word) and the mode word, if any"""
+    words = (text or "").lower().split()
+    mode = words[0] if words and words[0] in MODE_WORDS else None
+    if mode:
+        words = words[1:]
+    return (words[0] if words else ""), mode
+
+
+def get_traffic_mix(profile, settings):
+    """Return [(route, mode word or None, share)], `*` taking the share left by the other routes.
+
+    The mode of a profile route is the worker it goes to when it has no function of its own.
+    """
+    if "mix" in profile:
+        return profile["mix"]
+    routes = profile["routes"]
+    commands = [name.lower() for name in settings.get("commands", {})]
+    mix = [
+        (r, None if r in commands else v.get("mode"), v["share"])
+        for r, v in routes.items()
+        if r != "*"
+    ]
+    left = 1 - sum(share for _, _, share in mix)
+    if left < -1e-9:
+        sys.exit("The shares of the routes add up to more than 1")
+    if left > 1e-9:
+        mix.append(("*", routes.get("*", DEFAULT_PROFILE["routes"]["*"]).get("mode"), left))
+    return mix
+
+
+def apply_captures(profile, records, sample_rate):
+    """Take the hourly rates and the route and mode mix from captured records"""
+    days = max(1, len({int(r["received_at"] // 86400) for r in records}))
+    per_hour = Counter(int(r["received_at"] % 86400 // 3600) for r in records)
+    profile["rate_per_second"] = [per_hour[h] / days / sample_rate / 3600 for h in range(24)]
+    # The same route may come with and without a mode word
+    mix = Counter(split_command_text(r["params"].get("text", [""])[0]) for r in records)
+    profile["mix"] = [(route, mode, count / len(records)) for (route, mode), count in mix.items()]
+
+
+def get_duration(profile, route):
+    """p50 and p99 of the worker duration of `route`, in ms"""
+    routes = profile["routes"]
+    default = routes.get("*", DEFAULT_PROFILE["routes"]["*"]).get(
+        "duration_ms", DEFAULT_PROFILE["routes"]["*"]["duration_ms"]
+    )
+    return routes.get(route, {}).get("duration_ms", default)
+
+
+def lognormal(rng, p50, p99):
+    sigma = max(0.0, math.log(p99 / p50) / Z_99)
+    return rng.lognormvariate(math.log(p50), sigma)
+
+
+class Pool:
+    """Containers of one function: the time each one is busy until (seconds)"""
+
+    def __init__(self, limit, cold_start_ms, idle_seconds):
+        self.busy_until = []
+        self.limit = limit
+        self.cold_start_ms = cold_start_ms
+        self.idle_seconds = idle_seconds
+        self.intervals = []
+
+    def busy(self, t):
+        return sum(1 for until in self.busy_until if until > t)
+
+    def acquire(self, t):
+        """Return the index of a container and its start delay in ms (cold start), at time t"""
+        idle = [
+            (until, i)
+            for i, until in enumerate(self.busy_until)
+            if until <= t and t - until < self.idle_seconds
+        ]
+        if idle:
+            # The most recently used container, like Lambda
+            return max(idle)[1], 0
+        expired = [i for i, until in enumerate(self.busy_until) if until <= t]
+        if expired:
+            return expired[0], self.cold_start_ms
+        self.busy_until.append(t)
+        return len(self.busy_until) - 1, self.cold_start_ms
+
+    def run(self, index, start, seconds):
+        self.busy_until[index] = start + seconds
+        self.intervals.append((start, start + seconds))
+
+
+def peak_concurrency(intervals, since):
+    """Highest number of overlapping executions after `since`"""
+    edges = sorted(
+        [(s, 1) for s, e in intervals if e > since] + [(e, -1) for s, e in intervals if e > since]
+    )
+    peak = current = 0
+    for _, step in edges:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def get_target(route, mode, lane, settings):
+    """Return the function and mode (is_async) of a request, like ImmediateResponse.get_route"""
+    commands = {name.lower(): command for name, command in settings.get("commands", {}).items()}
+    if mode is None and route in commands:
+        return f"Command-{route}", commands[route]["mode"] == "async"
+    is_async = mode == "async"
+    worker = "AsyncWorker" if is_async else "SyncWorker"
+    return (f"{worker}-{lane}" if lane else worker), is_async
+
+
+def simulate_hour(settings, functions, unreserved_limit, profile, rate, args, rng):
+    """Simulate one hour at `rate` requests per second, after a warm-up of the pools"""
+    pools = {
+        name: Pool(
+            f["reserved"] or unreserved_limit,
+            profile["snapstart_restore_ms"] if f["snapstart"] else profile["cold_start_ms"],
+            args.idle_minutes * 60,
+        )
+        for name, f in functions.items()
+    }
+    shared = {name for name, f in functions.items() if f["reserved"] is None}
+
+    def at_limit(name, t):
+        if name not in shared:
+            return pools[name].busy(t) >= pools[name].limit
+        return sum(pools[n].busy(t) for n in shared) >= unreserved_limit
+
+    def next_free(name, t):
+        """When a container of `name` (or of the shared pool) becomes free after t"""
+        names = shared if name in shared else [name]
+        return min(until for n in names for until in pools[n].busy_until if until > t)
+
+    mix = get_traffic_mix(profile, settings)
+    lanes = list(profile["lanes"].items())
+    warmup_seconds = args.warmup_minutes * 60
+
+    stats = Counter()
+    durations = Counter()
+    ack_ms = []
+    event_age_ms = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= warmup_seconds + 3600:
+            break
+        measured = t >= warmup_seconds
+        route, mode, _ = rng.choices(mix, [share for _, _, share in mix])[0]
+        lane = next((lane for lane, share in lanes if rng.random() < share), None)
+        function_name, is_async = get_target(route, mode, lane, settings)
+        stats["requests"] += measured
+
+        # API Gateway invokes ImmediateResponse synchronously
+        ir_start = t + profile["gateway_ms"] / 1000
+        if at_limit("ImmediateResponse", ir_start):
+            stats["throttled"] += measured
+            stats["throttled:ImmediateResponse"] += measured
+            continue
+        ir_index, ir_cold_ms = pools["ImmediateResponse"].acquire(ir_start)
+        ir_ms = ir_cold_ms + lognormal(rng, **profile["immediate_response_ms"])
+        dispatched_at = ir_start + ir_ms / 1000
+
+        start = dispatched_at
+        worker_ms = lognormal(rng, **get_duration(profile, route))
+        if at_limit(function_name, start):
+            if not is_async:
+                stats["throttled"] += measured
+                stats[f"throttled:{function_name}"] += measured
+                worker_ms = None
+            else:
+                # Lambda keeps the event and retries it once a container is free
+                start = next_free(function_name, start)
+                stats[f"queued:{function_name}"] += measured
+        if worker_ms is not None:
+            index, cold_ms = pools[function_name].acquire(start)
+            pools[function_name].run(index, start, (cold_ms + worker_ms) / 1000)
+            if not is_async:
+                # ImmediateResponse waits for the sync worker
+                ir_ms += cold_ms + worker_ms
+            if measured:
+                stats[f"invocations:{function_name}"] += 1
+                stats[f"cold:{function_name}"] += cold_ms > 0
+                durations[function_name] += cold_ms + worker_ms
+                if is_async:
+                    event_age_ms.append((start - dispatched_at) * 1000)
+
+        pools["ImmediateResponse"].run(ir_index, ir_start, ir_ms / 1000)
+        if measured:
+            stats["invocations:ImmediateResponse"] += 1
+            stats["cold:ImmediateResponse"] += ir_cold_ms > 0
+            durations["ImmediateResponse"] += ir_ms
+            ack_ms.append(profile["gateway_ms"] + ir_ms)
+
+    peaks = {name: peak_concurrency(pool.intervals, warmup_seconds) for name, pool in pools.items()}
+    return stats, sorted(ack_ms), sorted(event_age_ms), peaks, durations
+
+
+def monthly_cost(settings, functions, profile, hourly_requests, per_request):
+    """Monthly cost per item, from the requests of an average day and the cost per request"""
+    prices = PRICES | profile["prices"]
+    requests = sum(hourly_requests) * HOURS_PER_MONTH / 24
+    gb_seconds = sum(
+        per_request["ms"][name] / 1000 * functions[name]["memory_mb"] / 1024
+        for name in per_request["ms"]
+    )
+
+    # Keep-warm schedule: one invocation per function and warm-up event
+    warmup = settings.get("warmup", {})
+    warmup_invocations = 0
+    if warmup.get("enabled", False):
+        per_month = HOURS_PER_MONTH * 60 / warmup.get("rate_minutes", 5)
+        warmup_invocations = per_month * warmup.get("concurrency", 1) * len(functions)
+
+    # DynamoDB request units per command
+    writes = reads = 0
+    if settings.get("single_flight", {}).get("enabled", False):
+        writes += 2
+    if settings.get("jobs", {}).get("enabled", False):
+        writes += 3 * per_request["async_share"]
+    if settings.get("adaptive_routing", {}).get("enabled", False):
+        reads += 0.1  # cached per route for cache_seconds
+
+    return {
+        "API Gateway": requests * prices["api_gateway_per_million"] / 1e6,
+        "Lambda requests": (requests * per_request["invocations"] + warmup_invocations)
+        * prices["lambda_requests_per_million"]
+        / 1e6,
+        "Lambda compute": requests * gb_seconds * prices["lambda_gb_second"],
+        "DynamoDB": requests
+        * (
+            writes * prices["dynamodb_write_per_million"]
+            + reads * prices["dynamodb_read_per_million"]
+        )
+        / 1e6,
+    }, requests
+
+
+def plan(settings, profile, args):
+    functions, unreserved_limit = get_functions(settings, args.account_concurrency)
+    rates = [r * args.scale for r in profile["rate_per_second"]]
+    peak_hour = max(range(24), key=lambda h: rates[h])
+    if rates[peak_hour] <= 0:
+        sys.exit("No traffic in the profile")
+
+    trials = []
+    for trial in range(args.trials):
+        rng = random.Random(args.seed + trial)
+        trials.append(
+            simulate_hour(
+                settings, functions, unreserved_limit, profile, rates[peak_hour], args, rng
+            )
+        )
+
+    stats = sum((s for s, *_ in trials), Counter())
+    ack_ms = sorted(v for _, a, *_ in trials for v in a)
+    event_age_ms = sorted(v for _, _, e, *_ in trials for v in e)
+    durations = sum((d for *_, d in trials), Counter())
+    requests = stats["requests"]
+
+    print(
+        f"Peak hour {peak_hour:02d}:00 UTC at {rates[peak_hour]:.2f} requests/s"
+        f" ({args.scale:g}x), {args.trials} trial(s) of {requests // args.trials} requests"
+    )
+    print()
+    print(
+        f"{'Function':<28}{'Memory':>8}{'Limit':>8}{'Peak':>7}{'Cold %':>9}"
+        f"{'Throttled %':>13}{'Queued %':>10}"
+    )
+    for name, function in functions.items():
+        invocations = stats[f"invocations:{name}"]
+        peak = max(peaks[name] for *_, peaks, _ in trials)
+        if not invocations and not peak:
+            continue
+        limit = function["reserved"] or f"{unreserved_limit}*"
+        print(
+            f"{name:<28}{function['memory_mb']:>8}{limit:>8}{peak:>7}"
+            f"{100 * stats[f'cold:{name}'] / max(invocations, 1):>9.2f}"
+            f"{100 * stats[f'throttled:{name}'] / max(requests, 1):>13.3f}"
+            f"{100 * stats[f'queued:{name}'] / max(invocations, 1):>10.2f}"
+        )
+    print("* unreserved functions share the account limit minus the reserved concurrency")
+    print()
+
+    over_budget = sum(1 for v in ack_ms if v > ACK_BUDGET_MS)
+    print(
+        "Ack latency: "
+        + ", ".join(f"p{p} {percentile(ack_ms, p):.0f} ms" for p in [50, 90, 99])
+        + f", over the {ACK_BUDGET_MS} ms budget {100 * over_budget / max(len(ack_ms), 1):.3f} %"
+    )
+    if event_age_ms:
+        print(
+            f"Async event age: p99 {percentile(event_age_ms, 99):.0f} ms,"
+            f" max {event_age_ms[-1]:.0f} ms"
+        )
+    throttled_trials = sum(1 for s, *_ in trials if s["throttled"])
+    print(
+        f"Throttling: {100 * stats['throttled'] / max(requests, 1):.3f} % of the requests,"
+        f" in {throttled_trials} of {args.trials} peak hour(s)"
+    )
+    print()
+
+    per_request = {
+        "ms": {name: durations[name] / max(requests, 1) for name in durations},
+        "invocations": sum(stats[f"invocations:{n}"] for n in functions) / max(requests, 1),
+        "async_share": sum(
+            share
+            for route, mode, share in get_traffic_mix(profile, settings)
+            if get_target(route, mode, None, settings)[1]
+        ),
+    }
+    costs, monthly_requests = monthly_cost(
+        settings, functions, profile, [r * 3600 for r in rates], per_request
+    )
+    print(f"Monthly cost (USD) for {monthly_requests:,.0f} requests:")
+    for item, cost in costs.items():
+        print(f"  {item:<18}{cost:>12.2f}")
+    print(f"  {'Total':<18}{sum(costs.values()):>12.2f}")
+    print("  (CloudWatch Logs, data transfer and the OAuth stack are not included)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--env", default="env_dev.json", help="Settings file, env_<stage>.json")
+    parser.add_argument("--profile", help="Traffic profile (JSON)")
+    parser.add_argument("--captures", nargs="*", help="Capture files (JSON lines, .gz) or dirs")
+    parser.add_argument("--scale", type=float, default=1.0, help="Traffic multiplier")
+    parser.add_argument("--account-concurrency", type=int, default=1000, help="Account limit")
+    parser.add_argument("--idle-minutes", type=float, default=10, help="Idle container lifetime")
+    parser.add_argument("--warmup-minutes", type=float, default=15, help="Warm-up before the hour")
+    parser.add_argument("--trials", type=int, default=3, help="Simulated peak hours")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.env, encoding="utf-8") as f:
+        settings = json.load(f)
+    profile = load_profile(args.profile)
+    if args.captures:
+        records = load_records(args.captures)
+        if not records:
+            sys.exit("No captured requests found")
+        apply_captures(profile, records, settings.get("capture", {}).get("sample_rate", 1.0))
+    plan(settings, profile, args)
+
+
+if __name__ == "__main__":
+    main()
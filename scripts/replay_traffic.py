@@ -0,0 +1,215 @@
+"""
+Replay slash command traffic captured by ImmediateResponse (see lambda/capture.py) against the
+handlers locally, and report the ack and end-to-end latency distributions.
+
+The handlers run in this process: the Lambda API is replaced by in-process calls to SyncWorker and
+AsyncWorker (on a thread pool), and the AsyncWorker post to the response_url is recorded instead of
+sent. Authentication is skipped (AWS_SAM_LOCAL) and the app/team/channel settings are taken from the
+captured records, so no AWS credentials are needed.
+
+- ack: from the request being sent to ImmediateResponse returning its response.
+- end-to-end: until the result is posted to the response_url (async), or the ack otherwise.
+
+Usage:
+    aws s3 sync s3://<capture bucket>/ capture/
+    python scripts/replay_traffic.py capture/                    # at the original rate
+    python scripts/replay_traffic.py capture/ --speed 10         # 10 times faster
+    python scripts/replay_traffic.py capture/ --copies 5         # 5 requests for each captured one
+"""
+import argparse
+import gzip
+import io
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda")
+PERCENTILES = [50, 90, 99]
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [line for line in f if line.strip()]
+
+
+def load_records(paths):
+    """Load the captured records of the given files and directories, oldest first"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    records = []
+    for file in files:
+        records.extend(json.loads(line) for line in read_lines(file))
+    return sorted(records, key=lambda r: r["received_at"])
+
+
+def configure_environment(records):
+    """Set the environment of ImmediateResponse so that the captured requests are accepted"""
+    apps = {}
+    for record in records:
+        params = record["params"]
+        app = apps.setdefault(
+            params["api_app_id"][0],
+            {
+                "command": params["command"][0],
+                "team_ids": [],
+                "team_domains": [],
+                "channel_ids": [],
+            },
+        )
+        for field, key in [
+            ("team_ids", "team_id"),
+            ("team_domains", "team_domain"),
+            ("channel_ids", "channel_id"),
+        ]:
+            if params[key][0] not in app[field]:
+                app[field].append(params[key][0])
+
+    os.environ.setdefault("AWS_REGION", "ap-southeast-2")
+    os.environ["AWS_SAM_LOCAL"] = "true"
+    os.environ["SlackApps"] = json.dumps(apps)
+
+
+class LocalLambdaClient:
+    """Stand-in for the Lambda client of ImmediateResponse, running the workers in this process"""
+
+    def __init__(self, async_worker, sync_worker, executor):
+        self.async_worker = async_worker
+        self.sync_worker = sync_worker
+        self.executor = executor
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        payload = json.loads(Payload)
+        if InvocationType == "Event":
+            self.executor.submit(self.async_worker.lambda_handler, payload, None)
+            return {"ResponseMetadata": {"HTTPStatusCode": 202}}
+
+        result = self.sync_worker.lambda_handler(payload, None)
+        return {
+            "Payload": io.BytesIO(json.dumps(result).encode("utf-8")),
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+
+
+class ResponseUrlRecorder:
+    """Stand-in for the urllib3 pool of AsyncWorker, recording when each response_url is posted"""
+
+    class Response:
+        status = 200
+
+        def read(self):
+            return b"ok"
+
+    def __init__(self):
+        self.posted_at = {}
+
+    def request(self, method, url, **kwargs):
+        self.posted_at[url] = time.perf_counter()
+        return self.Response()
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values"""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(name, seconds):
+    values = sorted(v * 1000 for v in seconds)
+    if not values:
+        return f"{name:<12} no requests"
+    columns = [f"p{p} {percentile(values, p):8.2f}" for p in PERCENTILES]
+    columns.append(f"max {values[-1]:8.2f}")
+    columns.append(f"mean {sum(values) / len(values):8.2f}")
+    return f"{name:<12} " + "  ".join(columns) + " (ms)"
+
+
+def replay(records, speed, copies, concurrency):
+    sys.path.insert(0, LAMBDA_DIR)
+    configure_environment(records)
+
+    import AsyncWorker
+    import ImmediateResponse
+    import SyncWorker
+
+    # The handlers log every request at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    worker_executor = ThreadPoolExecutor(max_workers=concurrency)
+    request_executor = ThreadPoolExecutor(max_workers=concurrency)
+    recorder = ResponseUrlRecorder()
+    AsyncWorker.http = recorder
+    ImmediateResponse.lambda_client = LocalLambdaClient(AsyncWorker, SyncWorker, worker_executor)
+    # The sync invokes get their client from the factory
+    ImmediateResponse.aws_clients.stub("lambda", ImmediateResponse.lambda_client)
+
+    sent_at, acked_at, lag = {}, {}, []
+    lock = threading.Lock()
+
+    def send(response_url, params, scheduled_at):
+        body = urlencode({**params, "token": ["replay"], "response_url": [response_url]}, True)
+        start = time.perf_counter()
+        ImmediateResponse.lambda_handler(
+            {"body": body, "headers": {"Content-Type": "application/x-www-form-urlencoded"}}, None
+        )
+        end = time.perf_counter()
+        with lock:
+            sent_at[response_url] = start
+            acked_at[response_url] = end
+            lag.append(start - scheduled_at)
+
+    first = records[0]["received_at"]
+    replay_start = time.perf_counter()
+    for i, record in enumerate(records):
+        scheduled_at = replay_start + (record["received_at"] - first) / speed
+        delay = scheduled_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        for copy in range(copies):
+            response_url = f"https://replay.invalid/{i}/{copy}"
+            request_executor.submit(send, response_url, record["params"], scheduled_at)
+
+    request_executor.shutdown(wait=True)
+    worker_executor.shutdown(wait=True)
+    duration = time.perf_counter() - replay_start
+
+    ack = [acked_at[url] - sent_at[url] for url in sent_at]
+    end_to_end = [recorder.posted_at.get(url, acked_at[url]) - sent_at[url] for url in sent_at]
+
+    captured_duration = records[-1]["received_at"] - first
+    print(
+        f"Replayed {len(sent_at)} requests ({len(records)} captured over {captured_duration:.1f} s)"
+        f" in {duration:.1f} s at {speed:g}x speed, {len(recorder.posted_at)} async"
+    )
+    print(summarize("ack", ack))
+    print(summarize("end-to-end", end_to_end))
+    print(summarize("send lag", lag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("paths", nargs="+", help="Capture files (JSON lines, .gz) or directories")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay rate multiplier")
+    parser.add_argument("--copies", type=int, default=1, help="Requests sent per captured request")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max requests in flight")
+    args = parser.parse_args()
+
+    records = load_records(args.paths)
+    if not records:
+        sys.exit("No captured requests found")
+    replay(records, args.speed, args.copies, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
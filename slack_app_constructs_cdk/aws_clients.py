@@ -0,0 +1,16 @@
+import json
+
+
+def aws_clients_environment(settings) -> dict[str, str]:
+    """Overrides of the botocore profiles of the functions (see lambda/aws_clients.py).
+
+    Settings (env_<stage>.json), per profile ("default", "best_effort" or a service), e.g.
+        "aws_clients": {"ssm": {"read_timeout": 2}, "lambda": {"retry_mode": "adaptive"}}
+    with connect_timeout, read_timeout, retry_mode, total_max_attempts, tcp_keepalive and
+    max_pool_connections.
+    """
+    aws_clients = settings.get("aws_clients", {})
+    if not aws_clients:
+        return {}
+
+    return {"AwsClientProfiles": json.dumps(aws_clients, separators=(",", ":"))}
@@ -0,0 +1,84 @@
+from aws_cdk import Duration
+from aws_cdk import aws_cloudwatch as cloudwatch_
+from aws_cdk import aws_codedeploy as codedeploy_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+CANARY_ALIAS_NAME = "live"
+
+
+def add_canary_deployment(
+    scope: Construct, id: str, function: lambda_.Function, settings
+) -> lambda_.IFunction:
+    """Shift traffic to each new version of `function` through an alias with CodeDeploy.
+
+    The rollout stops and rolls back when the p99 duration or the error rate of the alias breaches
+    its threshold. Returns the alias for the callers to invoke, or the function itself when canary
+    deployments are disabled.
+
+    Settings (env_<stage>.json), disabled by default:
+        "canary": {
+            "enabled": true, "deployment_config": "CANARY_10_PERCENT_5_MINUTES",
+            "p99_duration_ms": 2000, "error_rate_percent": 1
+        }
+    """
+    canary = settings.get("canary", {})
+    if canary.get("enabled", False) is False:
+        return function
+
+    alias = lambda_.Alias(
+        scope,
+        f"{id}-Alias",
+        alias_name=CANARY_ALIAS_NAME,
+        version=function.current_version,
+    )
+
+    p99_duration_alarm = cloudwatch_.Alarm(
+        scope,
+        f"{id}-P99Duration-Alarm",
+        alarm_description=f"p99 duration of {id} is close to Slack's 3 second limit",
+        alarm_name=f"{id}-P99Duration",
+        comparison_operator=cloudwatch_.ComparisonOperator.GREATER_THAN_THRESHOLD,
+        datapoints_to_alarm=2,
+        evaluation_periods=3,
+        metric=alias.metric_duration(period=Duration.minutes(1), statistic="p99"),
+        threshold=canary.get("p99_duration_ms", 2000),
+        treat_missing_data=cloudwatch_.TreatMissingData.NOT_BREACHING,
+    )
+
+    error_rate_alarm = cloudwatch_.Alarm(
+        scope,
+        f"{id}-ErrorRate-Alarm",
+        alarm_description=f"Error rate of {id} in percent",
+        alarm_name=f"{id}-ErrorRate",
+        comparison_operator=cloudwatch_.ComparisonOperator.GREATER_THAN_THRESHOLD,
+        datapoints_to_alarm=2,
+        evaluation_periods=3,
+        metric=cloudwatch_.MathExpression(
+            expression="100 * errors / MAX([invocations, 1])",
+            period=Duration.minutes(1),
+            using_metrics={
+                "errors": alias.metric_errors(statistic="Sum"),
+                "invocations": alias.metric_invocations(statistic="Sum"),
+            },
+        ),
+        threshold=canary.get("error_rate_percent", 1),
+        treat_missing_data=cloudwatch_.TreatMissingData.NOT_BREACHING,
+    )
+
+    codedeploy_.LambdaDeploymentGroup(
+        scope,
+        f"{id}-DeploymentGroup",
+        alarms=[p99_duration_alarm, error_rate_alarm],
+        alias=alias,
+        auto_rollback=codedeploy_.AutoRollbackConfig(
+            deployment_in_alarm=True,
+            failed_deployment=True,
+        ),
+        deployment_config=getattr(
+            codedeploy_.LambdaDeploymentConfig,
+            canary.get("deployment_config", "CANARY_10_PERCENT_5_MINUTES"),
+        ),
+    )
+
+    return alias
@@ -0,0 +1,42 @@
+from aws_cdk import Duration
+from aws_cdk import aws_events as events_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+COMMAND_EVENT_SOURCE = "slack-command-app"  # see lambda/command_events.py
+
+
+def add_command_event_bus(
+    scope: Construct,
+    id: str,
+    publishers: list[lambda_.Function],
+    settings,
+) -> events_.EventBus:
+    """EventBridge bus for the lifecycle events of the commands (see lambda/command_events.py).
+
+    The `publishers` (ImmediateResponse and the async workers) put compact received, authorized,
+    dispatched, completed and failed events on the bus; audit and analytics consumers are rules
+    added to it. With `archive_days`, the events are kept in an archive, to be replayed to new
+    consumers. Returns the bus, or None when command events are disabled.
+
+    Settings (env_<stage>.json), disabled by default:
+        "command_events": {"enabled": true, "archive_days": 90}
+    """
+    command_events = settings.get("command_events", {})
+    if command_events.get("enabled", False) is False:
+        return None
+
+    bus = events_.EventBus(scope, f"{id}-CommandEvents-Bus", event_bus_name=f"{id}-CommandEvents")
+    if command_events.get("archive_days"):
+        bus.archive(
+            f"{id}-CommandEvents-Archive",
+            archive_name=f"{id}-CommandEvents",
+            event_pattern=events_.EventPattern(source=[COMMAND_EVENT_SOURCE]),
+            retention=Duration.days(command_events["archive_days"]),
+        )
+
+    for function in publishers:
+        bus.grant_put_events_to(function)
+        function.add_environment("CommandEventBus", bus.event_bus_name)
+        function.add_environment("CommandEventSource", COMMAND_EVENT_SOURCE)
+    return bus
@@ -0,0 +1,80 @@
+from aws_cdk import RemovalPolicy, Stack
+from aws_cdk import aws_dynamodb as ddb_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+JOBS_REQUESTER_INDEX_NAME = "requester-index"  # see lambda/jobs.py
+JOBS_WORDS = ["jobs", "status"]
+
+
+def is_jobs_enabled(settings) -> bool:
+    return settings.get("jobs", {}).get("enabled", False) is True
+
+
+def add_jobs_table(
+    scope: Construct,
+    id: str,
+    dispatcher: lambda_.Function,
+    workers: list[lambda_.Function],
+    settings,
+) -> None:
+    """Job tracking table of the async commands (see lambda/jobs.py).
+
+    `dispatcher` writes a job for each async dispatch and answers the `jobs` and `status <job ID>`
+    subcommands from the table, the async `workers` update the state of their jobs.
+
+    With more than one region, the stack in the primary region creates a global table replicated
+    to the others, and the other stacks use their replica: a user sees the same jobs whichever
+    region Slack reaches.
+
+    Settings (env_<stage>.json), disabled by default:
+        "jobs": {"enabled": true, "cache_seconds": 5, "retention_days": 7}
+    """
+    if not is_jobs_enabled(settings):
+        return
+    jobs = settings["jobs"]
+
+    region = Stack.of(scope).region
+    # Named after the stack in the primary region (see app.py)
+    table_name = f"{id.removesuffix(f'-{region}')}-Jobs"
+    if region == settings["region"]:
+        replica_regions = [r for r in settings.get("regions", []) if r != region]
+        # Jobs are removed by DynamoDB TTL after the retention period
+        table = ddb_.Table(
+            scope,
+            f"{id}-Jobs",
+            billing_mode=ddb_.BillingMode.PAY_PER_REQUEST,
+            partition_key=ddb_.Attribute(name="job_id", type=ddb_.AttributeType.STRING),
+            removal_policy=RemovalPolicy.DESTROY,
+            replication_regions=replica_regions or None,
+            table_name=table_name,
+            time_to_live_attribute="expires_at",
+        )
+        # For listing the last jobs of a user
+        table.add_global_secondary_index(
+            index_name=JOBS_REQUESTER_INDEX_NAME,
+            partition_key=ddb_.Attribute(name="requester", type=ddb_.AttributeType.STRING),
+            sort_key=ddb_.Attribute(name="created_at", type=ddb_.AttributeType.NUMBER),
+        )
+    else:
+        table = ddb_.Table.from_table_attributes(
+            scope,
+            f"{id}-Jobs",
+            global_indexes=[JOBS_REQUESTER_INDEX_NAME],
+            table_name=table_name,
+        )
+
+    table.grant(
+        dispatcher,
+        "dynamodb:GetItem",
+        "dynamodb:PutItem",
+        "dynamodb:Query",
+        "dynamodb:UpdateItem",
+    )
+    dispatcher.add_environment("JobsTable", table.table_name)
+    dispatcher.add_environment("JobsCacheSeconds", str(jobs.get("cache_seconds", 5)))
+    dispatcher.add_environment("JobsRetentionDays", str(jobs.get("retention_days", 7)))
+
+    for worker in workers:
+        table.grant(worker, "dynamodb:UpdateItem")
+        worker.add_environment("JobsTable", table.table_name)
@@ -0,0 +1,254 @@
+"""
+Per-function bundling of the lambda/ directory.
+
+Each function gets its own handler module plus the local modules it imports (transitively). Local
+modules imported by more than one handler go into a shared Lambda layer instead. Bundles are built
+in-process at synth time (no Docker needed), with `.pyc` files compiled ahead of time, and a size and
+import time report is printed for each bundle.
+"""
+import ast
+import os
+import py_compile
+import re
+import shutil
+import subprocess
+import sys
+from functools import cache
+from importlib.util import cache_from_source
+
+import jsii
+from aws_cdk import AssetHashType, BundlingOptions, ILocalBundling
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+LAMBDA_DIR = "lambda"
+LAMBDA_RUNTIME = lambda_.Runtime.PYTHON_3_14
+LAYER_SUB_DIR = "python"  # Lambda adds /opt/python to sys.path
+
+
+@cache
+def local_modules() -> frozenset[str]:
+    """Names of the importable modules in LAMBDA_DIR (tests excluded)"""
+    return frozenset(
+        f[:-3] for f in os.listdir(LAMBDA_DIR) if f.endswith(".py") and not f.endswith(".test.py")
+    )
+
+
+@cache
+def direct_imports(module_name: str) -> frozenset[str]:
+    with open(os.path.join(LAMBDA_DIR, f"{module_name}.py")) as f:
+        tree = ast.parse(f.read())
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return frozenset(names & local_modules())
+
+
+@cache
+def required_environment(module_name: str) -> frozenset[str]:
+    """Environment variables the module reads without a default, e.g. os.environ.get("JobsTable")"""
+    with open(os.path.join(LAMBDA_DIR, f"{module_name}.py")) as f:
+        tree = ast.parse(f.read())
+
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript):
+            target, key = node.value, node.slice
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr != "get" or len(node.args) != 1 or node.keywords:
+                continue
+            target, key = node.func.value, node.args[0]
+        else:
+            continue
+        if (
+            isinstance(target, ast.Attribute)
+            and target.attr == "environ"
+            and isinstance(key, ast.Constant)
+            and isinstance(key.value, str)
+            and not key.value.startswith("AWS_")
+        ):
+            names.add(key.value)
+    return frozenset(names)
+
+
+def dependencies(module_name: str) -> set[str]:
+    """The local modules imported by `module_name`, directly or transitively"""
+    found, todo = set(), [module_name]
+    while todo:
+        for name in direct_imports(todo.pop()):
+            if name not in found and name != module_name:
+                found.add(name)
+                todo.append(name)
+    return found
+
+
+@cache
+def handler_modules() -> frozenset[str]:
+    """Modules in LAMBDA_DIR defining a top level `lambda_handler`"""
+    ret = set()
+    for name in local_modules():
+        with open(os.path.join(LAMBDA_DIR, f"{name}.py")) as f:
+            tree = ast.parse(f.read())
+        if any(isinstance(n, ast.FunctionDef) and n.name == "lambda_handler" for n in tree.body):
+            ret.add(name)
+    return frozenset(ret)
+
+
+def shared_modules() -> set[str]:
+    """Local modules used by more than one handler"""
+    seen, shared = set(), set()
+    for handler in handler_modules():
+        deps = dependencies(handler)
+        shared |= seen & deps
+        seen |= deps
+    return shared
+
+
+def function_modules(function_name: str) -> list[str]:
+    return sorted({function_name} | (dependencies(function_name) - shared_modules()))
+
+
+def layer_modules(function_names: list[str]) -> list[str]:
+    shared = shared_modules()
+    return sorted(set().union(*(dependencies(name) & shared for name in function_names)))
+
+
+@jsii.implements(ILocalBundling)
+class LocalModuleBundler:
+    """Copy the given modules into the asset output directory and precompile them.
+
+    The `.pyc` files use unchecked hash invalidation so the runtime imports them without checking the
+    source. They are only written when the synth interpreter matches the Lambda runtime, otherwise
+    the runtime would ignore them anyway.
+    """
+
+    def __init__(self, name: str, modules: list[str], sub_dir: str = ""):
+        self.name = name
+        self.modules = modules
+        self.sub_dir = sub_dir
+
+    def try_bundle(self, output_dir: str, *args, **kwargs) -> bool:
+        target_dir = os.path.join(output_dir, self.sub_dir)
+        os.makedirs(target_dir, exist_ok=True)
+
+        compile_pyc = sys.implementation.cache_tag == runtime_cache_tag()
+        for module in self.modules:
+            target = shutil.copyfile(
+                os.path.join(LAMBDA_DIR, f"{module}.py"), os.path.join(target_dir, f"{module}.py")
+            )
+            if compile_pyc:
+                py_compile.compile(
+                    target,
+                    cfile=cache_from_source(target),
+                    dfile=f"{module}.py",
+                    doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+                )
+
+        report_bundle(self.name, self.modules, output_dir, target_dir, compile_pyc)
+        return True
+
+
+def runtime_cache_tag() -> str:
+    """E.g. "cpython-314" for python3.14"""
+    return "cpython-" + LAMBDA_RUNTIME.name.removeprefix("python").replace(".", "")
+
+
+def bundling_options(name: str, modules: list[str], sub_dir: str = "") -> BundlingOptions:
+    # Docker is only used if local bundling is not possible
+    target_dir = f"/asset-output/{sub_dir}".rstrip("/")
+    sources = " ".join(f"{m}.py" for m in modules)
+    return BundlingOptions(
+        image=LAMBDA_RUNTIME.bundling_image,
+        command=[
+            "bash",
+            "-c",
+            f"mkdir -p {target_dir} && cp {sources} {target_dir}"
+            + f" && python -m compileall -q --invalidation-mode unchecked-hash {target_dir}",
+        ],
+        local=LocalModuleBundler(name, modules, sub_dir),
+    )
+
+
+def function_code(function_name: str) -> lambda_.Code:
+    """Code asset with only the handler module and its non-shared dependencies"""
+    return lambda_.Code.from_asset(
+        LAMBDA_DIR,
+        asset_hash_type=AssetHashType.OUTPUT,
+        bundling=bundling_options(function_name, function_modules(function_name)),
+    )
+
+
+def create_shared_layer(scope: Construct, id: str, function_names: list[str]):
+    """Layer with the shared modules needed by `function_names`, or None if there are none"""
+    modules = layer_modules(function_names)
+    if not modules:
+        return None
+
+    return lambda_.LayerVersion(
+        scope,
+        f"{id}-SharedLayer",
+        code=lambda_.Code.from_asset(
+            LAMBDA_DIR,
+            asset_hash_type=AssetHashType.OUTPUT,
+            bundling=bundling_options(f"{id}-SharedLayer", modules, LAYER_SUB_DIR),
+        ),
+        compatible_runtimes=[LAMBDA_RUNTIME],
+        description=f"Shared modules: {', '.join(modules)}",
+    )
+
+
+def measure_import_time(module: str, path: list[str]) -> str:
+    """Cumulative import time of `module` in a fresh interpreter.
+
+    The interpreter gets none of the synth environment: no AWS credentials or profile, so an import
+    cannot make AWS calls, a fake region, and dummy values for the environment variables the
+    function reads without a default (e.g. a table name), which the stacks set.
+    """
+    required = set().union(*(required_environment(m) for m in {module} | dependencies(module)))
+    env = {name: "dummy" for name in required} | {
+        k: os.environ[k] for k in ["PATH", "SYSTEMROOT"] if k in os.environ
+    }
+    env |= dict(
+        AWS_CONFIG_FILE=os.devnull,
+        AWS_EC2_METADATA_DISABLED="true",
+        AWS_REGION="us-east-1",
+        AWS_SAM_LOCAL="true",
+        AWS_SHARED_CREDENTIALS_FILE=os.devnull,
+        PYTHONDONTWRITEBYTECODE="1",
+        PYTHONPATH=os.pathsep.join(path),
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        env=env,
+        text=True,
+        timeout=60,
+    )
+    if proc.returncode != 0:
+        # E.g. a module reading its configuration from environment variables at import time
+        return f"n/a ({proc.stderr.strip().splitlines()[-1]})"
+
+    # Lines look like "import time:       123 |       4567 | ImmediateResponse"
+    match = re.search(rf"^import time:\s+\d+ \|\s+(\d+) \| {module}$", proc.stderr, re.MULTILINE)
+    return f"{int(match.group(1)) / 1000:.1f} ms" if match else "n/a"
+
+
+def report_bundle(name, modules, output_dir, target_dir, compiled):
+    size = sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(output_dir)
+        for f in files
+    )
+    handlers = [m for m in modules if m in handler_modules()]
+    import_times = [f"{m} {measure_import_time(m, [target_dir, LAMBDA_DIR])}" for m in handlers]
+    pyc = "compiled" if compiled else f"skipped (synth Python is not {LAMBDA_RUNTIME.name})"
+    print(
+        f"[bundle] {name}: {len(modules)} module(s), {size / 1024:.1f} KiB, pyc {pyc}"
+        + (f", import {', '.join(import_times)}" if import_times else ""),
+        file=sys.stderr,
+    )
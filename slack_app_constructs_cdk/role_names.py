@@ -0,0 +1,18 @@
+import hashlib
+
+IAM_ROLE_NAME_MAX_LENGTH = 64
+
+
+def execution_role_name(function_name: str) -> str:
+    """IAM role name of the function: "<function name>-ExecutionRole" when it fits, else its start
+    and a hash of the whole.
+
+    The stacks of secondary regions have the region in their id, which makes e.g.
+    "K-CDK-SlackCommandApp-ap-southeast-2-ImmediateResponse-ExecutionRole" (68 characters) too long
+    for IAM; synth passes, but the deployment fails.
+    """
+    name = f"{function_name}-ExecutionRole"
+    if len(name) <= IAM_ROLE_NAME_MAX_LENGTH:
+        return name
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:IAM_ROLE_NAME_MAX_LENGTH - len(digest) - 1]}-{digest}"
@@ -0,0 +1,62 @@
+"""
+Unit tests for role_names.py, run from the repository root
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.getcwd())
+
+from aws_cdk import App, Environment  # noqa: E402
+from aws_cdk.assertions import Template  # noqa: E402
+
+from slack_app_constructs_cdk.role_names import (  # noqa: E402
+    IAM_ROLE_NAME_MAX_LENGTH,
+    execution_role_name,
+)
+from slack_app_constructs_cdk.slack_app_constructs_stack import (  # noqa: E402
+    SlackAppConstructsStack,
+)
+
+
+class TestFunction(unittest.TestCase):
+    def test_short_name_kept(self):
+        self.assertEqual(
+            execution_role_name("K-CDK-SlackCommandApp-ImmediateResponse"),
+            "K-CDK-SlackCommandApp-ImmediateResponse-ExecutionRole",
+        )
+
+    def test_long_name_hashed(self):
+        name = execution_role_name("K-CDK-SlackCommandApp-ap-southeast-2-ImmediateResponse")
+        other = execution_role_name("K-CDK-SlackCommandApp-ap-northeast-3-ImmediateResponse")
+
+        self.assertEqual(len(name), IAM_ROLE_NAME_MAX_LENGTH)
+        self.assertTrue(name.startswith("K-CDK-SlackCommandApp-ap-southeast-2-"))
+        self.assertNotEqual(name, other)
+
+    def test_synth_secondary_region(self):
+        with open("env_dev.json") as json_file:
+            settings = json.load(json_file)
+        settings |= {"region": "us-east-1", "regions": ["us-east-1", "ap-southeast-2"]}
+
+        stack = SlackAppConstructsStack(
+            App(),
+            id=f"{settings['name']}-SlackCommandApp-ap-southeast-2",
+            settings=settings,
+            env=Environment(account=settings["account"], region="ap-southeast-2"),
+        )
+
+        roles = Template.from_stack(stack).find_resources("AWS::IAM::Role")
+        role_names = [
+            r["Properties"]["RoleName"]
+            for r in roles.values()
+            if "RoleName" in r.get("Properties", {})
+        ]
+        self.assertTrue(role_names)
+        for role_name in role_names:
+            self.assertLessEqual(len(role_name), IAM_ROLE_NAME_MAX_LENGTH, role_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
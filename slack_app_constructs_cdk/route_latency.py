@@ -0,0 +1,51 @@
+from aws_cdk import RemovalPolicy
+from aws_cdk import aws_dynamodb as ddb_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+
+def add_route_latency_table(
+    scope: Construct,
+    id: str,
+    dispatcher: lambda_.Function,
+    workers: list[lambda_.Function],
+    settings,
+) -> None:
+    """Latency estimates per route, for picking the sync or async worker (see lambda/route_latency.py).
+
+    `dispatcher` reads the estimates and updates them for the sync invocations, the async `workers`
+    update them with their own duration.
+
+    Each region has its own table, unlike the jobs: the latency of a route is that of the workers in
+    the same region, which the region's ImmediateResponse invokes.
+
+    Settings (env_<stage>.json), disabled by default:
+        "adaptive_routing": {"enabled": true, "alpha": 0.2, "cache_seconds": 60, "margin_ms": 500}
+    """
+    adaptive_routing = settings.get("adaptive_routing", {})
+    if adaptive_routing.get("enabled", False) is False:
+        return
+
+    # Routes not seen for a while are removed by DynamoDB TTL
+    table = ddb_.Table(
+        scope,
+        f"{id}-RouteLatency",
+        billing_mode=ddb_.BillingMode.PAY_PER_REQUEST,
+        partition_key=ddb_.Attribute(name="route", type=ddb_.AttributeType.STRING),
+        removal_policy=RemovalPolicy.DESTROY,
+        table_name=f"{id}-RouteLatency",
+        time_to_live_attribute="expires_at",
+    )
+
+    environment = {
+        "RouteLatencyTable": table.table_name,
+        "RouteLatencyAlpha": str(adaptive_routing.get("alpha", 0.2)),
+        "RouteLatencyCacheSeconds": str(adaptive_routing.get("cache_seconds", 60)),
+    }
+    for function in [dispatcher] + workers:
+        table.grant(function, "dynamodb:GetItem", "dynamodb:PutItem")
+        for key, value in environment.items():
+            function.add_environment(key, value)
+    dispatcher.add_environment(
+        "AdaptiveRoutingMarginMs", str(adaptive_routing.get("margin_ms", 500))
+    )
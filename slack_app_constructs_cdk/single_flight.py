@@ -0,0 +1,50 @@
+from aws_cdk import RemovalPolicy
+from aws_cdk import aws_dynamodb as ddb_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+
+def add_single_flight_table(
+    scope: Construct,
+    id: str,
+    dispatcher: lambda_.Function,
+    workers: list[lambda_.Function],
+    settings,
+) -> None:
+    """Lease table for coalescing identical concurrent commands (see lambda/single_flight.py).
+
+    `dispatcher` takes and joins the leases, the async `workers` complete them and post their result
+    to the followers.
+
+    Each region has its own table, unlike the jobs: Slack sends the identical commands of a team to
+    the nearest region, so they meet there, and a lease is too short-lived to wait for a global
+    table to replicate it.
+
+    Settings (env_<stage>.json), disabled by default:
+        "single_flight": {"enabled": true, "lease_seconds": 60, "wait_ms": 2000}
+    """
+    single_flight = settings.get("single_flight", {})
+    if single_flight.get("enabled", False) is False:
+        return
+
+    # Expired leases are removed by DynamoDB TTL; until then they can be taken over
+    table = ddb_.Table(
+        scope,
+        f"{id}-SingleFlight",
+        billing_mode=ddb_.BillingMode.PAY_PER_REQUEST,
+        partition_key=ddb_.Attribute(name="flight_key", type=ddb_.AttributeType.STRING),
+        removal_policy=RemovalPolicy.DESTROY,
+        table_name=f"{id}-SingleFlight",
+        time_to_live_attribute="expires_at",
+    )
+
+    table.grant(dispatcher, "dynamodb:GetItem", "dynamodb:PutItem", "dynamodb:UpdateItem")
+    dispatcher.add_environment("SingleFlightTable", table.table_name)
+    dispatcher.add_environment(
+        "SingleFlightLeaseSeconds", str(single_flight.get("lease_seconds", 60))
+    )
+    dispatcher.add_environment("SingleFlightWaitMs", str(single_flight.get("wait_ms", 2000)))
+
+    for worker in workers:
+        table.grant(worker, "dynamodb:UpdateItem")
+        worker.add_environment("SingleFlightTable", table.table_name)
@@ -1,33 +1,131 @@
+import json
+
 from aws_cdk import CfnParameter, Duration, RemovalPolicy, Stack
 from aws_cdk import aws_apigateway as apigw_
+from aws_cdk import aws_certificatemanager as acm_
 from aws_cdk import aws_iam as iam_
 from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_route53 as route53_
+from aws_cdk import aws_route53_targets as route53_targets_
+from aws_cdk import aws_sqs as sqs_
 from aws_cdk.aws_logs import LogGroup, RetentionDays
 from constructs import Construct
 
-LAMBDA_DIR = "lambda"
+from slack_app_constructs_cdk.aws_clients import aws_clients_environment
+from slack_app_constructs_cdk.canary_deployment import add_canary_deployment
+from slack_app_constructs_cdk.command_events import add_command_event_bus
+from slack_app_constructs_cdk.jobs import JOBS_WORDS, add_jobs_table, is_jobs_enabled
+from slack_app_constructs_cdk.lambda_bundling import (
+    create_shared_layer,
+    function_code,
+    handler_modules,
+)
+from slack_app_constructs_cdk.tracing_settings import (
+    is_xray_enabled,
+    lambda_tracing,
+    tracing_environment,
+)
+from slack_app_constructs_cdk.route_latency import add_route_latency_table
+from slack_app_constructs_cdk.role_names import execution_role_name
+from slack_app_constructs_cdk.single_flight import add_single_flight_table
+from slack_app_constructs_cdk.slack_apps import get_parameter_keys, render_slack_apps
+from slack_app_constructs_cdk.snapstart import (
+    add_snapstart_alias,
+    invoked_function_name,
+    lambda_snap_start,
+)
+from slack_app_constructs_cdk.slo_monitoring import add_slo_monitoring
+from slack_app_constructs_cdk.traffic_capture import add_traffic_capture
+from slack_app_constructs_cdk.warmup_schedule import add_warmup_schedule
 
+# First words of the command text which ImmediateResponse does not route to a command
+RESERVED_WORDS = ["async", "ping", "sync"]
+# How the workers reply: AsyncWorker posts to the response_url, SyncWorker returns the body
+WORKER_MODES = {"AsyncWorker": "async", "SyncWorker": "sync"}
+# Slack's limit for the response, which a sync worker has to fit in
+SYNC_TIMEOUT_SECONDS = 3
 
-def get_channel_ids(settings):
-    ret = []
-    for v in settings["access"].values():
-        if v.get("channels"):
-            ret.extend(v["channels"].keys())
-    return ret
+
+def get_commands(settings):
+    """Return the commands having their own worker function, checked.
+
+    Settings (env_<stage>.json):
+        "commands": {
+            "<command>": {
+                "handler": "AsyncWorker", "mode": "async", "memory_mb": 1024, "timeout_seconds": 300,
+                "reserved_concurrency": 5
+            }
+        }
+    """
+    reserved_words = RESERVED_WORDS + (JOBS_WORDS if is_jobs_enabled(settings) else [])
+    commands = {}
+    for name, command in settings.get("commands", {}).items():
+        if name.lower() in reserved_words:
+            raise ValueError(f"commands.{name} is a reserved word: {', '.join(reserved_words)}")
+        if command.get("handler") not in handler_modules():
+            raise ValueError(f"commands.{name}.handler must be a handler module in lambda/")
+        if command.get("mode") not in ["async", "sync"]:
+            raise ValueError(f"commands.{name}.mode must be async or sync")
+        if WORKER_MODES.get(command["handler"], command["mode"]) != command["mode"]:
+            raise ValueError(
+                f"commands.{name}.mode must be {WORKER_MODES[command['handler']]} for the"
+                + f" {command['handler']} handler"
+            )
+        if command["mode"] == "sync" and command.get("timeout_seconds", 0) > SYNC_TIMEOUT_SECONDS:
+            raise ValueError(
+                f"commands.{name}.timeout_seconds must be at most {SYNC_TIMEOUT_SECONDS} in sync mode"
+            )
+        commands[name.lower()] = command
+    return commands
 
 
-def get_team_domains(settings):
-    return list(settings["access"].keys())
+def get_command_routes(id, settings):
+    """Map each command with its own function to the function name and invocation mode, and the
+    timeout of the sync ones (how long ImmediateResponse waits for them)"""
+    routes = {}
+    for name, command in get_commands(settings).items():
+        routes[name] = {
+            "function": invoked_function_name(id, f"Command-{name}", settings),
+            "async": command["mode"] == "async",
+        }
+        if command["mode"] == "sync" and command.get("timeout_seconds"):
+            routes[name]["timeout_seconds"] = command["timeout_seconds"]
+    return routes
 
 
-def get_team_ids(settings):
-    return [v["team_id"] for v in settings["access"].values() if v.get("team_id")]
+def get_worker_lane_routes(id, settings):
+    """Map each team ID with a dedicated worker lane to the function names of that lane.
+
+    Settings (env_<stage>.json):
+        "worker_lanes": {"<lane>": {"team_ids": ["T1111111111"], "reserved_concurrency": 5}}
+    """
+    ret = {}
+    for lane, lane_settings in settings.get("worker_lanes", {}).items():
+        for team_id in lane_settings["team_ids"]:
+            ret[team_id] = {
+                "async": invoked_function_name(id, f"AsyncWorker-{lane}", settings),
+                "sync": invoked_function_name(id, f"SyncWorker-{lane}", settings),
+            }
+    return ret
+
+
+def render_static_responses(settings):
+    """Render `static_responses` as {keyword: {"default" or team ID: text}}; ImmediateResponse fills
+    in {command} with the command of the app, and routes the keyword to a worker as usual for the
+    teams without a variant when there is no default"""
+    ret = {}
+    for keyword, variants in settings.get("static_responses", {}).items():
+        if isinstance(variants, str):
+            variants = {"default": variants}
+        ret[keyword.lower()] = variants
+    return ret
 
 
 class SlackAppConstructsStack(Stack):
     def __init__(self, scope: Construct, id: str, settings, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
         self.id = id
+        self.settings = settings
 
         # cdk deploy --parameters StageName=v1
         stage = CfnParameter(
@@ -38,45 +136,167 @@ class SlackAppConstructsStack(Stack):
             type="String",
         ).value_as_string
 
-        ssm_param_key_verification_token = settings["ssm_parameter_key_verification_token"]
+        # Modules used by more than one handler are deployed once in a layer
+        commands = get_commands(settings)
+        self.shared_layer = create_shared_layer(
+            self,
+            id,
+            ["AsyncWorker", "ImmediateResponse", "SyncWorker"]
+            + [command["handler"] for command in commands.values()],
+        )
+
+        ssm_param_keys_verification_token = get_parameter_keys(
+            settings, "ssm_parameter_key_verification_token"
+        )
+
+        # Async invocations which still fail after the retries are kept here
+        self.async_worker_dlq = sqs_.Queue(
+            self,
+            f"{id}-AsyncWorker-DLQ",
+            queue_name=f"{id}-AsyncWorker-DLQ",
+            retention_period=Duration.days(14),
+        )
 
         # Create function AsyncWorker
-        self.func_async_worker = self.create_lambda("AsyncWorker", custom_role=None)
+        self.func_async_worker = self.create_lambda(
+            "AsyncWorker", custom_role=None, dead_letter_queue=self.async_worker_dlq
+        )
 
         # Create function SyncWorker
         self.func_sync_worker = self.create_lambda("SyncWorker", custom_role=None)
 
+        # Workers invoked asynchronously, which post their result to the response_url
+        self.async_functions = {"AsyncWorker": self.func_async_worker}
+
+        # Create dedicated AsyncWorker and SyncWorker functions for the teams of each worker lane
+        self.lane_functions = {}
+        for lane, lane_settings in settings.get("worker_lanes", {}).items():
+            for handler_module in ["AsyncWorker", "SyncWorker"]:
+                func = self.lane_functions[f"{handler_module}-{lane}"] = self.create_lambda(
+                    f"{handler_module}-{lane}",
+                    custom_role=None,
+                    dead_letter_queue=(
+                        self.async_worker_dlq if handler_module == "AsyncWorker" else None
+                    ),
+                    handler_module=handler_module,
+                    reserved_concurrency=lane_settings.get("reserved_concurrency"),
+                )
+                if handler_module == "AsyncWorker":
+                    self.async_functions[f"{handler_module}-{lane}"] = func
+
+        # Create a right-sized function for each command configured with its own settings
+        self.command_functions = {}
+        for name, command in commands.items():
+            is_async = command["mode"] == "async"
+            func = self.command_functions[f"Command-{name}"] = self.create_lambda(
+                f"Command-{name}",
+                custom_role=None,
+                dead_letter_queue=self.async_worker_dlq if is_async else None,
+                handler_module=command["handler"],
+                memory_size=command.get("memory_mb"),
+                reserved_concurrency=command.get("reserved_concurrency"),
+                timeout=command.get("timeout_seconds", 900),
+            )
+            if is_async:
+                self.async_functions[f"Command-{name}"] = func
+
         # Create function and role for ImmediateResponse
         func_immediate_response_role = self.create_immediate_response_execution_role(
             f"{id}-ImmediateResponse",
-            ssm_param_key_verification_token,
+            ssm_param_keys_verification_token,
         )
         func_immediate_response = self.create_lambda(
             "ImmediateResponse", custom_role=func_immediate_response_role
         )
-        func_immediate_response.add_environment("SlackAppId", settings["slack_app_id"])
         func_immediate_response.add_environment(
-            "SlackChannelIds", ",".join(get_channel_ids(settings))
+            "SlackApps",
+            render_slack_apps(
+                settings,
+                [
+                    "channel_ids",
+                    "command",
+                    "team_domains",
+                    "team_ids",
+                    "verification_token_parameter_key",
+                ],
+            ),
         )
-        func_immediate_response.add_environment("SlackCommand", settings["slack_command"])
         func_immediate_response.add_environment(
-            "SlackDomains", ",".join(get_team_domains(settings))
+            "AsyncWorkerLambdaFunctionName", invoked_function_name(id, "AsyncWorker", settings)
         )
-        func_immediate_response.add_environment("SlackTeamIds", ",".join(get_team_ids(settings)))
         func_immediate_response.add_environment(
-            "SlackVerificationTokenParameterKey", ssm_param_key_verification_token
+            "SyncWorkerLambdaFunctionName", invoked_function_name(id, "SyncWorker", settings)
         )
-        func_immediate_response.add_environment(
-            "AsyncWorkerLambdaFunctionName", f"{id}-AsyncWorker"
+
+        if settings.get("circuit_breakers"):
+            func_immediate_response.add_environment(
+                "CircuitBreakers", json.dumps(settings["circuit_breakers"], separators=(",", ":"))
+            )
+
+        worker_lanes = get_worker_lane_routes(id, settings)
+        if worker_lanes:
+            func_immediate_response.add_environment(
+                "WorkerLanes", json.dumps(worker_lanes, separators=(",", ":"))
+            )
+
+        command_routes = get_command_routes(id, settings)
+        if command_routes:
+            func_immediate_response.add_environment(
+                "CommandRoutes", json.dumps(command_routes, separators=(",", ":"))
+            )
+
+        static_responses = render_static_responses(settings)
+        if static_responses:
+            func_immediate_response.add_environment(
+                "StaticResponses", json.dumps(static_responses, separators=(",", ":"))
+            )
+
+        add_traffic_capture(self, id, func_immediate_response, settings)
+
+        add_single_flight_table(
+            self, id, func_immediate_response, list(self.async_functions.values()), settings
+        )
+
+        add_jobs_table(
+            self, id, func_immediate_response, list(self.async_functions.values()), settings
+        )
+
+        add_command_event_bus(
+            self, id, [func_immediate_response, *self.async_functions.values()], settings
+        )
+
+        # Commands with their own function have a fixed mode
+        add_route_latency_table(
+            self,
+            id,
+            func_immediate_response,
+            [f for name, f in self.async_functions.items() if not name.startswith("Command-")],
+            settings,
         )
-        func_immediate_response.add_environment("SyncWorkerLambdaFunctionName", f"{id}-SyncWorker")
+
+        # API Gateway invokes the alias when new versions are rolled out as canaries
+        immediate_response_handler = add_canary_deployment(
+            self, f"{id}-ImmediateResponse", func_immediate_response, settings
+        )
+        if immediate_response_handler is func_immediate_response:
+            immediate_response_handler = add_snapstart_alias(
+                self,
+                f"{id}-ImmediateResponse",
+                func_immediate_response,
+                "ImmediateResponse",
+                settings,
+            )
+
+        # With a custom domain, each region serves a regional API behind latency-based routing
+        domain = settings.get("domain")
+        endpoint_type = apigw_.EndpointType.REGIONAL if domain else apigw_.EndpointType.EDGE
 
         api = apigw_.LambdaRestApi(
             self,
             f"{id}-API",
             description=f"{id} API",
-            endpoint_configuration=apigw_.EndpointConfiguration(types=[apigw_.EndpointType.EDGE]),
-            handler=func_immediate_response,
+            endpoint_configuration=apigw_.EndpointConfiguration(types=[endpoint_type]),
+            handler=immediate_response_handler,
             deploy=False,
         )
 
@@ -90,7 +310,7 @@ class SlackAppConstructsStack(Stack):
 
         # Do a new deployment on specific stage
         new_deployment = apigw_.Deployment(self, f"{id}-API-Deployment", api=api)
-        apigw_.Stage(
+        api_stage = apigw_.Stage(
             self,
             f"{id}-API-Stage",
             data_trace_enabled=False,
@@ -99,38 +319,120 @@ class SlackAppConstructsStack(Stack):
             logging_level=apigw_.MethodLoggingLevel.ERROR,
             metrics_enabled=True,
             stage_name=stage,
-            tracing_enabled=False,
+            tracing_enabled=is_xray_enabled(settings),
+        )
+
+        if domain:
+            self.create_latency_routed_domain(api, api_stage, domain)
+
+        workers = (
+            {"AsyncWorker": self.func_async_worker, "SyncWorker": self.func_sync_worker}
+            | self.lane_functions
+            | self.command_functions
+        )
+        # Workers with SnapStart are invoked through their alias
+        worker_handlers = {
+            name: add_snapstart_alias(self, f"{id}-{name}", func, name, settings)
+            for name, func in workers.items()
+        }
+        add_warmup_schedule(
+            self, id, {"ImmediateResponse": immediate_response_handler} | worker_handlers, settings
         )
 
-    def create_lambda(self, function_name: str, custom_role: iam_.Role) -> lambda_.Function:
+        functions = {"ImmediateResponse": func_immediate_response} | workers
+        add_slo_monitoring(
+            self,
+            id,
+            settings,
+            api=api,
+            api_stage=api_stage,
+            functions=functions,
+            ack_functions=["ImmediateResponse"],
+            async_functions=list(self.async_functions),
+            dead_letter_queues=[self.async_worker_dlq],
+            slack_post_functions=list(self.async_functions),
+            rejection_functions=["ImmediateResponse"],
+        )
+
+    def create_latency_routed_domain(
+        self, api: apigw_.RestApi, api_stage: apigw_.Stage, domain: dict
+    ) -> None:
+        """Map the custom domain to the API of this region and add a latency-based alias record.
+
+        Settings (env_<stage>.json):
+            "domain": {
+                "name": "slack.example.com",
+                "hosted_zone_id": "Z0123456789", "hosted_zone_name": "example.com",
+                "certificate_arns": {"<region>": "<ACM certificate ARN in that region>", ...}
+            }
+        """
+        domain_name = apigw_.DomainName(
+            self,
+            f"{self.id}-DomainName",
+            certificate=acm_.Certificate.from_certificate_arn(
+                self, f"{self.id}-Certificate", domain["certificate_arns"][self.region]
+            ),
+            domain_name=domain["name"],
+            endpoint_type=apigw_.EndpointType.REGIONAL,
+            security_policy=apigw_.SecurityPolicy.TLS_1_2,
+        )
+        domain_name.add_base_path_mapping(api, stage=api_stage)
+
+        route53_.ARecord(
+            self,
+            f"{self.id}-LatencyRecord",
+            record_name=domain["name"],
+            region=self.region,
+            set_identifier=self.region,
+            target=route53_.RecordTarget.from_alias(route53_targets_.ApiGatewayDomain(domain_name)),
+            zone=route53_.HostedZone.from_hosted_zone_attributes(
+                self,
+                f"{self.id}-HostedZone",
+                hosted_zone_id=domain["hosted_zone_id"],
+                zone_name=domain["hosted_zone_name"],
+            ),
+        )
+
+    def create_lambda(
+        self,
+        function_name: str,
+        custom_role: iam_.Role,
+        dead_letter_queue: sqs_.IQueue = None,
+        handler_module: str = None,
+        memory_size: int = None,
+        reserved_concurrency: int = None,
+        timeout: int = 900,
+    ) -> lambda_.Function:
+        """Create a function running lambda/<handler_module>.py (default: function_name)"""
         if custom_role is None:
             custom_role: iam_.Role = self.create_default_role(f"{self.id}-{function_name}")
 
+        handler_module = handler_module or function_name
         return lambda_.Function(
             self,
             f"{self.id}-{function_name}",
-            code=lambda_.Code.from_asset(
-                LAMBDA_DIR,
-                exclude=[
-                    "*.test.py",
-                    "requirements.txt",
-                ],
-            ),
+            code=function_code(handler_module),
             current_version_options=lambda_.VersionOptions(
                 removal_policy=RemovalPolicy.DESTROY,
                 retry_attempts=2,
             ),
+            dead_letter_queue=dead_letter_queue,
+            environment=tracing_environment(self.settings) | aws_clients_environment(self.settings),
             function_name=f"{self.id}-{function_name}",
-            handler=f"{function_name}.lambda_handler",
+            handler=f"{handler_module}.lambda_handler",
+            layers=[self.shared_layer] if self.shared_layer else None,
             log_retention=RetentionDays.ONE_DAY,
+            memory_size=memory_size,
+            reserved_concurrent_executions=reserved_concurrency,
             role=custom_role,
             runtime=lambda_.Runtime.PYTHON_3_14,
-            timeout=Duration.seconds(900),
-            tracing=lambda_.Tracing.DISABLED,
+            snap_start=lambda_snap_start(self.settings, function_name),
+            timeout=Duration.seconds(timeout),
+            tracing=lambda_tracing(self.settings),
         )
 
     def create_immediate_response_execution_role(
-        self, function_name: str, parameter_key: str
+        self, function_name: str, parameter_keys: list[str]
     ) -> iam_.Role:
         role_name = f"{function_name}-ExecutionRole"
         return iam_.Role(
@@ -147,8 +449,12 @@ class SlackAppConstructsStack(Stack):
                             ],
                             effect=iam_.Effect.ALLOW,
                             resources=[
-                                self.func_async_worker.function_arn,
-                                self.func_sync_worker.function_arn,
+                                arn
+                                for func in [self.func_async_worker, self.func_sync_worker]
+                                + list(self.lane_functions.values())
+                                + list(self.command_functions.values())
+                                # With their aliases (SnapStart)
+                                for arn in [func.function_arn, f"{func.function_arn}:*"]
                             ],
                         ),
                         iam_.PolicyStatement(
@@ -157,7 +463,8 @@ class SlackAppConstructsStack(Stack):
                             ],
                             effect=iam_.Effect.ALLOW,
                             resources=[
-                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{parameter_key}",
+                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{parameter_key}"
+                                for parameter_key in parameter_keys
                             ],
                         ),
                     ]
@@ -169,7 +476,7 @@ class SlackAppConstructsStack(Stack):
                 ),
                 # iam_.ManagedPolicy.from_aws_managed_policy_name("AWSXrayWriteOnlyAccess"),
             ],
-            role_name=role_name,
+            role_name=execution_role_name(function_name),
         )
 
     def create_default_role(self, function_name: str) -> iam_.Role:
@@ -184,5 +491,5 @@ class SlackAppConstructsStack(Stack):
                 ),
                 # iam_.ManagedPolicy.from_aws_managed_policy_name("AWSXrayWriteOnlyAccess"),
             ],
-            role_name=role_name,
+            role_name=execution_role_name(function_name),
         )
@@ -1,30 +1,37 @@
+import json
+
 from aws_cdk import CfnParameter, Duration, RemovalPolicy, Stack
 from aws_cdk import aws_apigateway as apigw_
 from aws_cdk import aws_dynamodb as ddb_
 from aws_cdk import aws_iam as iam_
 from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_lambda_event_sources as lambda_event_sources_
+from aws_cdk import aws_sqs as sqs_
 from aws_cdk.aws_logs import LogGroup, RetentionDays
 from constructs import Construct
 
-LAMBDA_DIR = "lambda"
-
-
-def get_team_ids(settings):
-    return [v["team_id"] for v in settings["access"].values() if v.get("team_id")]
-
+from slack_app_constructs_cdk.aws_clients import aws_clients_environment
+from slack_app_constructs_cdk.lambda_bundling import create_shared_layer, function_code
+from slack_app_constructs_cdk.role_names import execution_role_name
+from slack_app_constructs_cdk.slack_apps import get_parameter_keys, render_slack_apps
+from slack_app_constructs_cdk.snapstart import add_snapstart_alias, lambda_snap_start
+from slack_app_constructs_cdk.slo_monitoring import add_slo_monitoring
+from slack_app_constructs_cdk.tracing_settings import (
+    is_xray_enabled,
+    lambda_tracing,
+    tracing_environment,
+)
+from slack_app_constructs_cdk.warmup_schedule import add_warmup_schedule
 
-def get_channel_ids(settings):
-    ret = []
-    for v in settings["access"].values():
-        if v.get("channels"):
-            ret.extend(v["channels"].keys())
-    return ret
+TEAM_ID_INDEX_NAME = "team_id-index"
+TOKEN_CLEANUP_TIMEOUT_SECONDS = 60
 
 
 class SlackAppOAuthConstructsStack(Stack):
     def __init__(self, scope: Construct, id: str, settings, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
         self.id = id
+        self.settings = settings
 
         # cdk deploy --parameters StageName=v1
         stage = CfnParameter(
@@ -35,28 +42,101 @@ class SlackAppOAuthConstructsStack(Stack):
             type="String",
         ).value_as_string
 
-        ssm_param_key_client_id = settings["ssm_parameter_key_client_id"]
-        ssm_param_key_client_secret = settings["ssm_parameter_key_client_secret"]
+        # Modules used by more than one handler are deployed once in a layer
+        self.shared_layer = create_shared_layer(self, id, ["OAuth", "SlackEvents", "TokenCleanup"])
+
+        ssm_param_keys_client = [
+            *get_parameter_keys(settings, "ssm_parameter_key_client_id"),
+            *get_parameter_keys(settings, "ssm_parameter_key_client_secret"),
+        ]
+        ssm_param_keys_verification_token = get_parameter_keys(
+            settings, "ssm_parameter_key_verification_token"
+        )
 
         table_name = f"{id}-OAuth"
 
         # Create a dynamodb table
-        oauth_table = self.create_dynamodb_table(table_name)
+        oauth_table = self.create_dynamodb_table(
+            table_name, replication_regions=settings.get("regions", [])
+        )
 
         # Create function and role for OAuth
         func_oauth_role = self.create_func_oauth_execution_role(
             f"{id}-OAuth",
-            ssm_param_key_client_id,
-            ssm_param_key_client_secret,
+            ssm_param_keys_client,
             oauth_table.table_arn,
         )
         func_oauth = self.create_lambda("OAuth", custom_role=func_oauth_role)
-        func_oauth.add_environment("SlackAppId", settings["slack_app_id"])
-        func_oauth.add_environment("SlackAppClientIdParameterKey", ssm_param_key_client_id)
-        func_oauth.add_environment("SlackAppClientSecretParameterKey", ssm_param_key_client_secret)
-        func_oauth.add_environment("SlackChannelIds", ",".join(get_channel_ids(settings)))
-        func_oauth.add_environment("SlackTeamIds", ",".join(get_team_ids(settings)))
+        func_oauth.add_environment(
+            "SlackApps",
+            render_slack_apps(
+                settings,
+                [
+                    "channel_ids",
+                    "client_id_parameter_key",
+                    "client_secret_parameter_key",
+                    "team_ids",
+                ],
+            ),
+        )
         func_oauth.add_environment("OAuthDynamoDBTable", table_name)
+        if settings.get("circuit_breakers"):
+            func_oauth.add_environment(
+                "CircuitBreakers", json.dumps(settings["circuit_breakers"], separators=(",", ":"))
+            )
+
+        # Events API: SlackEvents acks and queues uninstall/revocation events for TokenCleanup
+        cleanup_dlq = sqs_.Queue(
+            self,
+            f"{id}-TokenCleanup-DLQ",
+            queue_name=f"{id}-TokenCleanup-DLQ",
+            retention_period=Duration.days(14),
+        )
+        cleanup_queue = sqs_.Queue(
+            self,
+            f"{id}-TokenCleanup-Queue",
+            dead_letter_queue=sqs_.DeadLetterQueue(max_receive_count=5, queue=cleanup_dlq),
+            queue_name=f"{id}-TokenCleanup-Queue",
+            visibility_timeout=Duration.seconds(6 * TOKEN_CLEANUP_TIMEOUT_SECONDS),
+        )
+
+        func_events_role = self.create_func_events_execution_role(
+            f"{id}-SlackEvents", ssm_param_keys_verification_token, cleanup_queue.queue_arn
+        )
+        func_events = self.create_lambda("SlackEvents", custom_role=func_events_role)
+        func_events.add_environment(
+            "SlackApps", render_slack_apps(settings, ["verification_token_parameter_key"])
+        )
+        func_events.add_environment("TokenCleanupQueueUrl", cleanup_queue.queue_url)
+
+        func_cleanup_role = self.create_func_token_cleanup_execution_role(
+            f"{id}-TokenCleanup", oauth_table.table_arn
+        )
+        func_cleanup = self.create_lambda(
+            "TokenCleanup",
+            custom_role=func_cleanup_role,
+            timeout=TOKEN_CLEANUP_TIMEOUT_SECONDS,
+        )
+        func_cleanup.add_environment("OAuthDynamoDBTable", table_name)
+        func_cleanup.add_environment("OAuthDynamoDBTeamIndex", TEAM_ID_INDEX_NAME)
+
+        # Functions with SnapStart are invoked through their alias
+        oauth_handler = add_snapstart_alias(self, f"{id}-OAuth", func_oauth, "OAuth", settings)
+        events_handler = add_snapstart_alias(
+            self, f"{id}-SlackEvents", func_events, "SlackEvents", settings
+        )
+        cleanup_handler = add_snapstart_alias(
+            self, f"{id}-TokenCleanup", func_cleanup, "TokenCleanup", settings
+        )
+
+        cleanup_handler.add_event_source(
+            lambda_event_sources_.SqsEventSource(
+                cleanup_queue,
+                batch_size=10,
+                max_batching_window=Duration.seconds(30),
+                report_batch_item_failures=True,
+            )
+        )
 
         api = apigw_.LambdaRestApi(
             self,
@@ -65,13 +145,19 @@ class SlackAppOAuthConstructsStack(Stack):
             endpoint_configuration=apigw_.EndpointConfiguration(
                 types=[apigw_.EndpointType.REGIONAL]
             ),
-            handler=func_oauth,
+            handler=oauth_handler,
             deploy=False,
             proxy=False,
         )
 
         item = api.root.add_resource("oauth2")
-        item.add_method("ANY", apigw_.LambdaIntegration(func_oauth))
+        item.add_method("ANY", apigw_.LambdaIntegration(oauth_handler))
+        # Redirect URL of each app served by this deployment
+        item = item.add_resource("{app_id}")
+        item.add_method("ANY", apigw_.LambdaIntegration(oauth_handler))
+
+        item = api.root.add_resource("events")
+        item.add_method("POST", apigw_.LambdaIntegration(events_handler))
 
         # Create APIGW Loggroup for setting retention
         LogGroup(
@@ -83,7 +169,7 @@ class SlackAppOAuthConstructsStack(Stack):
 
         # Do a new deployment on specific stage
         new_deployment = apigw_.Deployment(self, f"{id}-API-Deployment", api=api)
-        apigw_.Stage(
+        api_stage = apigw_.Stage(
             self,
             f"{id}-API-Stage",
             data_trace_enabled=True,
@@ -92,45 +178,72 @@ class SlackAppOAuthConstructsStack(Stack):
             logging_level=apigw_.MethodLoggingLevel.INFO,
             metrics_enabled=True,
             stage_name=stage,
-            tracing_enabled=False,
+            tracing_enabled=is_xray_enabled(settings),
+        )
+
+        add_warmup_schedule(
+            self, id, {"OAuth": oauth_handler, "SlackEvents": events_handler}, settings
+        )
+
+        add_slo_monitoring(
+            self,
+            id,
+            settings,
+            api=api,
+            api_stage=api_stage,
+            functions={
+                "OAuth": func_oauth,
+                "SlackEvents": func_events,
+                "TokenCleanup": func_cleanup,
+            },
+            ack_functions=["SlackEvents"],
+            dead_letter_queues=[cleanup_dlq],
         )
 
-    def create_dynamodb_table(self, table_name: str) -> ddb_.Table:
-        return ddb_.Table(
+    def create_dynamodb_table(self, table_name: str, replication_regions: list) -> ddb_.Table:
+        # A global table when the command app is deployed to more than one region
+        replica_regions = [r for r in replication_regions if r != self.region]
+        table = ddb_.Table(
             self,
             table_name,
             billing_mode=ddb_.BillingMode.PAY_PER_REQUEST,
             partition_key=ddb_.Attribute(name="access_token", type=ddb_.AttributeType.STRING),
             removal_policy=RemovalPolicy.RETAIN,
+            replication_regions=replica_regions or None,
             table_name=table_name,
         )
+        # For finding the installations of a team when it uninstalls the app
+        table.add_global_secondary_index(
+            index_name=TEAM_ID_INDEX_NAME,
+            partition_key=ddb_.Attribute(name="team_id", type=ddb_.AttributeType.STRING),
+        )
+        return table
 
-    def create_lambda(self, function_name: str, custom_role: iam_.Role) -> lambda_.Function:
+    def create_lambda(
+        self, function_name: str, custom_role: iam_.Role, timeout: int = 900
+    ) -> lambda_.Function:
         return lambda_.Function(
             self,
             f"{self.id}-{function_name}-Function",
-            code=lambda_.Code.from_asset(
-                LAMBDA_DIR,
-                exclude=[
-                    "*.test.py",
-                    "requirements.txt",
-                ],
-            ),
+            code=function_code(function_name),
             current_version_options=lambda_.VersionOptions(
                 removal_policy=RemovalPolicy.DESTROY,
                 retry_attempts=2,
             ),
+            environment=tracing_environment(self.settings) | aws_clients_environment(self.settings),
             function_name=f"{self.id}-{function_name}",
             handler=f"{function_name}.lambda_handler",
+            layers=[self.shared_layer] if self.shared_layer else None,
             log_retention=RetentionDays.ONE_DAY,
             role=custom_role,
             runtime=lambda_.Runtime.PYTHON_3_14,
-            timeout=Duration.seconds(900),
-            tracing=lambda_.Tracing.DISABLED,
+            snap_start=lambda_snap_start(self.settings, function_name),
+            timeout=Duration.seconds(timeout),
+            tracing=lambda_tracing(self.settings),
         )
 
     def create_func_oauth_execution_role(
-        self, function_name: str, client_id_key: str, client_secret_key: str, table_arn: str
+        self, function_name: str, parameter_keys: list[str], table_arn: str
     ) -> iam_.Role:
         role_name = f"{function_name}-ExecutionRole"
         return iam_.Role(
@@ -153,8 +266,8 @@ class SlackAppOAuthConstructsStack(Stack):
                             ],
                             effect=iam_.Effect.ALLOW,
                             resources=[
-                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{client_id_key}",
-                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{client_secret_key}",
+                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{parameter_key}"
+                                for parameter_key in parameter_keys
                             ],
                         ),
                     ]
@@ -166,5 +279,82 @@ class SlackAppOAuthConstructsStack(Stack):
                 ),
                 # iam_.ManagedPolicy.from_aws_managed_policy_name("AWSXrayWriteOnlyAccess"),
             ],
-            role_name=role_name,
+            role_name=execution_role_name(function_name),
+        )
+
+    def create_func_events_execution_role(
+        self, function_name: str, parameter_keys: list[str], queue_arn: str
+    ) -> iam_.Role:
+        role_name = f"{function_name}-ExecutionRole"
+        return iam_.Role(
+            self,
+            role_name,
+            assumed_by=iam_.ServicePrincipal("lambda.amazonaws.com"),
+            inline_policies={
+                f"{function_name}-ExecutionPolicy": iam_.PolicyDocument(
+                    statements=[
+                        iam_.PolicyStatement(
+                            actions=[
+                                "sqs:SendMessage",
+                            ],
+                            effect=iam_.Effect.ALLOW,
+                            resources=[queue_arn],
+                        ),
+                        iam_.PolicyStatement(
+                            actions=[
+                                "ssm:GetParameter",
+                            ],
+                            effect=iam_.Effect.ALLOW,
+                            resources=[
+                                f"arn:aws:ssm:{self.region}:{self.account}:parameter{parameter_key}"
+                                for parameter_key in parameter_keys
+                            ],
+                        ),
+                    ]
+                )
+            },
+            managed_policies=[
+                iam_.ManagedPolicy.from_aws_managed_policy_name(
+                    "service-role/AWSLambdaBasicExecutionRole"
+                ),
+            ],
+            role_name=execution_role_name(function_name),
+        )
+
+    def create_func_token_cleanup_execution_role(
+        self, function_name: str, table_arn: str
+    ) -> iam_.Role:
+        role_name = f"{function_name}-ExecutionRole"
+        return iam_.Role(
+            self,
+            role_name,
+            assumed_by=iam_.ServicePrincipal("lambda.amazonaws.com"),
+            inline_policies={
+                f"{function_name}-ExecutionPolicy": iam_.PolicyDocument(
+                    statements=[
+                        iam_.PolicyStatement(
+                            actions=[
+                                "dynamodb:BatchWriteItem",
+                                "dynamodb:DeleteItem",
+                                "dynamodb:UpdateItem",
+                            ],
+                            effect=iam_.Effect.ALLOW,
+                            resources=[table_arn],
+                        ),
+                        iam_.PolicyStatement(
+                            actions=[
+                                "dynamodb:Query",
+                            ],
+                            effect=iam_.Effect.ALLOW,
+                            resources=[f"{table_arn}/index/{TEAM_ID_INDEX_NAME}"],
+                        ),
+                    ]
+                )
+            },
+            managed_policies=[
+                iam_.ManagedPolicy.from_aws_managed_policy_name(
+                    "service-role/AWSLambdaBasicExecutionRole"
+                ),
+            ],
+            role_name=execution_role_name(function_name),
         )
@@ -0,0 +1,77 @@
+import json
+
+APP_KEYS = [
+    "slack_app_id",
+    "slack_command",
+    "ssm_parameter_key_client_id",
+    "ssm_parameter_key_client_secret",
+    "ssm_parameter_key_verification_token",
+]
+
+
+def get_apps(settings) -> list[dict]:
+    """Return the Slack apps served by one deployment: the app at the top level of env_<stage>.json,
+    then the ones in `apps`, checked.
+
+    Settings (env_<stage>.json), each app with the same keys as the top level one; `access`
+    defaults to the top level one:
+        "apps": [
+            {
+                "slack_app_id": "A2222222222", "slack_command": "/othercmd",
+                "ssm_parameter_key_verification_token": "/apps/...", "access": {...}
+            }
+        ]
+    """
+    apps = []
+    for app in [settings] + settings.get("apps", []):
+        if not app.get("slack_app_id"):
+            raise ValueError("apps: slack_app_id is required")
+        if app["slack_app_id"] in [a["slack_app_id"] for a in apps]:
+            raise ValueError(f"apps: {app['slack_app_id']} is listed more than once")
+        apps.append(
+            {key: app.get(key) for key in APP_KEYS}
+            | {"access": app.get("access", settings["access"])}
+        )
+    return apps
+
+
+def get_channel_ids(app):
+    ret = []
+    for v in app["access"].values():
+        if v.get("channels"):
+            ret.extend(v["channels"].keys())
+    return ret
+
+
+def get_team_domains(app):
+    return list(app["access"].keys())
+
+
+def get_team_ids(app):
+    return [v["team_id"] for v in app["access"].values() if v.get("team_id")]
+
+
+# Fields of the SlackApps registry (see lambda/slack_apps.py)
+REGISTRY_FIELDS = {
+    "channel_ids": get_channel_ids,
+    "client_id_parameter_key": lambda app: app["ssm_parameter_key_client_id"],
+    "client_secret_parameter_key": lambda app: app["ssm_parameter_key_client_secret"],
+    "command": lambda app: app["slack_command"],
+    "team_domains": get_team_domains,
+    "team_ids": get_team_ids,
+    "verification_token_parameter_key": lambda app: app["ssm_parameter_key_verification_token"],
+}
+
+
+def render_slack_apps(settings, fields: list[str]) -> str:
+    """Render the SlackApps environment variable of a function, with the `fields` it needs"""
+    registry = {
+        app["slack_app_id"]: {field: REGISTRY_FIELDS[field](app) for field in fields}
+        for app in get_apps(settings)
+    }
+    return json.dumps(registry, separators=(",", ":"))
+
+
+def get_parameter_keys(settings, key: str) -> list[str]:
+    """Return the SSM parameter `key` (e.g. ssm_parameter_key_client_id) of every app"""
+    return [app[key] for app in get_apps(settings)]
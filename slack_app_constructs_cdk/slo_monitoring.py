@@ -0,0 +1,273 @@
+from aws_cdk import Duration
+from aws_cdk import aws_apigateway as apigw_
+from aws_cdk import aws_cloudwatch as cloudwatch_
+from aws_cdk import aws_cloudwatch_actions as cloudwatch_actions_
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_sns as sns_
+from aws_cdk import aws_sqs as sqs_
+from constructs import Construct
+
+ACK_BUDGET_MS = 3000  # Slack's limit for the response to a slash command or event
+MAX_ALARM_METRICS = 10  # metrics per alarm math expression
+METRICS_NAMESPACE = "SlackCommandApp"  # see lambda/metrics.py
+PERIOD = Duration.minutes(1)
+DEFAULT_THRESHOLDS = {
+    "api_latency_p99_ms": 2500,
+    "cold_start_rate_percent": 20,
+    "throttles": 0,
+    "async_event_age_ms": 60000,
+    "dlq_depth": 0,
+    "slack_post_failures": 0,
+}
+
+
+def custom_metric(function: lambda_.Function, metric_name: str, statistic: str):
+    """A metric written by lambda/metrics.py in `function`"""
+    return cloudwatch_.Metric(
+        dimensions_map={"FunctionName": function.function_name},
+        label=function.function_name,
+        metric_name=metric_name,
+        namespace=METRICS_NAMESPACE,
+        period=PERIOD,
+        statistic=statistic,
+    )
+
+
+def combine(metrics: list, function: str, label: str):
+    """One metric applying `function` (SUM, MAX) across `metrics`, for alarming on all of them"""
+    ids = [f"m{i}" for i in range(len(metrics))]
+    return cloudwatch_.MathExpression(
+        expression=f"{function}([{', '.join(ids)}])",
+        label=label,
+        period=PERIOD,
+        using_metrics=dict(zip(ids, metrics)),
+    )
+
+
+def cold_start_rate(function: lambda_.Function, index: int = 0):
+    """Cold starts in percent; `index` keeps the metric IDs apart when graphed with others"""
+    return cloudwatch_.MathExpression(
+        expression=f"100 * c{index}",
+        label=function.function_name,
+        period=PERIOD,
+        using_metrics={f"c{index}": custom_metric(function, "ColdStart", "Average")},
+    )
+
+
+def add_slo_monitoring(
+    scope: Construct,
+    id: str,
+    settings,
+    api: apigw_.RestApi,
+    api_stage: apigw_.Stage,
+    functions: dict[str, lambda_.Function],
+    ack_functions: list[str],
+    async_functions: list[str] = (),
+    dead_letter_queues: list[sqs_.IQueue] = (),
+    slack_post_functions: list[str] = (),
+    rejection_functions: list[str] = (),
+) -> None:
+    """CloudWatch dashboard and alarms for the ack budget of `api`.
+
+    - API latency p50/p95/p99 against the 3 second budget
+    - cold-start rate (ColdStart metric) of `functions`, alarmed for `ack_functions`, the ones
+      answering Slack
+    - throttles of `functions`
+    - age of the events queued for `async_functions`
+    - messages in `dead_letter_queues`
+    - failed posts to Slack (SlackPostFailures metric) from `slack_post_functions`
+    - requests rejected by the early validation of `rejection_functions` (RequestsRejected metric),
+      per reason, graphed only: junk traffic is not an SLO breach
+
+    Settings (env_<stage>.json), disabled by default; an alarm fires above its threshold:
+        "monitoring": {
+            "enabled": true, "alarm_topic_arn": "arn:aws:sns:...",
+            "thresholds": {"api_latency_p99_ms": 2500, "cold_start_rate_percent": 20, ...}
+        }
+    """
+    monitoring = settings.get("monitoring", {})
+    if monitoring.get("enabled", False) is False:
+        return
+
+    thresholds = DEFAULT_THRESHOLDS | monitoring.get("thresholds", {})
+    alarm_action = None
+    if monitoring.get("alarm_topic_arn"):
+        alarm_action = cloudwatch_actions_.SnsAction(
+            sns_.Topic.from_topic_arn(scope, f"{id}-Alarm-Topic", monitoring["alarm_topic_arn"])
+        )
+
+    alarms = []
+
+    def add_alarm(name, metric, threshold, description):
+        alarm = cloudwatch_.Alarm(
+            scope,
+            f"{id}-{name}-Alarm",
+            alarm_description=description,
+            alarm_name=f"{id}-{name}",
+            comparison_operator=cloudwatch_.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            datapoints_to_alarm=3,
+            evaluation_periods=5,
+            metric=metric,
+            threshold=threshold,
+            treat_missing_data=cloudwatch_.TreatMissingData.NOT_BREACHING,
+        )
+        if alarm_action:
+            alarm.add_alarm_action(alarm_action)
+        alarms.append(alarm)
+
+    def add_combined_alarm(name, metrics, function, threshold, description):
+        """Alarm on `function` (SUM, MAX) of the metrics, split when there are too many"""
+        for i in range(0, len(metrics), MAX_ALARM_METRICS):
+            alarm_name = name if i == 0 else f"{name}-{i // MAX_ALARM_METRICS + 1}"
+            group = metrics[i:][:MAX_ALARM_METRICS]
+            add_alarm(alarm_name, combine(group, function, alarm_name), threshold, description)
+
+    latency = {
+        p: api_stage.metric_latency(label=p, period=PERIOD, statistic=p)
+        for p in ["p50", "p95", "p99"]
+    }
+    add_alarm(
+        "ApiLatencyP99",
+        latency["p99"],
+        thresholds["api_latency_p99_ms"],
+        f"p99 latency of {api.rest_api_name} is close to Slack's {ACK_BUDGET_MS} ms budget",
+    )
+    widgets = [
+        cloudwatch_.GraphWidget(
+            left=list(latency.values()),
+            left_annotations=[
+                cloudwatch_.HorizontalAnnotation(label="Slack budget", value=ACK_BUDGET_MS),
+                cloudwatch_.HorizontalAnnotation(
+                    color=cloudwatch_.Color.ORANGE,
+                    label="Alarm",
+                    value=thresholds["api_latency_p99_ms"],
+                ),
+            ],
+            left_y_axis=cloudwatch_.YAxisProps(label="ms", min=0),
+            title="API latency",
+            width=12,
+        ),
+        cloudwatch_.GraphWidget(
+            left=[cold_start_rate(f, i) for i, f in enumerate(functions.values())],
+            left_y_axis=cloudwatch_.YAxisProps(label="%", max=100, min=0),
+            title="Cold-start rate",
+            width=12,
+        ),
+        cloudwatch_.GraphWidget(
+            left=[
+                f.metric_throttles(label=f.function_name, period=PERIOD) for f in functions.values()
+            ],
+            left_y_axis=cloudwatch_.YAxisProps(min=0),
+            title="Throttles",
+            width=12,
+        ),
+    ]
+
+    for name in ack_functions:
+        add_alarm(
+            f"{name}-ColdStartRate",
+            cold_start_rate(functions[name]),
+            thresholds["cold_start_rate_percent"],
+            f"Percentage of the requests to {name} served by a cold start",
+        )
+
+    add_combined_alarm(
+        "Throttles",
+        [f.metric_throttles(period=PERIOD) for f in functions.values()],
+        "SUM",
+        thresholds["throttles"],
+        "Throttled invocations of the functions",
+    )
+
+    if async_functions:
+        age = [
+            functions[name].metric("AsyncEventAge", label=name, period=PERIOD, statistic="Maximum")
+            for name in async_functions
+        ]
+        add_combined_alarm(
+            "AsyncEventAge",
+            age,
+            "MAX",
+            thresholds["async_event_age_ms"],
+            "Time the async invocations wait to be processed",
+        )
+        widgets.append(
+            cloudwatch_.GraphWidget(
+                left=age,
+                left_y_axis=cloudwatch_.YAxisProps(label="ms", min=0),
+                title="Async event age (max)",
+                width=12,
+            )
+        )
+
+    if dead_letter_queues:
+        depth = [
+            q.metric_approximate_number_of_messages_visible(
+                label=q.queue_name, period=PERIOD, statistic="Maximum"
+            )
+            for q in dead_letter_queues
+        ]
+        add_combined_alarm(
+            "DLQDepth", depth, "MAX", thresholds["dlq_depth"], "Messages in the dead-letter queues"
+        )
+        widgets.append(
+            cloudwatch_.GraphWidget(
+                left=depth,
+                left_y_axis=cloudwatch_.YAxisProps(min=0),
+                title="DLQ depth",
+                width=12,
+            )
+        )
+
+    if slack_post_functions:
+        failures = [
+            custom_metric(functions[name], "SlackPostFailures", "Sum")
+            for name in slack_post_functions
+        ]
+        add_combined_alarm(
+            "SlackPostFailures",
+            failures,
+            "SUM",
+            thresholds["slack_post_failures"],
+            "Failed posts to the Slack response_url",
+        )
+        widgets.append(
+            cloudwatch_.GraphWidget(
+                left=failures,
+                left_y_axis=cloudwatch_.YAxisProps(min=0),
+                title="Slack post failures",
+                width=12,
+            )
+        )
+
+    for name in rejection_functions:
+        # One line per Reason dimension
+        search = (
+            f'{{{METRICS_NAMESPACE},FunctionName,Reason}} MetricName="RequestsRejected"'
+            f' FunctionName="{functions[name].function_name}"'
+        )
+        widgets.append(
+            cloudwatch_.GraphWidget(
+                left=[
+                    cloudwatch_.MathExpression(
+                        expression=f"SEARCH('{search}', 'Sum', 60)",
+                        label="",
+                        period=PERIOD,
+                        using_metrics={},
+                    )
+                ],
+                left_y_axis=cloudwatch_.YAxisProps(min=0),
+                title=f"Rejected requests ({name})",
+                width=12,
+            )
+        )
+
+    cloudwatch_.Dashboard(
+        scope,
+        f"{id}-Dashboard",
+        dashboard_name=id,
+        widgets=[
+            [cloudwatch_.AlarmStatusWidget(alarms=alarms, title="SLO alarms", width=24)],
+            widgets,
+        ],
+    )
@@ -0,0 +1,47 @@
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+from slack_app_constructs_cdk.canary_deployment import CANARY_ALIAS_NAME
+
+# Callers invoke the published versions through an alias, the same one as for canary deployments
+SNAPSTART_ALIAS_NAME = CANARY_ALIAS_NAME
+
+
+def is_snapstart_enabled(settings, function_name: str) -> bool:
+    """Settings (env_<stage>.json), off by default:
+    "snapstart": {"functions": ["ImmediateResponse", "AsyncWorker", "OAuth"]}
+
+    Functions are named as in the stacks, without the stack id, e.g. "AsyncWorker-<lane>" or
+    "Command-<command>". SnapStart only applies to published versions, which the alias points to.
+    """
+    return function_name in settings.get("snapstart", {}).get("functions", [])
+
+
+def lambda_snap_start(settings, function_name: str) -> lambda_.SnapStartConf:
+    if is_snapstart_enabled(settings, function_name):
+        return lambda_.SnapStartConf.ON_PUBLISHED_VERSIONS
+    return None
+
+
+def invoked_function_name(id: str, function_name: str, settings) -> str:
+    """Name for invoking the function: qualified with the alias when SnapStart is on"""
+    name = f"{id}-{function_name}"
+    if is_snapstart_enabled(settings, function_name):
+        return f"{name}:{SNAPSTART_ALIAS_NAME}"
+    return name
+
+
+def add_snapstart_alias(
+    scope: Construct, id: str, function: lambda_.Function, function_name: str, settings
+) -> lambda_.IFunction:
+    """Return an alias of the current version of `function` for its callers when SnapStart is on,
+    or the function itself"""
+    if not is_snapstart_enabled(settings, function_name):
+        return function
+
+    return lambda_.Alias(
+        scope,
+        f"{id}-Alias",
+        alias_name=SNAPSTART_ALIAS_NAME,
+        version=function.current_version,
+    )
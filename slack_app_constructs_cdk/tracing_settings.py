@@ -0,0 +1,32 @@
+from aws_cdk import aws_lambda as lambda_
+
+
+def tracing_settings(settings) -> dict:
+    """Settings (env_<stage>.json), disabled by default:
+    "tracing": {"enabled": true, "sample_rate": 0.05, "exporter": "xray"}
+
+    exporter "xray" sends spans to X-Ray (active tracing is turned on), "log" writes them to
+    CloudWatch Logs.
+    """
+    return settings.get("tracing", {})
+
+
+def is_xray_enabled(settings) -> bool:
+    tracing = tracing_settings(settings)
+    return tracing.get("enabled", False) is True and tracing.get("exporter", "log") == "xray"
+
+
+def lambda_tracing(settings) -> lambda_.Tracing:
+    return lambda_.Tracing.ACTIVE if is_xray_enabled(settings) else lambda_.Tracing.DISABLED
+
+
+def tracing_environment(settings) -> dict[str, str]:
+    tracing = tracing_settings(settings)
+    if tracing.get("enabled", False) is False:
+        return {}
+
+    return {
+        "TracingEnabled": "true",
+        "TracingExporter": tracing.get("exporter", "log"),
+        "TracingSampleRate": str(tracing.get("sample_rate", 1.0)),
+    }
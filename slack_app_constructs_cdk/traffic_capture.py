@@ -0,0 +1,47 @@
+from aws_cdk import Duration, RemovalPolicy, Size
+from aws_cdk import aws_kinesisfirehose as firehose_
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_s3 as s3_
+from constructs import Construct
+
+
+def add_traffic_capture(scope: Construct, id: str, function: lambda_.Function, settings) -> None:
+    """Send sanitized request records of `function` to S3 through a Firehose delivery stream.
+
+    Settings (env_<stage>.json), disabled by default:
+        "capture": {"enabled": true, "sample_rate": 1.0, "retention_days": 30}
+    """
+    capture = settings.get("capture", {})
+    if capture.get("enabled", False) is False:
+        return
+
+    bucket = s3_.Bucket(
+        scope,
+        f"{id}-Capture-Bucket",
+        auto_delete_objects=True,
+        block_public_access=s3_.BlockPublicAccess.BLOCK_ALL,
+        encryption=s3_.BucketEncryption.S3_MANAGED,
+        enforce_ssl=True,
+        lifecycle_rules=[
+            s3_.LifecycleRule(expiration=Duration.days(capture.get("retention_days", 30)))
+        ],
+        removal_policy=RemovalPolicy.DESTROY,
+    )
+
+    stream = firehose_.DeliveryStream(
+        scope,
+        f"{id}-Capture-DeliveryStream",
+        delivery_stream_name=f"{id}-Capture",
+        destination=firehose_.S3Bucket(
+            bucket,
+            buffering_interval=Duration.minutes(5),
+            buffering_size=Size.mebibytes(5),
+            compression=firehose_.Compression.GZIP,
+            data_output_prefix="requests/!{timestamp:yyyy/MM/dd/HH}/",
+            error_output_prefix="errors/!{firehose:error-output-type}/!{timestamp:yyyy/MM/dd}/",
+        ),
+    )
+    stream.grant_put_records(function)
+
+    function.add_environment("CaptureDeliveryStream", stream.delivery_stream_name)
+    function.add_environment("CaptureSampleRate", str(capture.get("sample_rate", 1.0)))
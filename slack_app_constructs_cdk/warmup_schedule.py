@@ -0,0 +1,46 @@
+from aws_cdk import Duration
+from aws_cdk import aws_events as events_
+from aws_cdk import aws_events_targets as targets_
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+MAX_TARGETS_PER_RULE = 5  # EventBridge limit
+WARMUP_HOLD_MS = 100
+
+
+def add_warmup_schedule(
+    scope: Construct, id: str, functions: dict[str, lambda_.IFunction], settings
+) -> None:
+    """Ping each function with `concurrency` warm-up events every `rate_minutes`.
+
+    Settings (env_<stage>.json), disabled by default:
+        "warmup": {"enabled": true, "rate_minutes": 5, "concurrency": 2}
+    """
+    warmup = settings.get("warmup", {})
+    if warmup.get("enabled", False) is False:
+        return
+
+    concurrency = warmup.get("concurrency", 1)
+    schedule = events_.Schedule.rate(Duration.minutes(warmup.get("rate_minutes", 5)))
+    event = events_.RuleTargetInput.from_object(
+        {
+            "warmup": True,
+            "concurrency": concurrency,
+            "hold_ms": WARMUP_HOLD_MS if concurrency > 1 else 0,
+        }
+    )
+
+    for function_name, func in functions.items():
+        # One target per concurrent event, split over as many rules as needed
+        for index, start in enumerate(range(0, concurrency, MAX_TARGETS_PER_RULE)):
+            count = min(MAX_TARGETS_PER_RULE, concurrency - start)
+            events_.Rule(
+                scope,
+                f"{id}-{function_name}-Warmup{index}",
+                description=f"Keep {id}-{function_name} warm",
+                schedule=schedule,
+                targets=[
+                    targets_.LambdaFunction(func, event=event, retry_attempts=0)
+                    for _ in range(count)
+                ],
+            )